@@ -1,7 +1,9 @@
 # app/api/endpoints/endpoints_student.py
 import os
+import json
+import math
 from fastapi import APIRouter, HTTPException, Request, Form, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import List
 from ...schemas.student import (
     UniversityRequest, ErasmusProgramResponse,
@@ -9,7 +11,13 @@ from ...schemas.student import (
     DepartmentAndStudyPlanRequest, DestinationsResponse,
     DestinationUniversityRequest, ExamsAnalysisResponse
 )
-from ...services.rag_service import get_call_summary, get_available_universities, get_available_departments
+from ...services.rag_service import (
+    get_call_summary, stream_call_summary, get_available_universities, get_available_departments
+)
+from ...services.exams_context import COURSE_DOCUMENT_TYPES
+from ...services.llm_gateway import LLMUnavailableError
+from ...core.executors import run_blocking
+from ...core.config import settings
 from uuid import uuid4
 
 router = APIRouter()
@@ -21,7 +29,7 @@ async def list_available_universities():
     Questa lista può essere usata nel frontend per popolare un menu a tendina.
     """
     try:
-        universities = get_available_universities()
+        universities = await run_blocking("db", get_available_universities)
         return universities
     except Exception as e:
         print(f"Errore nell'endpoint /universities: {e}")
@@ -39,7 +47,7 @@ async def get_erasmus_program(body: UniversityRequest, req: Request):
 
         # Crea una sessione e memorizza l'università scelta
         session_id = str(uuid4())
-        req.app.state.session_store[session_id] = {"home_university": body.home_university}
+        await run_blocking("db", req.app.state.session_store.set, session_id, {"home_university": body.home_university})
 
         # Includi il session_id nella risposta
         return ErasmusProgramResponse(**{**result, "session_id": session_id})
@@ -48,6 +56,45 @@ async def get_erasmus_program(body: UniversityRequest, req: Request):
         print(f"Errore nell'endpoint /step1: {e}")
         raise HTTPException(status_code=500, detail=f"Si è verificato un errore interno: {e}")
 
+def _sse_event(event: str, data: dict) -> str:
+    """Serializza un evento Server-Sent Events (una riga `data:` con JSON)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/step1/stream")
+async def stream_erasmus_program(body: UniversityRequest, req: Request):
+    """
+    STEP 1 (streaming): come /step1, ma il riassunto viene inviato come
+    Server-Sent Events man mano che Gemini lo genera.
+
+    Eventi emessi, in ordine:
+    - `session`: {"session_id"} subito, prima di qualsiasi chiamata all'LLM
+    - `summary`: {"html"} con il riassunto parziale già convertito in HTML (uno per chunk)
+    - `done`: {"has_program", "summary", "session_id"} con il riassunto completo
+    - `error`: {"detail"} se la generazione fallisce
+    """
+    # Crea subito la sessione, così il frontend può usarla anche durante lo streaming
+    session_id = str(uuid4())
+    await run_blocking("db", req.app.state.session_store.set, session_id, {"home_university": body.home_university})
+
+    async def event_stream():
+        yield _sse_event("session", {"session_id": session_id})
+        try:
+            async for event in stream_call_summary(body.home_university):
+                name = event.pop("event")
+                if name == "done":
+                    event["session_id"] = session_id
+                yield _sse_event(name, event)
+        except Exception as e:
+            print(f"Errore nell'endpoint /step1/stream: {e}")
+            yield _sse_event("error", {"detail": f"Si è verificato un errore interno: {e}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Evita che proxy (es. nginx) accumulino la risposta prima di inoltrarla
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/departments", response_model=DepartmentsListResponse)
 async def get_departments_list(request: DepartmentsListRequest, req: Request):
     """
@@ -56,7 +103,7 @@ async def get_departments_list(request: DepartmentsListRequest, req: Request):
     """
     try:
         # Recupera la home_university dalla sessione
-        session = req.app.state.session_store.get(request.session_id)
+        session = await run_blocking("db", req.app.state.session_store.get, request.session_id)
         if not session or "home_university" not in session:
             raise HTTPException(status_code=400, detail="Sessione non valida o scaduta. Rieseguire lo Step 1.")
 
@@ -78,20 +125,28 @@ async def analyze_destinations(request: DepartmentAndStudyPlanRequest, req: Requ
     """
     try:
         # Recupera la home_university dalla sessione
-        session = req.app.state.session_store.get(request.session_id)
+        session = await run_blocking("db", req.app.state.session_store.get, request.session_id)
         if not session or "home_university" not in session:
             raise HTTPException(status_code=400, detail="Sessione non valida o scaduta. Rieseguire lo Step 1.")
 
         home_university = session["home_university"]
         
         # Salva il periodo nella sessione per usarlo nello step3
-        session["period"] = request.period.value  # .value per ottenere la stringa dall'enum
+        await run_blocking("db", req.app.state.session_store.update, request.session_id, period=request.period.value)  # .value per ottenere la stringa dall'enum
 
         # Chiamata al servizio per analizzare le destinazioni del dipartimento
         from ...services.rag_service import analyze_destinations_for_department
         destinations_list = await analyze_destinations_for_department(home_university=home_university, department=request.department, period=request.period)
 
         return DestinationsResponse(destinations=destinations_list)
+    except LLMUnavailableError as e:
+        # Circuito aperto o Gemini irraggiungibile: come il pool "password", 503 con Retry-After
+        print(f"⚠️ Step 2 non disponibile: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="L'analisi delle destinazioni non è al momento disponibile, riprova tra qualche istante",
+            headers={"Retry-After": str(math.ceil(settings.LLM_CIRCUIT_RESET_SECONDS))}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -108,7 +163,7 @@ async def analyze_exams(
     """
     try:
         # Verifica la sessione
-        session = req.app.state.session_store.get(session_id)
+        session = await run_blocking("db", req.app.state.session_store.get, session_id)
         if not session or "home_university" not in session:
             raise HTTPException(status_code=400, detail="Sessione non valida o scaduta.")
         
@@ -130,7 +185,7 @@ async def analyze_exams(
             # Estrai il testo dal PDF del piano di studi
             from ...services.rag_service import extract_text_from_pdf, analyze_exams_compatibility
             
-            study_plan_text = extract_text_from_pdf(tmp_file_path)
+            study_plan_text = await run_blocking("pdf", extract_text_from_pdf, tmp_file_path, use_cache=False)
             print(f"📚 Piano di studi estratto: {len(study_plan_text)} caratteri")
             print(f"📅 Periodo selezionato: {period if period else 'Non specificato'}")
             
@@ -172,9 +227,9 @@ async def download_exam_pdf(filename: str):
             SELECT file_path, original_filename 
             FROM uploaded_documents 
             WHERE stored_filename = ? 
-            AND document_type = 'corsi_erasmus' 
+            AND document_type IN (?, ?)
             AND is_active = 1
-        ''', (filename,))
+        ''', (filename, *COURSE_DOCUMENT_TYPES))
         
         doc = cursor.fetchone()
         conn.close()
@@ -16,14 +16,32 @@ from ...schemas.university import (
     UniversityDocumentsResponse,
     ActiveCallsListResponse,
     ActiveCallInfo,
-    DocumentInfo
+    DocumentInfo,
+    IngestionJobResponse
 )
+from ...core.config import settings
 from ...core.database import db_manager
 from ...core.auth import create_access_token, get_current_university
+from ...core.executors import run_blocking, ExecutorBusyError
+from ...services.llm_cache import llm_cache
+from ...services.ingestion_service import ingestion_queue
+from ...services.exams_context import COURSE_DOCUMENT_TYPES, COURSES_CATEGORY
 
 router = APIRouter()
 
 
+async def _run_password(fn, *args):
+    """Esegue hash/verifica bcrypt nel pool "password"; se la coda è piena risponde 503."""
+    try:
+        return await run_blocking("password", fn, *args)
+    except ExecutorBusyError:
+        raise HTTPException(
+            status_code=503,
+            detail="Troppe richieste di accesso in corso, riprova tra qualche secondo",
+            headers={"Retry-After": "2"}
+        )
+
+
 @router.post("/register", status_code=201)
 async def register_university(request: UniversityRegisterRequest):
     """
@@ -37,13 +55,16 @@ async def register_university(request: UniversityRegisterRequest):
             # Controllo più permissivo - accetta qualsiasi dominio ma avvisa
             print(f"⚠️ Email potenzialmente non istituzionale: {request.institutional_email}")
         
-        # Crea l'università nel database
-        university_id = db_manager.create_university(
+        # Hash della password fuori dall'event loop, poi crea l'università nel database
+        password_hash = await _run_password(db_manager.hash_password, request.password)
+        university_id = await run_blocking(
+            "db", db_manager.create_university,
             university_name=request.university_name,
             institutional_email=request.institutional_email,
             password=request.password,
             contact_person=request.contact_person,
-            phone=request.phone
+            phone=request.phone,
+            password_hash=password_hash
         )
         
         if not university_id:
@@ -74,7 +95,7 @@ async def login_university(request: UniversityLoginRequest):
     """
     try:
         # Recupera l'università dal database
-        university = db_manager.get_university_by_email(request.institutional_email)
+        university = await run_blocking("db", db_manager.get_university_by_email, request.institutional_email)
         
         if not university:
             raise HTTPException(
@@ -82,15 +103,24 @@ async def login_university(request: UniversityLoginRequest):
                 detail="Email o password non corretti"
             )
         
-        # Verifica la password
-        if not db_manager.verify_password(request.password, university['password_hash']):
+        # Verifica la password (bcrypt, nel pool dedicato)
+        if not await _run_password(db_manager.verify_password, request.password, university['password_hash']):
             raise HTTPException(
                 status_code=401,
                 detail="Email o password non corretti"
             )
         
+        # Se BCRYPT_ROUNDS è cambiato, aggiorna l'hash ora che la password in chiaro è disponibile
+        if db_manager.password_needs_rehash(university['password_hash']):
+            try:
+                new_hash = await _run_password(db_manager.hash_password, request.password)
+                await run_blocking("db", db_manager.update_password_hash, university['id'], new_hash)
+                print(f"🔐 Hash della password aggiornato (costo {settings.BCRYPT_ROUNDS}) per {university['institutional_email']}")
+            except HTTPException:
+                pass  # pool occupato: si riproverà al prossimo login
+        
         # Aggiorna timestamp ultimo login
-        db_manager.update_last_login(university['id'])
+        await run_blocking("db", db_manager.update_last_login, university['id'])
         
         # Crea il token JWT
         token_data = {
@@ -122,7 +152,7 @@ async def get_profile(current_university: dict = Depends(get_current_university)
     Richiede autenticazione tramite token JWT.
     """
     try:
-        university = db_manager.get_university_by_id(current_university['university_id'])
+        university = await run_blocking("db", db_manager.get_university_by_id, current_university['university_id'])
         
         if not university:
             raise HTTPException(status_code=404, detail="Università non trovata")
@@ -178,7 +208,8 @@ async def upload_erasmus_call(
             shutil.copyfileobj(file.file, buffer)
         
         # Registra il documento nel database
-        doc_id = db_manager.add_document(
+        doc_id = await run_blocking(
+            "db", db_manager.add_document,
             university_id=current_university['university_id'],
             document_type='erasmus_call',
             original_filename=file.filename,
@@ -195,45 +226,20 @@ async def upload_erasmus_call(
                 detail="Errore nel salvataggio delle informazioni del documento"
             )
         
-        # INDEXING NEL VECTOR STORE - Solo per i bandi!
-        try:
-            from ...services.document_service import process_calls
-            from ...services.vector_db_service import create_vector_store
-            
-            print(f"📚 Inizio indicizzazione del bando nel vector store...")
-            
-            # Processa solo il file appena caricato
-            from langchain.document_loaders import PyPDFLoader
-            from langchain.text_splitter import RecursiveCharacterTextSplitter
-            
-            loader = PyPDFLoader(str(file_path))
-            pages = loader.load()
-            
-            # Aggiungi metadata
-            for page in pages:
-                page.metadata["source"] = stored_filename
-                page.metadata["university"] = current_university['university_name']
-            
-            # Dividi in chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-            )
-            chunks = text_splitter.split_documents(pages)
-            
-            # Crea/aggiorna vector store
-            create_vector_store(chunks, category='calls')
-            
-            print(f"✅ Indicizzati {len(chunks)} chunks nel vector store")
-        except Exception as e:
-            print(f"⚠️ Errore nell'indicizzazione (il documento è comunque salvato): {e}")
-            # Non blocchiamo l'upload se l'indicizzazione fallisce
+        # Il nuovo bando sostituisce i precedenti: i riassunti in cache non sono più validi
+        await run_blocking(
+            "db", llm_cache.invalidate_university, current_university['university_id'], kind='call_summary'
+        )
+
+        # Estrazione, chunking ed embedding nel vector store avvengono in background
+        job_id = await ingestion_queue.enqueue(doc_id, current_university['university_id'], 'erasmus_call')
         
         return DocumentUploadResponse(
             document_id=doc_id,
             message="Bando Erasmus caricato con successo",
             filename=stored_filename,
-            upload_date=datetime.now().isoformat()
+            upload_date=datetime.now().isoformat(),
+            job_id=job_id
         )
     
     except HTTPException:
@@ -267,7 +273,8 @@ async def upload_destinations(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        doc_id = db_manager.add_document(
+        doc_id = await run_blocking(
+            "db", db_manager.add_document,
             university_id=current_university['university_id'],
             document_type='destinazioni',
             original_filename=file.filename,
@@ -280,14 +287,16 @@ async def upload_destinations(
             os.unlink(file_path)
             raise HTTPException(status_code=500, detail="Errore nel salvataggio delle informazioni del documento")
 
-        # Le destinazioni NON vengono indicizzate nel vector store
-        # Vengono processate on-demand quando richieste dal servizio RAG
+        # Le destinazioni NON vengono indicizzate nel vector store: le righe vengono
+        # salvate in background nella tabella strutturata `destinations`
+        job_id = await ingestion_queue.enqueue(doc_id, current_university['university_id'], 'destinazioni')
 
         return DocumentUploadResponse(
             document_id=doc_id,
             message="File destinazioni caricato con successo",
             filename=stored_filename,
-            upload_date=datetime.now().isoformat()
+            upload_date=datetime.now().isoformat(),
+            job_id=job_id
         )
 
     except HTTPException:
@@ -319,7 +328,8 @@ async def upload_erasmus_courses(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        doc_id = db_manager.add_document(
+        doc_id = await run_blocking(
+            "db", db_manager.add_document,
             university_id=current_university['university_id'],
             document_type='corsi_erasmus',
             original_filename=file.filename,
@@ -332,11 +342,14 @@ async def upload_erasmus_courses(
             os.unlink(file_path)
             raise HTTPException(status_code=500, detail="Errore nel salvataggio delle informazioni del documento")
 
+        job_id = await ingestion_queue.enqueue(doc_id, current_university['university_id'], 'corsi_erasmus')
+
         return DocumentUploadResponse(
             document_id=doc_id,
             message="File corsi Erasmus caricato con successo",
             filename=stored_filename,
-            upload_date=datetime.now().isoformat()
+            upload_date=datetime.now().isoformat(),
+            job_id=job_id
         )
 
     except HTTPException:
@@ -371,7 +384,8 @@ async def upload_destinations(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        doc_id = db_manager.add_document(
+        doc_id = await run_blocking(
+            "db", db_manager.add_document,
             university_id=current_university['university_id'],
             document_type='destinazioni',
             original_filename=file.filename,
@@ -384,11 +398,14 @@ async def upload_destinations(
             os.unlink(file_path)
             raise HTTPException(status_code=500, detail="Errore nel salvataggio delle informazioni del documento")
 
+        job_id = await ingestion_queue.enqueue(doc_id, current_university['university_id'], 'destinazioni')
+
         return DocumentUploadResponse(
             document_id=doc_id,
             message="File destinazioni caricato con successo",
             filename=stored_filename,
-            upload_date=datetime.now().isoformat()
+            upload_date=datetime.now().isoformat(),
+            job_id=job_id
         )
 
     except HTTPException:
@@ -423,7 +440,8 @@ async def upload_erasmus_courses(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
 
-        doc_id = db_manager.add_document(
+        doc_id = await run_blocking(
+            "db", db_manager.add_document,
             university_id=current_university['university_id'],
             document_type='corsi_erasmus',
             original_filename=file.filename,
@@ -436,11 +454,14 @@ async def upload_erasmus_courses(
             os.unlink(file_path)
             raise HTTPException(status_code=500, detail="Errore nel salvataggio delle informazioni del documento")
 
+        job_id = await ingestion_queue.enqueue(doc_id, current_university['university_id'], 'corsi_erasmus')
+
         return DocumentUploadResponse(
             document_id=doc_id,
             message="File corsi Erasmus caricato con successo",
             filename=stored_filename,
-            upload_date=datetime.now().isoformat()
+            upload_date=datetime.now().isoformat(),
+            job_id=job_id
         )
 
     except HTTPException:
@@ -454,30 +475,28 @@ async def upload_erasmus_courses(
 async def process_destinations_endpoint(document_id: int, current_university: dict = Depends(get_current_university)):
     """
     Endpoint che forza il processamento delle destinazioni per il documento dato.
-    Chiama le funzioni di servizio per estrarre e preprocessare il testo.
+    Ri-estrae le righe del PDF e aggiorna la tabella strutturata delle destinazioni.
     """
     try:
         # Recupera il documento
-        documents = db_manager.get_university_documents(university_id=current_university['university_id'])
+        documents = await run_blocking(
+            "db", db_manager.get_university_documents, university_id=current_university['university_id']
+        )
         document = next((d for d in documents if d['id'] == document_id), None)
         if not document:
             raise HTTPException(status_code=404, detail="Documento non trovato")
 
-        # Importa il servizio e forza il processamento (ricrea il file processed)
-        from ...services.rag_service import analyze_destinations_for_department
-        # Qui non conosciamo il dipartimento: limitiamo all'estrazione generale => ricreiamo il file processed
-        # Chiamiamo la funzione con valori placeholder per forzare l'estrazione
-        # Nota: la funzione salva il file processed nel path standard
-        home_university = current_university['university_name'].lower().replace(' ', '_')
-        # Invoke extraction by calling analyze_destinations_for_department with a dummy dept and period,
-        # wrapped in try/except because la funzione usa Gemini e può fallire
-        try:
-            await analyze_destinations_for_department(home_university, department='ALL', period='')
-        except Exception as e:
-            # Non blocchiamo l'endpoint in caso di errori di AI; restituiamo comunque successo parziale
-            print(f"Errore durante il processamento delle destinazioni: {e}")
-
-        return {"message": "Processamento destinazioni avviato"}
+        if document['document_type'] != 'destinazioni':
+            raise HTTPException(status_code=400, detail="Il documento non è un file di destinazioni")
+
+        # Ri-parsa le righe del PDF nella tabella strutturata delle destinazioni
+        from ...services.destinations_service import index_destinations_document
+        rows_count = await run_blocking(
+            "pdf", index_destinations_document,
+            document_id, current_university['university_id'], document['file_path']
+        )
+
+        return {"message": "Processamento destinazioni completato", "destinations": rows_count}
 
     except HTTPException:
         raise
@@ -496,7 +515,8 @@ async def get_my_documents(
     Opzionalmente filtra per tipo di documento.
     """
     try:
-        documents = db_manager.get_university_documents(
+        documents = await run_blocking(
+            "db", db_manager.get_university_documents,
             university_id=current_university['university_id'],
             document_type=document_type
         )
@@ -533,7 +553,14 @@ async def delete_document(
     Disattiva (soft delete) un documento caricato dall'università.
     """
     try:
-        success = db_manager.deactivate_document(
+        documents = await run_blocking(
+            "db", db_manager.get_university_documents,
+            university_id=current_university['university_id']
+        )
+        document = next((doc for doc in documents if doc['id'] == document_id), None)
+
+        success = await run_blocking(
+            "db", db_manager.deactivate_document,
             document_id=document_id,
             university_id=current_university['university_id']
         )
@@ -544,6 +571,32 @@ async def delete_document(
                 detail="Documento non trovato o non autorizzato"
             )
         
+        # Rimuovi le risposte LLM generate a partire dal documento disattivato
+        await run_blocking("db", llm_cache.invalidate_document, document_id)
+
+        # Rimuovi i chunk del bando dal vector store, così non compaiono più nelle ricerche
+        if document and document['document_type'] == 'erasmus_call':
+            try:
+                from ...services.vector_db_service import delete_source_documents
+                removed = await run_blocking(
+                    "vector", delete_source_documents, category='calls', source=document['stored_filename']
+                )
+                print(f"🗑️ Rimossi {removed} chunks del bando dal vector store")
+            except Exception as e:
+                print(f"⚠️ Errore nella rimozione dei chunks dal vector store: {e}")
+
+        # Stesso discorso per i cataloghi dei corsi usati dallo step 3
+        if document and document['document_type'] in COURSE_DOCUMENT_TYPES:
+            try:
+                from ...services.vector_db_service import delete_source_documents
+                removed = await run_blocking(
+                    "vector", delete_source_documents,
+                    category=COURSES_CATEGORY, source=document['stored_filename']
+                )
+                print(f"🗑️ Rimossi {removed} chunks del catalogo dei corsi dal vector store")
+            except Exception as e:
+                print(f"⚠️ Errore nella rimozione dei chunks dal vector store: {e}")
+        
         return {
             "message": "Documento disattivato con successo",
             "document_id": document_id
@@ -556,6 +609,22 @@ async def delete_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(
+    job_id: int,
+    current_university: dict = Depends(get_current_university)
+):
+    """
+    Restituisce lo stato di un job di indicizzazione avviato da un upload
+    (queued, running, completed, failed) con fase e avanzamento.
+    """
+    job = await run_blocking("db", db_manager.get_ingestion_job, job_id)
+    if not job or job['university_id'] != current_university['university_id']:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+
+    return IngestionJobResponse(**job)
+
+
 @router.get("/download/{document_id}")
 async def download_document(
     document_id: int,
@@ -565,7 +634,8 @@ async def download_document(
     Scarica un documento caricato dall'università autenticata.
     """
     try:
-        documents = db_manager.get_university_documents(
+        documents = await run_blocking(
+            "db", db_manager.get_university_documents,
             university_id=current_university['university_id']
         )
         
@@ -627,6 +697,14 @@ async def debug_db_status():
         
         conn.close()
         
+        from ...services.extraction_cache import extraction_cache
+        from ...services.embedding_cache import embedding_cache
+        from ...services.vector_db_service import vector_store_service
+        from ...core.executors import executors_stats
+        from ...core.session_store import session_store
+        from ...core.singleflight import singleflight_stats
+        from ...services.llm_gateway import llm_gateway
+        
         return {
             "universities_count": len(universities),
             "universities": universities,
@@ -640,7 +718,16 @@ async def debug_db_status():
                     "type": call.get('document_type')
                 }
                 for call in active_calls
-            ]
+            ],
+            "extraction_cache": extraction_cache.stats(),
+            "llm_cache": llm_cache.stats(),
+            "llm_gateway": llm_gateway.stats(),
+            "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+            "vector_store": vector_store_service.stats(),
+            "ingestion_queue": ingestion_queue.stats(),
+            "executors": executors_stats(),
+            "sessions": session_store.stats(),
+            "singleflight": singleflight_stats()
         }
     except Exception as e:
         print(f"Errore debug: {e}")
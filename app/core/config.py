@@ -6,6 +6,27 @@ class Settings(BaseSettings):
     # Chiave API per Google Gemini
     GOOGLE_API_KEY: str | None = None
 
+    # --- Provider LLM ---
+    # "gemini" oppure "fake" (locale, senza rete: per load test e misure di latenza)
+    LLM_PROVIDER: str = "gemini"
+    FAKE_LLM_LATENCY_MS: float = 800.0  # latenza media prima del primo token
+    FAKE_LLM_LATENCY_JITTER_MS: float = 300.0
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = "lognormal"  # "fixed", "normal" o "lognormal"
+    FAKE_LLM_TOKENS_PER_SECOND: float = 120.0  # 0 = risposta istantanea dopo la latenza iniziale
+    FAKE_LLM_PROMPT_TOKENS_PER_SECOND: float = 0.0  # lettura del prompt; 0 = indipendente dalla lunghezza
+    FAKE_LLM_SEED: int | None = None
+
+    # --- Gateway LLM (vedi app/services/llm_gateway.py) ---
+    LLM_MAX_CONCURRENCY: int = 16  # chiamate contemporanee in totale
+    LLM_PURPOSE_MAX_CONCURRENCY: int = 8  # chiamate contemporanee per scopo (step)
+    LLM_TIMEOUT_SECONDS: float = 60.0  # singolo tentativo
+    LLM_DEADLINE_SECONDS: float = 120.0  # attesa in coda + tentativi + backoff
+    LLM_MAX_RETRIES: int = 2
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 10.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # errori transitori consecutivi che aprono il circuito
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+
     # --- JWT Authentication ---
     JWT_SECRET_KEY: str = "your-secret-key-change-this-in-production-use-env-variable"
     JWT_ALGORITHM: str = "HS256"
@@ -13,6 +34,91 @@ class Settings(BaseSettings):
 
     # --- Percorsi Applicazione ---
     DB_PATH: str = str(Path(__file__).parent.parent.parent / "vector_db")
+    UNIVERSITIES_DB_PATH: str | None = None  # None = data/universities.db
+
+    # --- Client Chroma condivisi (uno per categoria) ---
+    VECTOR_STORE_MAX_LOADED: int = 4
+    VECTOR_STORE_IDLE_SECONDS: int = 1800  # 30 minuti
+
+    # --- Embedding (vedi app/services/embeddings.py) ---
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"  # "torch" o "onnx" (richiede sentence-transformers[onnx])
+    EMBEDDING_BATCH_SIZE: int = 32  # come encode() di default; valori maggiori aiutano solo con più core
+    EMBEDDING_THREADS: int = 0  # 0 = default del backend (con PyTorch vale per tutto il processo)
+    EMBEDDING_QUANTIZE: bool = False  # pesi int8
+    EMBEDDING_ONNX_FILE: str | None = None  # es. "onnx/model_qint8_avx512.onnx"
+    EMBEDDING_FLOAT16: bool = False  # vettori arrotondati a float16
+
+    # --- Estrazione del testo dai PDF ---
+    # Motore per il testo semplice: "auto" (PyMuPDF), "pymupdf" o "pdfplumber";
+    # le tabelle delle destinazioni usano sempre pdfplumber
+    PDF_TEXT_ENGINE: str = "auto"
+    PDF_PARALLEL_MIN_PAGES: int = 40  # sotto questa soglia le pagine sono estratte in sequenza
+    PDF_EXTRACTION_WORKERS: int = 0  # 0 = numero di CPU - 1
+
+    # --- Pool di thread per il lavoro bloccante degli endpoint async ---
+    PDF_POOL_WORKERS: int = 4
+    VECTOR_POOL_WORKERS: int = 4
+    DB_POOL_WORKERS: int = 8
+    EXECUTOR_MAX_QUEUE: int = 64  # job in attesa per pool oltre i quali le richieste aspettano
+
+    # --- Hash delle password (bcrypt) ---
+    BCRYPT_ROUNDS: int = 12  # gli hash con un costo diverso vengono aggiornati al login successivo
+    PASSWORD_POOL_WORKERS: int = 2
+    PASSWORD_MAX_QUEUE: int = 32  # login/registrazioni in attesa oltre i quali si risponde 503
+
+    # --- Cache del testo estratto dai PDF ---
+    CACHE_DB_PATH: str = str(Path(__file__).parent.parent.parent / "data" / "cache.db")
+    EXTRACTION_CACHE_MAX_ENTRIES: int = 200
+    EXTRACTION_CACHE_MAX_BYTES: int = 200 * 1024 * 1024  # 200 MB
+
+    # --- Cache degli embedding dei chunk (tabella embeddings di cache.db) ---
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000  # ~300 MB in float32 con 384 dimensioni
+    EMBEDDING_CACHE_FLOAT16: bool = False  # vettori salvati in float16 (metà spazio)
+
+    # --- Cache delle risposte LLM (riassunti dei bandi) ---
+    LLM_CACHE_ENABLED: bool = True
+
+    # --- Retrieval dei chunk dei bandi (step 1) ---
+    # "hybrid": BM25 + similarità vettoriale, una query per ogni punto del riassunto
+    # "vector": una sola query di similarità (comportamento precedente)
+    CALL_RETRIEVAL_MODE: str = "hybrid"
+    HYBRID_RRF_K: int = 60  # costante della Reciprocal Rank Fusion
+    HYBRID_CANDIDATES: int = 20  # risultati letti da ogni indice per ogni query
+
+    # --- Riassunto dei bandi lunghi senza chunk dal vector DB (step 1) ---
+    # "map_reduce": riassunto per sezioni concorrenti, poi riassunto finale delle note
+    # "truncate": solo i primi caratteri del bando (comportamento precedente)
+    CALL_SUMMARY_LONG_MODE: str = "map_reduce"
+    CALL_SUMMARY_SECTION_CHARS: int = 8000
+    CALL_SUMMARY_MAP_CONCURRENCY: int = 4  # chiamate LLM contemporanee per bando
+
+    # --- Coalescenza delle richieste identiche in corso (step 1 e 2) ---
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    # --- Sessioni del percorso studente ---
+    # "memory" (singolo processo) oppure "sqlite" (condiviso tra più worker uvicorn)
+    SESSION_BACKEND: str = "memory"
+    SESSION_TTL_SECONDS: int = 7200  # 2 ore dall'ultimo accesso
+    SESSION_MAX_ENTRIES: int = 10000  # solo backend "memory"
+    SESSION_DB_PATH: str = str(Path(__file__).parent.parent.parent / "data" / "sessions.db")
+    SESSION_SWEEP_SECONDS: int = 300
+
+    # --- Indicizzazione in background dei documenti caricati ---
+    INGESTION_WORKERS: int = 2
+
+    # --- Step 2: destinazioni ---
+    # Se True, Gemini genera solo le descrizioni testuali; i campi arrivano dalla tabella
+    DESTINATIONS_LLM_DESCRIPTIONS: bool = False
+
+    # --- Step 3: contesto dei corsi per l'analisi degli esami ---
+    # "retrieval": solo i chunk del catalogo pertinenti agli esami del piano di studi
+    # "full": l'intero testo del PDF dei corsi (comportamento precedente)
+    EXAMS_CONTEXT_MODE: str = "retrieval"
+    EXAMS_CONTEXT_TOKEN_BUDGET: int = 4000  # token stimati del catalogo nel prompt
+    EXAMS_CONTEXT_TOP_K: int = 3  # chunk recuperati per ogni esame
+    EXAMS_CONTEXT_MAX_EXAMS: int = 40  # esami del piano di studi usati come query
 
     class Config:
         env_file = ".env"
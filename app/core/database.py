@@ -1,27 +1,134 @@
 # app/core/database.py
 import sqlite3
+import threading
 from pathlib import Path
 from typing import Optional
 import bcrypt
 from datetime import datetime
 
+from .config import settings
+from .metrics import timed
+
+
+# Pragma applicati a ogni connessione:
+# WAL permette letture concorrenti durante le scritture, synchronous=NORMAL è sicuro con WAL
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # 16 MB
+)
+
+# Migrazioni dello schema, applicate in ordine in base a PRAGMA user_version.
+# Aggiungere sempre nuove versioni in fondo, senza modificare quelle esistenti.
+MIGRATIONS = [
+    # 1: indici sui percorsi caldi (documenti per università/tipo, bandi attivi, file per nome)
+    (1, [
+        '''CREATE INDEX IF NOT EXISTS idx_documents_university_type
+           ON uploaded_documents(university_id, document_type, is_active, upload_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_documents_type_active
+           ON uploaded_documents(document_type, is_active, upload_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_documents_stored_filename
+           ON uploaded_documents(stored_filename)''',
+    ]),
+    # 2: documenti delle destinazioni già indicizzati (anche quelli senza righe riconosciute)
+    (2, [
+        '''CREATE TABLE IF NOT EXISTS destinations_indexed (
+               document_id INTEGER PRIMARY KEY,
+               row_count INTEGER NOT NULL,
+               indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               FOREIGN KEY (document_id) REFERENCES uploaded_documents(id)
+           )''',
+        '''INSERT OR IGNORE INTO destinations_indexed (document_id, row_count)
+           SELECT document_id, COUNT(*) FROM destinations GROUP BY document_id''',
+    ]),
+]
+
+
+class _PooledConnection:
+    """
+    Connessione riutilizzata dal thread corrente.
+    Si comporta come sqlite3.Connection, ma close() non chiude: annulla solo
+    un'eventuale transazione lasciata aperta, così i metodi esistenti
+    (connect → query → close) restano invariati.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def close(self) -> None:
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+
 class DatabaseManager:
-    """Gestisce il database SQLite per le università."""
+    """Gestisce il database SQLite per le università.
+
+    Ogni thread riusa una propria connessione (thread-local) invece di aprirne
+    una nuova per ogni query; pooled=False ripristina il comportamento precedente.
+    La durata dei metodi pubblici è registrata nelle metriche come fase "db.<metodo>".
+    """
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, pooled: bool = True):
         if db_path is None:
             # Crea il database nella cartella del progetto
             db_path = Path(__file__).parent.parent.parent / "data" / "universities.db"
         
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.pooled = pooled
+        self._local = threading.local()
         self.init_database()
     
-    def get_connection(self):
-        """Crea una connessione al database."""
-        conn = sqlite3.connect(str(self.db_path))
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
         conn.row_factory = sqlite3.Row  # Per accedere ai risultati come dizionari
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def get_connection(self):
+        """Restituisce la connessione al database del thread corrente."""
+        if not self.pooled:
+            return self._connect()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _PooledConnection(self._connect())
+            self._local.conn = conn
+        elif conn.in_transaction:
+            # Transazione lasciata aperta da una query interrotta da un'eccezione
+            conn.rollback()
         return conn
+
+    def _migrate(self, conn) -> None:
+        """Applica le migrazioni con versione maggiore di PRAGMA user_version."""
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            print(f"✅ Migrazione del database alla versione {version} applicata")
+
+    def schema_version(self) -> int:
+        """Versione dello schema (PRAGMA user_version)."""
+        conn = self.get_connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        return version
     
     def init_database(self):
         """Inizializza il database con le tabelle necessarie."""
@@ -59,30 +166,151 @@ class DatabaseManager:
             )
         ''')
         
+        # Tabella destinazioni strutturate (una riga per riga della tabella del PDF)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS destinations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                university_id INTEGER NOT NULL,
+                row_index INTEGER NOT NULL,
+                department TEXT NOT NULL,
+                department_key TEXT NOT NULL,
+                codice_europeo TEXT NOT NULL,
+                nome_istituzione TEXT,
+                codice_area TEXT,
+                descrizione_area TEXT,
+                posti TEXT,
+                posti_num INTEGER,
+                durata_per_posto TEXT,
+                livello TEXT,
+                dettagli_livello TEXT,
+                requisiti_linguistici TEXT,
+                FOREIGN KEY (document_id) REFERENCES uploaded_documents(id),
+                FOREIGN KEY (university_id) REFERENCES universities(id)
+            )
+        ''')
+        
+        # Codici ISCED normalizzati (una riga per codice) per le ricerche per area
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS destination_isced_codes (
+                destination_id INTEGER NOT NULL,
+                isced_code TEXT NOT NULL,
+                PRIMARY KEY (destination_id, isced_code),
+                FOREIGN KEY (destination_id) REFERENCES destinations(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_destinations_document_department
+            ON destinations(document_id, department_key)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_destinations_codice_europeo
+            ON destinations(codice_europeo)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_destinations_university
+            ON destinations(university_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_destination_isced_code
+            ON destination_isced_codes(isced_code)
+        ''')
+        
+        # Indice dei dipartimenti per documento (offset delle sezioni nel testo in cache)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS department_index (
+                document_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                source_key TEXT NOT NULL,
+                name TEXT,
+                header_norm TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL,
+                start_char INTEGER NOT NULL,
+                end_char INTEGER NOT NULL,
+                PRIMARY KEY (document_id, position),
+                FOREIGN KEY (document_id) REFERENCES uploaded_documents(id)
+            )
+        ''')
+        
+        # Job di indicizzazione in background dei documenti caricati
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                university_id INTEGER NOT NULL,
+                document_type TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                FOREIGN KEY (document_id) REFERENCES uploaded_documents(id),
+                FOREIGN KEY (university_id) REFERENCES universities(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status
+            ON ingestion_jobs(status)
+        ''')
+        
         conn.commit()
+        self._migrate(conn)
         conn.close()
     
+    @timed("password.hash")
     def hash_password(self, password: str) -> str:
-        """Genera l'hash della password usando bcrypt."""
-        salt = bcrypt.gensalt()
+        """Genera l'hash della password usando bcrypt (costo BCRYPT_ROUNDS).
+
+        Operazione lenta (~250 ms): dagli endpoint async va eseguita nel pool "password".
+        """
+        salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     
+    @timed("password.verify")
     def verify_password(self, password: str, password_hash: str) -> bool:
         """Verifica se la password corrisponde all'hash."""
         return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
     
+    def password_needs_rehash(self, password_hash: str) -> bool:
+        """True se l'hash è stato generato con un costo diverso da BCRYPT_ROUNDS."""
+        try:
+            # Formato: $2b$<costo>$<salt+hash>
+            return int(password_hash.split('$')[2]) != settings.BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return True
+    
+    @timed("db.update_password_hash")
+    def update_password_hash(self, university_id: int, password_hash: str):
+        """Sostituisce l'hash della password (aggiornamento del costo al login)."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE universities SET password_hash = ? WHERE id = ?",
+            (password_hash, university_id)
+        )
+        conn.commit()
+        conn.close()
+    
+    @timed("db.create_university")
     def create_university(self, university_name: str, institutional_email: str, 
-                         password: str, contact_person: str = None, phone: str = None) -> Optional[int]:
+                         password: str, contact_person: str = None, phone: str = None,
+                         password_hash: str = None) -> Optional[int]:
         """
         Crea una nuova università nel database.
+        Se password_hash è già stato calcolato (pool "password") non viene ricalcolato.
         Restituisce l'ID dell'università creata o None in caso di errore.
         """
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            password_hash = self.hash_password(password)
+            password_hash = password_hash or self.hash_password(password)
             
             cursor.execute('''
                 INSERT INTO universities 
@@ -99,6 +327,7 @@ class DatabaseManager:
             print(f"Errore creazione università: {e}")
             return None
     
+    @timed("db.get_university_by_email")
     def get_university_by_email(self, email: str) -> Optional[dict]:
         """Recupera un'università tramite email."""
         conn = self.get_connection()
@@ -115,6 +344,7 @@ class DatabaseManager:
             return dict(row)
         return None
     
+    @timed("db.get_university_by_id")
     def get_university_by_id(self, university_id: int) -> Optional[dict]:
         """Recupera un'università tramite ID."""
         conn = self.get_connection()
@@ -131,6 +361,7 @@ class DatabaseManager:
             return dict(row)
         return None
     
+    @timed("db.update_last_login")
     def update_last_login(self, university_id: int):
         """Aggiorna il timestamp dell'ultimo login."""
         conn = self.get_connection()
@@ -145,6 +376,7 @@ class DatabaseManager:
         conn.commit()
         conn.close()
     
+    @timed("db.add_document")
     def add_document(self, university_id: int, document_type: str, 
                     original_filename: str, stored_filename: str, 
                     file_path: str, academic_year: str = None) -> Optional[int]:
@@ -173,6 +405,7 @@ class DatabaseManager:
             print(f"Errore aggiunta documento: {e}")
             return None
     
+    @timed("db.get_university_documents")
     def get_university_documents(self, university_id: int, document_type: str = None, 
                                  is_active: bool = True) -> list:
         """Recupera i documenti di un'università."""
@@ -197,6 +430,7 @@ class DatabaseManager:
         
         return [dict(row) for row in rows]
     
+    @timed("db.deactivate_document")
     def deactivate_document(self, document_id: int, university_id: int) -> bool:
         """Disattiva un documento (soft delete)."""
         conn = self.get_connection()
@@ -214,6 +448,24 @@ class DatabaseManager:
         
         return affected > 0
     
+    @timed("db.get_document")
+    def get_document(self, document_id: int) -> Optional[dict]:
+        """Recupera un documento caricato tramite ID (attivo o meno)."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT * FROM uploaded_documents WHERE id = ?
+        ''', (document_id,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            return dict(row)
+        return None
+    
+    @timed("db.get_all_active_calls")
     def get_all_active_calls(self) -> list:
         """Recupera tutti i bandi attivi (per gli studenti)."""
         conn = self.get_connection()
@@ -236,9 +488,210 @@ class DatabaseManager:
         
         return [dict(row) for row in rows]
 
+    # ----------------------
+    # Destinazioni strutturate
+    # ----------------------
+    @timed("db.replace_destinations")
+    def replace_destinations(self, document_id: int, university_id: int, rows: list) -> None:
+        """
+        Sostituisce le destinazioni salvate per un documento con le righe fornite
+        e lo segna come indicizzato (destinations_indexed), anche se le righe sono zero.
+        Ogni riga deve contenere 'department', 'department_key' e i campi della tabella.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                DELETE FROM destination_isced_codes WHERE destination_id IN (
+                    SELECT id FROM destinations WHERE document_id = ?
+                )
+            ''', (document_id,))
+            cursor.execute('DELETE FROM destinations WHERE document_id = ?', (document_id,))
+            
+            for index, row in enumerate(rows):
+                posti = row.get('posti') or ''
+                posti_num = int(posti) if posti.strip().isdigit() else None
+                cursor.execute('''
+                    INSERT INTO destinations
+                    (document_id, university_id, row_index, department, department_key,
+                     codice_europeo, nome_istituzione, codice_area, descrizione_area,
+                     posti, posti_num, durata_per_posto, livello, dettagli_livello,
+                     requisiti_linguistici)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (document_id, university_id, index, row['department'], row['department_key'],
+                      row.get('codice_europeo'), row.get('nome_istituzione'), row.get('codice_area'),
+                      row.get('descrizione_area'), posti, posti_num, row.get('durata_per_posto'),
+                      row.get('livello'), row.get('dettagli_livello'), row.get('requisiti_linguistici')))
+                destination_id = cursor.lastrowid
+                
+                isced_codes = {c.strip() for c in (row.get('codice_area') or '').split(',') if c.strip()}
+                cursor.executemany(
+                    'INSERT OR IGNORE INTO destination_isced_codes (destination_id, isced_code) VALUES (?, ?)',
+                    [(destination_id, code) for code in sorted(isced_codes)]
+                )
+            
+            # Marcatore esplicito: il documento è indicizzato anche se il parser non ha trovato righe
+            cursor.execute('''
+                INSERT OR REPLACE INTO destinations_indexed (document_id, row_count, indexed_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', (document_id, len(rows)))
+            
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @timed("db.is_destinations_indexed")
+    def is_destinations_indexed(self, document_id: int) -> bool:
+        """True se le destinazioni del documento sono già state estratte (anche zero righe)."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM destinations_indexed WHERE document_id = ?', (document_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return row is not None
+    
+    @timed("db.query_destinations")
+    def query_destinations(self, document_id: int = None, university_id: int = None,
+                           department_key: str = None, isced_code: str = None,
+                           codice_europeo: str = None) -> list:
+        """
+        Interroga la tabella delle destinazioni con filtri opzionali (tutti indicizzati).
+        Le righe sono restituite nell'ordine del documento originale.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        query = 'SELECT d.* FROM destinations d'
+        conditions = []
+        params = []
+        
+        if isced_code:
+            query += ' JOIN destination_isced_codes i ON i.destination_id = d.id'
+            conditions.append('i.isced_code = ?')
+            params.append(isced_code)
+        if document_id is not None:
+            conditions.append('d.document_id = ?')
+            params.append(document_id)
+        if university_id is not None:
+            conditions.append('d.university_id = ?')
+            params.append(university_id)
+        if department_key:
+            conditions.append('d.department_key = ?')
+            params.append(department_key)
+        if codice_europeo:
+            conditions.append('d.codice_europeo = ?')
+            params.append(codice_europeo)
+        
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY d.document_id, d.row_index'
+        
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    @timed("db.replace_department_index")
+    def replace_department_index(self, document_id: int, source_key: str, entries: list) -> None:
+        """Sostituisce l'indice dei dipartimenti di un documento."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('DELETE FROM department_index WHERE document_id = ?', (document_id,))
+            cursor.executemany('''
+                INSERT INTO department_index
+                (document_id, position, source_key, name, header_norm, tokens,
+                 start_line, end_line, start_char, end_char)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (document_id, e['position'], source_key, e['name'], e['header_norm'], e['tokens'],
+                 e['start_line'], e['end_line'], e['start_char'], e['end_char'])
+                for e in entries
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @timed("db.get_department_index")
+    def get_department_index(self, document_id: int) -> list:
+        """Restituisce l'indice dei dipartimenti di un documento, nell'ordine del testo."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM department_index
+            WHERE document_id = ?
+            ORDER BY position
+        ''', (document_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    # ----------------------
+    # Job di indicizzazione
+    # ----------------------
+    @timed("db.create_ingestion_job")
+    def create_ingestion_job(self, document_id: int, university_id: int, document_type: str) -> int:
+        """Registra un nuovo job di indicizzazione in stato 'queued'."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO ingestion_jobs (document_id, university_id, document_type, status, stage)
+                VALUES (?, ?, ?, 'queued', 'in coda')
+            ''', (document_id, university_id, document_type))
+            job_id = cursor.lastrowid
+            conn.commit()
+            return job_id
+        finally:
+            conn.close()
+
+    @timed("db.update_ingestion_job")
+    def update_ingestion_job(self, job_id: int, **fields) -> None:
+        """Aggiorna i campi di un job (status, stage, progress, error, started_at, finished_at)."""
+        allowed = {'status', 'stage', 'progress', 'error', 'started_at', 'finished_at'}
+        fields = {k: v for k, v in fields.items() if k in allowed}
+        if not fields:
+            return
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        conn = self.get_connection()
+        try:
+            conn.execute(
+                f'UPDATE ingestion_jobs SET {assignments} WHERE id = ?',
+                (*fields.values(), job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    @timed("db.get_ingestion_job")
+    def get_ingestion_job(self, job_id: int) -> Optional[dict]:
+        """Recupera un job di indicizzazione tramite ID."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM ingestion_jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    @timed("db.get_unfinished_ingestion_jobs")
+    def get_unfinished_ingestion_jobs(self) -> list:
+        """Job rimasti in coda o interrotti (es. riavvio del server), in ordine di creazione."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM ingestion_jobs
+            WHERE status IN ('queued', 'running')
+            ORDER BY id
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
     # ----------------------
     # Utility di amministrazione
     # ----------------------
+    @timed("db.list_universities")
     def list_universities(self) -> list:
         """Ritorna l'elenco delle università (id, university_name, institutional_email)."""
         conn = self.get_connection()
@@ -248,6 +701,7 @@ class DatabaseManager:
         conn.close()
         return [dict(row) for row in rows]
 
+    @timed("db.update_university_name")
     def update_university_name(self, current_name: str, new_name: str) -> bool:
         """Rinomina un'università cercando per nome corrente. Restituisce True se aggiornata."""
         conn = self.get_connection()
@@ -267,6 +721,7 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    @timed("db.update_university_name_by_id")
     def update_university_name_by_id(self, university_id: int, new_name: str) -> bool:
         """Rinomina un'università per ID. Restituisce True se aggiornata."""
         conn = self.get_connection()
@@ -287,4 +742,4 @@ class DatabaseManager:
 
 
 # Istanza singleton del database
-db_manager = DatabaseManager()
+db_manager = DatabaseManager(settings.UNIVERSITIES_DB_PATH)
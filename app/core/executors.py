@@ -0,0 +1,168 @@
+"""Pool di thread dedicati al lavoro bloccante degli endpoint async.
+
+Gli endpoint sono `async def`, ma estrazione dei PDF, query SQLite e ricerche in Chroma
+sono sincrone: eseguite direttamente bloccherebbero l'event loop e con esso tutte le
+altre richieste. Ogni tipo di lavoro ha un pool separato e di dimensione limitata,
+così un PDF lento non occupa i thread delle query veloci:
+1. "pdf": estrazione del testo e parsing delle tabelle (CPU e disco)
+2. "vector": retrieval da Chroma
+3. "db": query SQLite e cache
+4. "password": hash e verifica bcrypt di login e registrazione; quando la coda è piena
+   le richieste vengono rifiutate (ExecutorBusyError) invece di attendere, così un picco
+   di login non accumula richieste in attesa a scapito del traffico degli studenti
+
+Per ogni pool vengono registrate le metriche (job in coda, in esecuzione, completati,
+falliti, attesa media e massima in coda) esposte nell'endpoint di debug.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from .config import settings
+
+
+class ExecutorBusyError(RuntimeError):
+    """Il pool ha raggiunto il limite di job in attesa e non accetta altro lavoro."""
+
+
+class BoundedExecutor:
+    """Pool di thread con dimensione fissa e metriche sulla coda.
+
+    Attributes:
+        name: Nome del pool (usato anche come prefisso dei thread)
+        max_workers: Numero di thread del pool
+        max_queue: Numero massimo di job in attesa (0 = illimitato); oltre questo
+            limite run() attende che si liberi un posto invece di accodare
+        reject_when_full: Se True, oltre max_queue run() solleva ExecutorBusyError
+            invece di attendere
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0, reject_when_full: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.reject_when_full = reject_when_full
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        # Limita i job accodati: un semaforo per event loop (un asyncio.Semaphore è legato
+        # al loop in cui viene usato, e script e test possono chiamare più volte asyncio.run)
+        self._admission: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _call(self, submitted_at: float, fn: Callable, *args, **kwargs):
+        waited = time.perf_counter() - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.active -= 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+        return result
+
+    def _admission_semaphore(self):
+        """Semaforo di ammissione dell'event loop corrente (None se la coda è illimitata)."""
+        if not self.max_queue:
+            return None
+        loop = asyncio.get_running_loop()
+        semaphore = self._admission.get(loop)
+        if semaphore is None:
+            semaphore = self._admission[loop] = asyncio.Semaphore(self.max_workers + self.max_queue)
+        return semaphore
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Esegue fn(*args, **kwargs) in un thread del pool e ne attende il risultato."""
+        admission = self._admission_semaphore()
+        if admission is not None:
+            if self.reject_when_full and admission.locked():
+                with self._lock:
+                    self.rejected += 1
+                raise ExecutorBusyError(f"Pool '{self.name}' occupato: troppi job in attesa")
+            await admission.acquire()
+        try:
+            with self._lock:
+                self.queued += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queued)
+            loop = asyncio.get_running_loop()
+            call = functools.partial(self._call, time.perf_counter(), fn, *args, **kwargs)
+            return await loop.run_in_executor(self._executor, call)
+        finally:
+            if admission is not None:
+                admission.release()
+
+    def stats(self) -> dict:
+        """Metriche correnti del pool."""
+        with self._lock:
+            started = self.completed + self.failed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Pool condivisi, dimensionati da configurazione
+executors: Dict[str, BoundedExecutor] = {
+    "pdf": BoundedExecutor("pdf", settings.PDF_POOL_WORKERS, settings.EXECUTOR_MAX_QUEUE),
+    "vector": BoundedExecutor("vector", settings.VECTOR_POOL_WORKERS, settings.EXECUTOR_MAX_QUEUE),
+    "db": BoundedExecutor("db", settings.DB_POOL_WORKERS, settings.EXECUTOR_MAX_QUEUE),
+    "password": BoundedExecutor(
+        "password", settings.PASSWORD_POOL_WORKERS, settings.PASSWORD_MAX_QUEUE, reject_when_full=True
+    ),
+}
+
+
+async def run_blocking(pool: str, fn: Callable, *args, **kwargs):
+    """
+    Esegue una funzione bloccante nel pool indicato senza bloccare l'event loop.
+
+    Args:
+        pool: Nome del pool ("pdf", "vector", "db", "password")
+        fn: Funzione sincrona da eseguire
+
+    Raises:
+        KeyError: Se il pool non esiste
+        ExecutorBusyError: Se il pool rifiuta il job perché la coda è piena
+    """
+    return await executors[pool].run(fn, *args, **kwargs)
+
+
+def executors_stats() -> dict:
+    """Metriche di tutti i pool, per l'endpoint di debug."""
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+def shutdown_executors() -> None:
+    for executor in executors.values():
+        executor.shutdown()
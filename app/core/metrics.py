@@ -0,0 +1,260 @@
+"""Metriche di latenza e contatori, esposte in formato testo Prometheus su /metrics.
+
+Implementazione minima senza dipendenze esterne:
+1. Counter e Histogram con etichette, thread-safe (i pool eseguono il lavoro in più thread)
+2. span(stage) / timed(stage): misurano la durata di una fase (estrazione PDF, query,
+   retrieval, chiamata LLM, parsing) nell'istogramma erasmus_stage_duration_seconds
+3. register_stats(): espone come gauge i contatori già calcolati dai servizi
+   (metodi stats() di cache, vector store, pool, sessioni), letti ad ogni scrape
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket (secondi) adatti sia alle query SQLite (ms) sia alle chiamate LLM (decine di s)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[Tuple[str, str], ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Etichette di '{self.name}': attese {self.labelnames}, ricevute {tuple(labels)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Contatore monotono con etichette."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self._header() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    """Istogramma cumulativo (bucket, somma e conteggio) con etichette."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # chiave -> [conteggi per bucket, somma, conteggio]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {k: (list(v[0]), v[1], v[2]) for k, v in self._values.items()}
+        lines = self._header()
+        for key, (counts, total, count) in values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _format_labels(key + (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metriche registrate e sorgenti di gauge calcolate al momento dello scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats_sources: List[Tuple[str, Callable[[], dict], Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metrica '{metric.name}' già registrata")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_stats(self, prefix: str, stats_fn: Callable[[], dict], label: Optional[str] = None) -> None:
+        """
+        Espone come gauge i valori numerici restituiti da stats_fn ad ogni scrape.
+
+        Args:
+            prefix: Prefisso dei nomi delle gauge (es. "erasmus_llm_cache")
+            stats_fn: Funzione che restituisce il dizionario di contatori del servizio
+            label: Se indicato, stats_fn restituisce {valore etichetta: {contatori}}
+                   (es. un dizionario per ogni pool) e il valore diventa l'etichetta
+        """
+        with self._lock:
+            self._stats_sources.append((prefix, stats_fn, label))
+
+    def _render_stats(self) -> List[str]:
+        gauges: Dict[str, List[str]] = {}
+        for prefix, stats_fn, label in self._stats_sources:
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                print(f"⚠️ Metriche '{prefix}' non disponibili: {e}")
+                continue
+            groups = stats.items() if label else [(None, stats)]
+            for label_value, values in groups:
+                labels = ((label, label_value),) if label else ()
+                for key, value in values.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if not isinstance(value, (int, float)):
+                        continue
+                    gauges.setdefault(f"{prefix}_{key}", []).append(
+                        f"{prefix}_{key}{_format_labels(labels)} {_format_value(value)}"
+                    )
+        lines = []
+        for name, samples in gauges.items():
+            lines += [f"# TYPE {name} gauge"] + samples
+        return lines
+
+    def render(self) -> str:
+        """Tutte le metriche in formato testo Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        lines += self._render_stats()
+        return "\n".join(lines) + "\n"
+
+
+# Registro globale e metriche condivise
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "erasmus_stage_duration_seconds", "Durata delle fasi di elaborazione (PDF, SQLite, Chroma, LLM, parsing)",
+    ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "erasmus_stage_errors_total", "Fasi terminate con un'eccezione", ("stage",)
+)
+HTTP_DURATION = registry.histogram(
+    "erasmus_http_request_duration_seconds", "Durata delle richieste HTTP per route",
+    ("method", "route", "status")
+)
+LLM_REQUESTS = registry.counter(
+    "erasmus_llm_requests_total", "Chiamate al provider LLM", ("provider", "purpose", "outcome")
+)
+LLM_TOKENS = registry.counter(
+    "erasmus_llm_tokens_total", "Token stimati (4 caratteri per token) inviati e generati dal provider LLM",
+    ("provider", "purpose", "direction")
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Misura la durata del blocco come fase `stage` (registrando anche gli errori)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage: str):
+    """Decoratore: misura ogni chiamata della funzione (sincrona o async) come fase `stage`."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def estimate_tokens(text: str) -> int:
+    """Stima del numero di token di un testo (circa 4 caratteri per token)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def record_llm_call(provider: str, purpose: Optional[str], prompt: str, completion: str, outcome: str) -> None:
+    """Registra una chiamata LLM: esito e token stimati di prompt e risposta."""
+    purpose = purpose or "other"
+    LLM_REQUESTS.inc(provider=provider, purpose=purpose, outcome=outcome)
+    LLM_TOKENS.inc(estimate_tokens(prompt), provider=provider, purpose=purpose, direction="prompt")
+    LLM_TOKENS.inc(estimate_tokens(completion), provider=provider, purpose=purpose, direction="completion")
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,293 @@
+"""Store delle sessioni del percorso studente (step 1 → step 3).
+
+Ogni step1 crea una sessione con l'università di provenienza; gli step successivi la
+leggono e la aggiornano (es. il periodo scelto nello step 2). Due implementazioni con
+la stessa interfaccia, scelte con SESSION_BACKEND:
+1. "memory": dizionario LRU con scadenza (TTL), per un singolo processo
+2. "sqlite": tabella in un database SQLite in WAL, condivisa tra più worker uvicorn
+
+In entrambi i casi la scadenza è "scorrevole": ogni accesso la sposta in avanti di
+SESSION_TTL_SECONDS. Le sessioni scadute vengono rimosse da sweep(), chiamato
+periodicamente dall'app, e comunque ignorate in lettura.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from .config import settings
+
+
+class SessionStore(ABC):
+    """Interfaccia comune degli store delle sessioni.
+
+    Attributes:
+        ttl_seconds: Durata di una sessione dall'ultimo accesso
+        hits: Letture di sessioni valide
+        misses: Letture di sessioni inesistenti o scadute
+        expired: Sessioni rimosse perché scadute
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def set(self, session_id: str, data: dict) -> None:
+        """Crea o sostituisce una sessione."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[dict]:
+        """Restituisce una copia dei dati della sessione, o None se inesistente o scaduta."""
+
+    @abstractmethod
+    def update(self, session_id: str, **fields) -> bool:
+        """Aggiorna alcuni campi della sessione. Restituisce False se la sessione non esiste."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Rimuove una sessione."""
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Rimuove le sessioni scadute e restituisce quante ne ha rimosse."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Contatori e dimensione dello store."""
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class MemorySessionStore(SessionStore):
+    """Sessioni in memoria, in ordine di ultimo accesso (LRU) e con TTL.
+
+    Oltre max_entries le sessioni usate meno di recente vengono scartate.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self.evicted = 0
+        # session_id -> (dati, scadenza, dimensione stimata in byte)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+
+    def _store(self, session_id: str, data: dict) -> None:
+        size = len(json.dumps(data, ensure_ascii=False))
+        previous = self._sessions.pop(session_id, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+        self._sessions[session_id] = (data, time.time() + self.ttl_seconds, size)
+        self._bytes += size
+
+    def _pop(self, session_id: str) -> None:
+        _, _, size = self._sessions.pop(session_id)
+        self._bytes -= size
+
+    def set(self, session_id: str, data: dict) -> None:
+        with self._lock:
+            self._store(session_id, dict(data))
+            while len(self._sessions) > self.max_entries:
+                self._pop(next(iter(self._sessions)))
+                self.evicted += 1
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry[1] < time.time():
+                self._pop(session_id)
+                self.expired += 1
+                entry = None
+            if entry is not None:
+                # Scadenza scorrevole: l'accesso sposta la sessione in fondo all'LRU
+                self._sessions[session_id] = (entry[0], time.time() + self.ttl_seconds, entry[2])
+                self._sessions.move_to_end(session_id)
+        self._count(entry is not None)
+        return dict(entry[0]) if entry is not None else None
+
+    def update(self, session_id: str, **fields) -> bool:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[1] < time.time():
+                return False
+            self._store(session_id, {**entry[0], **fields})
+            return True
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._pop(session_id)
+
+    def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        with self._lock:
+            # L'ordine LRU coincide con l'ordine di scadenza: ci si ferma alla prima valida
+            while self._sessions:
+                session_id, (_, expires_at, _) = next(iter(self._sessions.items()))
+                if expires_at >= now:
+                    break
+                self._pop(session_id)
+                removed += 1
+            self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_entries": self.max_entries,
+                "approx_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessioni in un database SQLite in WAL, condiviso tra i processi dell'app.
+
+    Ogni thread riusa una propria connessione. Per limitare le scritture, una lettura
+    rinnova la scadenza solo quando ne è trascorsa almeno metà.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._local.conn = conn
+        return conn
+
+    def _init_database(self) -> None:
+        conn = self._get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+        conn.commit()
+
+    def set(self, session_id: str, data: dict) -> None:
+        conn = self._get_connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)',
+            (session_id, json.dumps(data, ensure_ascii=False), time.time() + self.ttl_seconds)
+        )
+        conn.commit()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        conn = self._get_connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT data, expires_at FROM sessions WHERE session_id = ? AND expires_at >= ?',
+            (session_id, now)
+        ).fetchone()
+        if row is not None and row['expires_at'] - now < self.ttl_seconds / 2:
+            conn.execute(
+                'UPDATE sessions SET expires_at = ? WHERE session_id = ?',
+                (now + self.ttl_seconds, session_id)
+            )
+            conn.commit()
+        self._count(row is not None)
+        return json.loads(row['data']) if row is not None else None
+
+    def update(self, session_id: str, **fields) -> bool:
+        conn = self._get_connection()
+        now = time.time()
+        # BEGIN IMMEDIATE: lettura e scrittura atomiche anche tra processi diversi
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?',
+                (session_id, now)
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return False
+            data = {**json.loads(row['data']), **fields}
+            conn.execute(
+                'UPDATE sessions SET data = ?, expires_at = ? WHERE session_id = ?',
+                (json.dumps(data, ensure_ascii=False), now + self.ttl_seconds, session_id)
+            )
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+
+    def delete(self, session_id: str) -> None:
+        conn = self._get_connection()
+        conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+        conn.commit()
+
+    def sweep(self) -> int:
+        conn = self._get_connection()
+        removed = conn.execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),)).rowcount
+        conn.commit()
+        with self._lock:
+            self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        conn = self._get_connection()
+        row = conn.execute(
+            'SELECT COUNT(*) AS n, COALESCE(SUM(LENGTH(data)), 0) AS bytes FROM sessions'
+        ).fetchone()
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": row['n'],
+            "approx_bytes": row['bytes'],
+            "db_bytes": page_count * page_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+
+def create_session_store() -> SessionStore:
+    """Crea lo store configurato in SESSION_BACKEND.
+
+    Raises:
+        ValueError: Se il backend non è supportato
+    """
+    if settings.SESSION_BACKEND == "memory":
+        return MemorySessionStore(settings.SESSION_MAX_ENTRIES, settings.SESSION_TTL_SECONDS)
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(settings.SESSION_DB_PATH, settings.SESSION_TTL_SECONDS)
+    raise ValueError(f"SESSION_BACKEND '{settings.SESSION_BACKEND}' non supportato (memory, sqlite)")
+
+
+# Istanza globale dello store delle sessioni
+session_store = create_session_store()
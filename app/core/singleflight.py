@@ -0,0 +1,239 @@
+"""Coalescenza delle richieste identiche in corso (single-flight).
+
+All'apertura dei bandi molti studenti della stessa università chiamano /step1 e
+/step2 per lo stesso dipartimento nello stesso momento: senza coordinamento ogni
+richiesta estrae lo stesso PDF e fa la stessa chiamata a Gemini. Con il single-flight:
+1. La prima richiesta con una certa chiave (es. università + dipartimento + periodo)
+   avvia il calcolo in un task separato
+2. Le richieste con la stessa chiave che arrivano mentre il calcolo è in corso
+   attendono lo stesso task invece di ripeterlo; ogni richiesta, compresa quella che
+   ha avviato il calcolo, riceve una copia profonda del risultato (o la stessa eccezione)
+3. Concluso il calcolo la chiave viene liberata: le richieste successive passano
+   dalle cache dei servizi (cache LLM, cache dell'estrazione)
+
+Il task condiviso non viene annullato se il client che l'ha avviato si disconnette,
+così le altre richieste in attesa ricevono comunque il risultato.
+
+Per i generatori async (es. il riassunto in streaming di /step1/stream) il calcolo
+condiviso inoltra gli elementi a tutte le richieste coalescenti: chi arriva a
+generazione iniziata riceve prima gli elementi già prodotti, poi quelli nuovi.
+"""
+
+import asyncio
+import copy
+import functools
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from .config import settings
+from .metrics import registry
+
+SINGLEFLIGHT_CALLS = registry.counter(
+    "erasmus_singleflight_calls_total",
+    "Chiamate single-flight: calcoli avviati ('leader') e richieste accodate a un calcolo in corso ('coalesced')",
+    ("group", "role")
+)
+
+
+class _SharedStream:
+    """Elementi di un generatore async condiviso tra più richieste."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        # Sveglia chi attende e prepara l'evento per l'elemento successivo
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, generator: AsyncIterator) -> None:
+        """Consuma il generatore e rende disponibili gli elementi a tutti i lettori."""
+        try:
+            async for item in generator:
+                self.items.append(item)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.done = True
+            self._notify()
+
+    async def read(self) -> AsyncIterator:
+        """Elementi già prodotti e poi quelli nuovi; rilancia l'eventuale eccezione."""
+        position = 0
+        while True:
+            while position < len(self.items):
+                # Copia: i lettori possono modificare gli elementi (es. dict.pop)
+                yield copy.deepcopy(self.items[position])
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Gruppo di chiamate coalescenti (es. tutti i riassunti dei bandi).
+
+    Attributes:
+        name: Nome del gruppo (etichetta delle metriche)
+        leaders: Calcoli avviati
+        coalesced: Richieste servite da un calcolo già in corso
+        max_waiters: Numero massimo di richieste in attesa dello stesso calcolo
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Chiave -> calcolo in corso (asyncio.Task, o _SharedStream per i generatori)
+        self._inflight: Dict[Hashable, object] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Esegue `await fn(*args, **kwargs)`, condividendo il calcolo con le chiamate
+        concorrenti che usano la stessa chiave.
+
+        Args:
+            key: Chiave che identifica le richieste equivalenti
+            fn: Funzione async da eseguire
+
+        Returns:
+            Una copia profonda del risultato di fn, per ogni chiamante (anche il leader)
+        """
+        task = self._inflight.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda _: self._release(key, task))
+            with self._lock:
+                self.leaders += 1
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        else:
+            self._waiters[key] += 1
+            with self._lock:
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, self._waiters[key])
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="coalesced")
+
+        # shield: l'annullamento di una richiesta non interrompe il calcolo condiviso
+        result = await asyncio.shield(task)
+        # Copia per tutti, leader compreso: il task condiviso resta intatto anche per le
+        # richieste che lo attendono ancora, qualunque sia l'ordine di risveglio
+        return copy.deepcopy(result)
+
+    async def stream(self, key: Hashable, fn: Callable, *args, **kwargs) -> AsyncIterator:
+        """
+        Come do(), per un generatore async: `fn(*args, **kwargs)` viene consumato una
+        sola volta e i suoi elementi inoltrati a tutte le richieste con la stessa chiave.
+
+        Args:
+            key: Chiave che identifica le richieste equivalenti
+            fn: Funzione generatore async da eseguire
+
+        Yields:
+            Copie degli elementi prodotti da fn
+        """
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = _SharedStream()
+            task = asyncio.ensure_future(shared.pump(fn(*args, **kwargs)))
+            self._inflight[key] = shared
+            self._waiters[key] = 1
+            task.add_done_callback(lambda _: self._release(key, shared))
+            with self._lock:
+                self.leaders += 1
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        else:
+            self._waiters[key] += 1
+            with self._lock:
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, self._waiters[key])
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="coalesced")
+
+        async for item in shared.read():
+            yield item
+
+    def _release(self, key: Hashable, task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": (self.coalesced / calls) if calls else 0.0,
+                "max_waiters": self.max_waiters,
+                "inflight": len(self._inflight),
+            }
+
+
+# Gruppi registrati, per metriche ed endpoint di debug
+groups: Dict[str, SingleFlight] = {}
+
+
+def singleflight(name: str, key: Callable[..., Hashable]):
+    """
+    Decoratore per funzioni async: le chiamate concorrenti con la stessa chiave
+    condividono un solo calcolo. Disattivato con SINGLEFLIGHT_ENABLED=False.
+
+    Args:
+        name: Nome del gruppo
+        key: Funzione che riceve gli stessi argomenti della funzione decorata e
+             restituisce la chiave delle richieste equivalenti
+    """
+    group = groups.setdefault(name, SingleFlight(name))
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not settings.SINGLEFLIGHT_ENABLED:
+                return await fn(*args, **kwargs)
+            return await group.do(key(*args, **kwargs), fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def singleflight_stream(name: str, key: Callable[..., Hashable]):
+    """
+    Come singleflight, per funzioni generatore async: le chiamate concorrenti con la
+    stessa chiave ricevono gli elementi di un solo generatore.
+
+    Args:
+        name: Nome del gruppo
+        key: Funzione che riceve gli stessi argomenti della funzione decorata e
+             restituisce la chiave delle richieste equivalenti
+    """
+    group = groups.setdefault(name, SingleFlight(name))
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not settings.SINGLEFLIGHT_ENABLED:
+                items = fn(*args, **kwargs)
+            else:
+                items = group.stream(key(*args, **kwargs), fn, *args, **kwargs)
+            async for item in items:
+                yield item
+        return wrapper
+    return decorator
+
+
+def singleflight_stats() -> dict:
+    """Metriche di tutti i gruppi, per /metrics e l'endpoint di debug."""
+    return {name: group.stats() for name, group in groups.items()}
@@ -1,17 +1,98 @@
 # app/main.py
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .api.endpoints import endpoints_student, endpoints_university
+from .services.ingestion_service import ingestion_queue
+from .core.executors import shutdown_executors, run_blocking, executors_stats
+from .core.singleflight import singleflight_stats
+from .core.config import settings
+from .core.session_store import session_store
+from .core import metrics
+from .services.extraction_cache import extraction_cache
+from .services.llm_cache import llm_cache
+from .services.llm_gateway import llm_gateway
+from .services.embedding_cache import embedding_cache
+from .services.vector_db_service import vector_store_service
+from .services.pdf_extraction import shutdown_pool as shutdown_pdf_pool
 import os
 
+
+async def _sweep_sessions():
+    """Rimuove periodicamente le sessioni scadute."""
+    while True:
+        await asyncio.sleep(settings.SESSION_SWEEP_SECONDS)
+        try:
+            removed = await run_blocking("db", session_store.sweep)
+            if removed:
+                print(f"🧹 Rimosse {removed} sessioni scadute")
+        except Exception as e:
+            print(f"⚠️ Errore nella pulizia delle sessioni: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Worker della coda di indicizzazione dei documenti caricati
+    await ingestion_queue.start()
+    sweeper = asyncio.create_task(_sweep_sessions())
+    yield
+    sweeper.cancel()
+    await ingestion_queue.stop()
+    shutdown_executors()
+    shutdown_pdf_pool()
+
+
 app = FastAPI(
     title="Erasmus Help Desk API",
     description="API per assistenza studenti Erasmus con suggerimenti personalizzati e gestione università",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
+# Contatori dei servizi esposti come gauge su /metrics (hit ratio delle cache, code dei pool, ...)
+metrics.registry.register_stats("erasmus_extraction_cache", extraction_cache.stats)
+metrics.registry.register_stats("erasmus_llm_cache", llm_cache.stats)
+metrics.registry.register_stats("erasmus_llm_gateway", llm_gateway.stats)
+if embedding_cache is not None:
+    metrics.registry.register_stats("erasmus_embedding_cache", embedding_cache.stats)
+metrics.registry.register_stats("erasmus_vector_store", vector_store_service.stats)
+metrics.registry.register_stats("erasmus_ingestion_queue", ingestion_queue.stats)
+metrics.registry.register_stats("erasmus_sessions", session_store.stats)
+metrics.registry.register_stats("erasmus_executor", executors_stats, label="pool")
+metrics.registry.register_stats("erasmus_singleflight", singleflight_stats, label="group")
+
+
+def _route_label(request: Request) -> str:
+    """Template della route (es. /jobs/{job_id}), per non avere un'etichetta per ogni ID.
+
+    I path che non corrispondono a nessuna route finiscono tutti sotto "unmatched",
+    così URL arbitrari non fanno crescere il numero di serie della metrica.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Registra la durata di ogni richiesta per route."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=_route_label(request),
+            status=str(status),
+        )
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -21,8 +102,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session store (simple, volatile). Use a proper store for production.
-app.state.session_store = {}
+# Store delle sessioni studente (memoria o SQLite condiviso, vedi SESSION_BACKEND)
+app.state.session_store = session_store
 
 # Include router studenti
 app.include_router(endpoints_student.router, prefix="/api/students", tags=["student"])
@@ -65,6 +146,7 @@ else:
                     "upload_call": "POST /api/university/upload/erasmus-call (requires auth)",
                     "my_documents": "GET /api/university/documents (requires auth)",
                     "active_calls": "GET /api/university/active-calls (public)",
+                    "ingestion_job": "GET /api/university/jobs/{id} (requires auth)",
                     "delete_document": "DELETE /api/university/documents/{id} (requires auth)"
                 }
             }
@@ -73,4 +155,11 @@ else:
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint"""
-    return {"status": "ok", "message": "Server is running"}
\ No newline at end of file
+    return {"status": "ok", "message": "Server is running"}
+
+@app.get("/metrics", tags=["Health"])
+async def metrics_endpoint():
+    """Metriche in formato testo Prometheus: durata delle fasi e delle richieste, LLM, cache e pool."""
+    # Le statistiche delle cache leggono SQLite: fuori dall'event loop
+    body = await run_blocking("db", metrics.render_metrics)
+    return Response(content=body, media_type=metrics.CONTENT_TYPE)
\ No newline at end of file
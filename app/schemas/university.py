@@ -90,6 +90,21 @@ class DocumentUploadResponse(BaseModel):
     message: str = Field(..., description="Messaggio di conferma")
     filename: str = Field(..., description="Nome del file salvato")
     upload_date: str = Field(..., description="Data di upload")
+    job_id: Optional[int] = Field(None, description="ID del job di indicizzazione in background")
+
+
+class IngestionJobResponse(BaseModel):
+    """Schema per lo stato di un job di indicizzazione in background."""
+    id: int
+    document_id: int
+    document_type: str
+    status: str = Field(..., description="queued, running, completed o failed")
+    stage: Optional[str] = Field(None, description="Fase corrente dell'indicizzazione")
+    progress: float = Field(..., description="Avanzamento da 0 a 1")
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
 
 
 class DocumentInfo(BaseModel):
@@ -0,0 +1,136 @@
+"""Riassunto map-reduce dei bandi lunghi (step 1).
+
+Quando il vector DB non restituisce chunk, il riassunto veniva generato dai primi
+CALL_SUMMARY_MAX_CHARS caratteri del bando, perdendo la parte finale (spesso quella
+con scadenze e modalità di candidatura). Per i bandi più lunghi del limite:
+1. Map: il testo estratto (già in cache) viene diviso in sezioni di al massimo
+   CALL_SUMMARY_SECTION_CHARS caratteri, spezzate ai paragrafi, e ogni sezione viene
+   ridotta a note sintetiche con una chiamata LLM; le chiamate sono concorrenti,
+   al massimo CALL_SUMMARY_MAP_CONCURRENCY alla volta
+2. Reduce: le note, nell'ordine del bando, diventano il contesto del normale prompt
+   del riassunto (se superano ancora il limite vengono ridotte di nuovo)
+
+La latenza della fase map dipende dalla sezione più lenta, non dalla lunghezza totale.
+"""
+
+import asyncio
+import re
+from typing import List
+
+from ..core.metrics import registry, span
+from .llm_gateway import llm_gateway
+from .llm_provider import PURPOSE_CALL_SECTION
+
+# Passaggi di riduzione oltre il primo (bandi lunghissimi)
+MAX_REDUCE_ROUNDS = 3
+
+SECTION_PROMPT = """
+        Sei un assistente specializzato in programmi Erasmus.
+        Il testo seguente è la sezione {index} di {total} di un bando Erasmus.
+        Estrai in un elenco puntato conciso tutte le informazioni presenti su:
+        - Periodo di apertura del bando
+        - Requisiti (inclusi i requisiti linguistici)
+        - Scadenze e date
+        - Processo di candidatura
+        - CFU (crediti formativi universitari) minimi da conseguire durante l'erasmus
+        Riporta date, numeri e livelli linguistici esattamente come nel testo.
+        Se la sezione non contiene nessuna di queste informazioni rispondi "Nessuna informazione rilevante".
+
+        Sezione del bando:
+        {section}
+        """
+
+CALL_SUMMARY_SECTIONS = registry.counter(
+    "erasmus_call_summary_sections_total", "Sezioni dei bandi lunghi riassunte nella fase map"
+)
+
+# Fine di un paragrafo: riga vuota o inizio di un articolo ("Art. 3", "ARTICOLO 3")
+_PARAGRAPH_RE = re.compile(r'\n\s*\n|\n(?=\s*(?:art\.|articolo)\s*\d)', re.IGNORECASE)
+
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """
+    Divide il testo in sezioni di al massimo max_chars caratteri, senza perdere testo.
+
+    Le sezioni vengono spezzate tra i paragrafi; un paragrafo più lungo del limite
+    viene diviso all'ultimo spazio disponibile.
+
+    Args:
+        text: Testo completo del bando
+        max_chars: Lunghezza massima di una sezione
+
+    Returns:
+        Sezioni nell'ordine del testo
+    """
+    sections: List[str] = []
+    current = ""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            if current:
+                sections.append(current)
+                current = ""
+            sections.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            sections.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        sections.append(current)
+    return sections
+
+
+async def _summarize_sections(sections: List[str], model: str, concurrency: int) -> List[str]:
+    """Fase map: riassume le sezioni in parallelo, al massimo `concurrency` alla volta."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def summarize(index: int, section: str) -> str:
+        async with semaphore:
+            prompt = SECTION_PROMPT.format(index=index, total=len(sections), section=section)
+            return await llm_gateway.generate(prompt, model, purpose=PURPOSE_CALL_SECTION)
+
+    notes = await asyncio.gather(*(
+        summarize(index, section) for index, section in enumerate(sections, start=1)
+    ))
+    CALL_SUMMARY_SECTIONS.inc(len(sections))
+    return [note.strip() for note in notes]
+
+
+async def condense_call_text(text: str, model: str, max_chars: int,
+                             section_chars: int, concurrency: int) -> str:
+    """
+    Riduce un bando più lungo di max_chars alle note delle sue sezioni.
+
+    Args:
+        text: Testo completo del bando
+        model: Modello usato per i riassunti delle sezioni
+        max_chars: Lunghezza massima del contesto del prompt finale
+        section_chars: Lunghezza massima di una sezione nella fase map
+        concurrency: Chiamate LLM contemporanee nella fase map
+
+    Returns:
+        Note delle sezioni, nell'ordine del bando, da usare come contesto del riassunto
+        (troncate a max_chars se restano troppo lunghe dopo l'ultimo passaggio)
+    """
+    context = text
+    for _ in range(1 + MAX_REDUCE_ROUNDS):
+        if len(context) <= max_chars:
+            break
+        sections = split_sections(context, section_chars)
+        with span("call_summary.map"):
+            notes = await _summarize_sections(sections, model, concurrency)
+        print(f"🧩 Bando lungo: {len(context)} caratteri riassunti in {len(sections)} sezioni")
+        context = "\n\n".join(
+            f"[Sezione {index}/{len(notes)}]\n{note}" for index, note in enumerate(notes, start=1)
+        )
+    if len(context) > max_chars:
+        # Note ancora troppo lunghe dopo tutti i passaggi: il prompt finale non supera il limite
+        print(f"⚠️ Note del bando ancora lunghe dopo {1 + MAX_REDUCE_ROUNDS} passaggi "
+              f"({len(context)} caratteri): troncate a {max_chars}")
+        context = context[:max_chars] + "\n\n[... note troncate ...]"
+    return context
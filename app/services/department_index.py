@@ -0,0 +1,163 @@
+"""Indice dei dipartimenti di un documento delle destinazioni.
+
+L'indice viene costruito una sola volta (all'upload) sul testo estratto e messo in cache:
+per ogni header "Dipartimento ..." conserva
+1. il nome canonico mostrato agli studenti (lista di /departments)
+2. l'header normalizzato e i suoi token significativi per il matching tollerante
+3. gli offset (righe e caratteri) della sezione nel testo, così che l'estrazione
+   della sezione di un dipartimento sia una semplice slice
+"""
+
+import re
+from typing import List, Optional
+
+
+# Header di dipartimento (anche in mezzo alla riga, come in extract_department_section)
+HEADER_REGEX = re.compile(r'\bdipartiment[oi]\b', re.IGNORECASE)
+
+
+def prepare_text(full_text: str) -> str:
+    """Testo su cui sono calcolati gli offset: righe senza spazi ai bordi, come per l'LLM."""
+    return "\n".join(line.strip() for line in full_text.splitlines()).strip()
+
+
+def normalize(s: str) -> str:
+    """Normalizzazione usata per i confronti tra header e dipartimento richiesto."""
+    s = s.lower().replace('’', "'")
+    s = re.sub(r"\s+", " ", s)
+    return s.strip()
+
+
+def tokenize(s: str) -> List[str]:
+    """Parole significative (almeno 3 caratteri) nell'ordine in cui compaiono."""
+    return [t for t in re.split(r'\W+', s) if len(t) >= 3]
+
+
+def display_name(line: str) -> Optional[str]:
+    """
+    Nome del dipartimento da mostrare agli studenti, ricavato da una riga di header.
+    Restituisce None per le righe che non iniziano con "dipartiment" o troppo corte.
+    """
+    line = re.sub(r'(note per gli studenti|note per lo studente).*?(?=\n|$)', '', line, flags=re.IGNORECASE)
+    line_stripped = line.strip()
+    line_lower = line_stripped.lower()
+    if not line_lower.startswith('dipartiment'):
+        return None
+
+    # Prendi solo la parte prima di "n° borse" o del primo "|"
+    if 'n°' in line_lower or 'n °' in line_lower:
+        dept_line = re.split(r'n\s*°', line_stripped, flags=re.IGNORECASE)[0]
+    elif '|' in line_stripped:
+        dept_line = line_stripped.split('|')[0]
+    else:
+        dept_line = line_stripped
+
+    dept_line = re.sub(r"[^a-zA-Z0-9\s'àèéìòùÀÈÉÌÒÙ]", '', dept_line)
+    dept_line = re.sub(r'\s+', ' ', dept_line).strip()
+    return dept_line if len(dept_line) >= 10 else None
+
+
+def build_department_index(text: str) -> List[dict]:
+    """
+    Costruisce l'indice dei dipartimenti sul testo preparato con prepare_text.
+
+    Args:
+        text: Testo delle destinazioni (output di prepare_text)
+
+    Returns:
+        Lista di voci, nell'ordine del documento, con: name (o None se la riga non è
+        un nome da mostrare), header_norm, tokens, start_line, end_line, start_char, end_char
+    """
+    lines = text.split('\n')
+
+    # Offset in caratteri dell'inizio di ogni riga
+    line_starts = []
+    offset = 0
+    for line in lines:
+        line_starts.append(offset)
+        offset += len(line) + 1
+
+    header_indexes = [i for i, line in enumerate(lines) if HEADER_REGEX.search(line or '')]
+
+    entries = []
+    for position, start_line in enumerate(header_indexes):
+        end_line = header_indexes[position + 1] if position + 1 < len(header_indexes) else len(lines)
+        header_norm = normalize(lines[start_line])
+        entries.append({
+            "position": position,
+            "name": display_name(lines[start_line]),
+            "header_norm": header_norm,
+            "tokens": " ".join(tokenize(header_norm)),
+            "start_line": start_line,
+            "end_line": end_line,
+            "start_char": line_starts[start_line],
+            "end_char": line_starts[end_line] - 1 if end_line < len(lines) else len(text),
+        })
+    return entries
+
+
+def department_names(entries: List[dict]) -> List[str]:
+    """Lista ordinata e senza duplicati dei nomi dei dipartimenti (per /departments)."""
+    return sorted({entry["name"] for entry in entries if entry["name"]})
+
+
+def _candidates(department: str) -> List[str]:
+    """Spezza l'input (anche con più dipartimenti concatenati) in candidati senza prefisso."""
+    raw = normalize(department)
+    parts = re.split(r'(?=\bdipartiment[oi]\s+)', raw, flags=re.IGNORECASE)
+
+    def strip_prefix(p: str) -> str:
+        p = re.sub(r'^dipartiment[oi]\s+di\s+', '', p.strip(), flags=re.IGNORECASE)
+        p = re.sub(r'^dipartiment[oi]\s+', '', p, flags=re.IGNORECASE)
+        return p.strip()
+
+    candidates = [strip_prefix(p) for p in parts if p.strip()]
+    seen = set()
+    return [c for c in candidates if not (c in seen or seen.add(c))]
+
+
+def match_department(entries: List[dict], department: str) -> Optional[dict]:
+    """
+    Trova la voce dell'indice corrispondente al dipartimento richiesto.
+
+    Se il nome coincide (per token) con l'header completo di una sezione, anche con più
+    dipartimenti, viene restituita quella sezione. Altrimenti, come in
+    extract_department_section, per ogni candidato prima il match per sottostringa
+    sull'header normalizzato, poi la presenza dei primi 3 token significativi; viene
+    restituita la prima sezione non vuota.
+    """
+    if not entries:
+        return None
+
+    # Header identico: il match per sottostringa sceglierebbe il primo header che contiene
+    # il nome (es. "Ingegneria dell'Energia" dentro "Ingegneria Civile ..., Ingegneria dell'Energia")
+    # Confronto per token: il nome mostrato nel frontend (display_name) non ha la punteggiatura
+    full_name = tokenize(normalize(department))
+    entry = next(
+        (e for e in entries
+         if tokenize(e["header_norm"].split("|")[0]) == full_name and e["end_char"] > e["start_char"]),
+        None,
+    )
+    if entry is not None:
+        return entry
+
+    for cand in _candidates(department):
+        search_core = normalize(cand)
+        if not search_core:
+            continue
+
+        entry = next((e for e in entries if search_core in e["header_norm"]), None)
+        if entry is None:
+            tokens = tokenize(search_core)[:3]
+            entry = next(
+                (e for e in entries if all(tok in e["header_norm"] for tok in tokens)),
+                None,
+            )
+        if entry is not None and entry["end_char"] > entry["start_char"]:
+            return entry
+    return None
+
+
+def slice_section(text: str, entry: dict) -> str:
+    """Sezione del dipartimento (header → header successivo) come slice del testo."""
+    return text[entry["start_char"]:entry["end_char"]].strip()
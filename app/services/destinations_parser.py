@@ -0,0 +1,160 @@
+"""Parser deterministico della tabella delle destinazioni Erasmus.
+
+Il PDF delle destinazioni viene estratto come righe di tabella con celle separate da " | "
+(vedi scripts/pdfreader.process_pdf_for_llm e rag_service.extract_destinations_text):
+
+    Dipartimento di Informatica |  |  | ... | n° borse: 129
+    CODICE EUROPEO | NOME ISTITUZIONE | CODICE AREA | DESCRIZIONE AREA ISCED | POSTI | ...
+    A GRAZ01 | KARL-FRANZENS- UNIVERSITÄT GRAZ | 0610 | 0610 - INFORMATION ... | 1 | 10 mesi | ...
+
+Questo modulo ricostruisce le righe senza usare l'LLM:
+1. Gli header "Dipartiment... | n° borse: N" impostano il dipartimento corrente
+2. L'intestazione delle colonne definisce la posizione di ogni campo
+3. Le righe spezzate tra due pagine (celle su più righe) vengono riunite
+4. Le righe duplicate all'interno dello stesso dipartimento vengono scartate
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from ..core.metrics import timed
+
+
+# Campi estratti, con il nome della colonna corrispondente nel PDF
+DESTINATION_FIELDS = {
+    "codice_europeo": "CODICE EUROPEO",
+    "nome_istituzione": "NOME ISTITUZIONE",
+    "codice_area": "CODICE AREA",
+    "descrizione_area": "DESCRIZIONE AREA ISCED",
+    "posti": "POSTI",
+    "durata_per_posto": "DURATA PER POSTO",
+    "livello": "LIVELLO",
+    "dettagli_livello": "DETTAGLI LIVELLO",
+    "requisiti_linguistici": "REQUISITI LINGUISTICI",
+}
+
+DESTINATION_COLUMNS = list(DESTINATION_FIELDS)
+
+# Codice Erasmus dell'istituzione, es. "D MUNCHEN02", "E ALCAL-H01", "IRLDUBLIN02", "F PARIS482"
+ERASMUS_CODE_REGEX = re.compile(r"^[A-Z]{1,3}\s?[A-Z\- ]*\d{2,3}$")
+
+# Numero di borse riportato sull'header del dipartimento, es. "n° borse: 129"
+BORSE_REGEX = re.compile(r"n\s*°\s*borse\s*:?\s*(\d+)", re.IGNORECASE)
+
+
+def _default_positions() -> Dict[str, int]:
+    """Posizione delle colonne quando l'intestazione non è (ancora) stata letta."""
+    return {field: index for index, field in enumerate(DESTINATION_COLUMNS)}
+
+
+def _header_positions(cells: List[str]) -> Dict[str, int]:
+    """Ricava la posizione di ogni campo dalla riga di intestazione delle colonne."""
+    normalized = [re.sub(r"\s+", " ", c).strip().upper() for c in cells]
+    positions = {}
+    for field, column_name in DESTINATION_FIELDS.items():
+        if column_name in normalized:
+            positions[field] = normalized.index(column_name)
+    # Se l'intestazione è incompleta, completa con le posizioni standard
+    for field, index in _default_positions().items():
+        positions.setdefault(field, index)
+    return positions
+
+
+def _is_column_header(cells: List[str]) -> bool:
+    return bool(cells) and re.sub(r"\s+", " ", cells[0]).strip().upper() == "CODICE EUROPEO"
+
+
+def _is_department_header(cells: List[str]) -> bool:
+    return bool(cells) and cells[0].lower().startswith("dipartiment")
+
+
+def _join_cell(previous: str, continuation: str) -> str:
+    """
+    Unisce il contenuto di una cella spezzata su due righe.
+    Usa uno spazio come l'estrattore fa con i ritorni a capo interni alle celle.
+    """
+    if not previous:
+        return continuation
+    return f"{previous} {continuation}"
+
+
+@timed("destinations.parse")
+def parse_destinations_table(text: str) -> List[dict]:
+    """
+    Converte il testo estratto dal PDF delle destinazioni in righe strutturate.
+
+    Args:
+        text: Testo con le righe di tabella separate da " | " (le righe senza separatori,
+              come il testo semplice delle pagine, vengono ignorate)
+
+    Returns:
+        Lista di dizionari, nell'ordine del documento, con:
+        - "department": header del dipartimento a cui appartiene la riga
+        - "department_borse": numero di borse del dipartimento (se indicato)
+        - i campi di DESTINATION_COLUMNS copiati verbatim dalle celle
+    """
+    rows: List[dict] = []
+    seen = set()
+    department: Optional[str] = None
+    department_borse: Optional[int] = None
+    positions = _default_positions()
+    last_row: Optional[dict] = None
+
+    for raw_line in text.splitlines():
+        if "|" not in raw_line:
+            continue
+        cells = [re.sub(r"\s+", " ", c).strip() for c in raw_line.split("|")]
+        if not any(cells):
+            continue
+
+        if _is_department_header(cells):
+            department = cells[0]
+            borse = BORSE_REGEX.search(raw_line)
+            department_borse = int(borse.group(1)) if borse else None
+            last_row = None
+            continue
+
+        if _is_column_header(cells):
+            positions = _header_positions(cells)
+            continue
+
+        if department is None:
+            continue
+
+        values = {
+            field: cells[index] if index < len(cells) else ""
+            for field, index in positions.items()
+        }
+
+        # Riga di continuazione (cella su più righe o riga spezzata tra due pagine):
+        # nessun codice Erasmus, le celle non vuote completano la riga precedente
+        if not values["codice_europeo"]:
+            if last_row is not None:
+                seen.discard(_row_key(last_row))
+                for field, value in values.items():
+                    if value:
+                        last_row[field] = _join_cell(last_row[field], value)
+                seen.add(_row_key(last_row))
+            continue
+
+        if not ERASMUS_CODE_REGEX.match(values["codice_europeo"]):
+            last_row = None
+            continue
+
+        row = {"department": department, "department_borse": department_borse, **values}
+        key = _row_key(row)
+        if key in seen:
+            # Riga duplicata (es. tabella ripetuta a cavallo di due pagine)
+            last_row = None
+            continue
+
+        seen.add(key)
+        rows.append(row)
+        last_row = row
+
+    return rows
+
+
+def _row_key(row: dict) -> tuple:
+    """Chiave usata per riconoscere le righe duplicate nello stesso dipartimento."""
+    return (row["department"],) + tuple(row[field] for field in DESTINATION_COLUMNS)
@@ -0,0 +1,218 @@
+"""Service per le destinazioni Erasmus strutturate.
+
+Questo modulo si occupa di:
+1. Leggere le righe della tabella delle destinazioni con il parser deterministico (destinations_parser)
+2. Salvarle una sola volta, al momento dell'upload, nella tabella SQLite `destinations`
+3. Costruire e salvare l'indice dei dipartimenti (department_index) del documento
+4. Rispondere alle query di /departments e dello step 2 dalle tabelle, senza PDF né LLM
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from ..core.database import db_manager
+from .destinations_parser import DESTINATION_COLUMNS, parse_destinations_table
+from . import department_index
+from ..core.metrics import timed
+
+
+# Testi preparati (prepare_text) già caricati, per chiave sorgente: evita di
+# rileggere e ri-normalizzare il testo in cache ad ogni estrazione di sezione
+_PREPARED_TEXT_MEMO_SIZE = 8
+_prepared_text_memo: "OrderedDict[str, str]" = OrderedDict()
+# Il memo è usato dai thread del pool "pdf"
+_prepared_text_lock = threading.Lock()
+
+
+def normalize_department(name: str) -> str:
+    """
+    Normalizza il nome di un dipartimento per i confronti.
+    Usa la stessa pulizia applicata alla lista restituita da /departments
+    (rimozione di punteggiatura e spazi multipli), in minuscolo.
+    """
+    name = name.replace('’', "'")
+    name = re.split(r'n\s*°', name, flags=re.IGNORECASE)[0]
+    name = re.sub(r"[^a-zA-Z0-9\s'àèéìòùÀÈÉÌÒÙ]", '', name)
+    return re.sub(r'\s+', ' ', name).strip().lower()
+
+
+def _source_key(pdf_path: str) -> str:
+    """Chiave del testo su cui sono calcolati gli offset: hash del PDF + estrattore e sua versione."""
+    from .extraction_cache import extraction_cache
+    from .rag_service import TABLES_AND_TEXT_EXTRACTOR_VERSION, destinations_extractor_key
+
+    return (f"{extraction_cache.file_hash(pdf_path)}:{destinations_extractor_key()}"
+            f":{TABLES_AND_TEXT_EXTRACTOR_VERSION}")
+
+
+def _load_prepared_text(pdf_path: str) -> Tuple[str, str]:
+    """Restituisce (chiave sorgente, testo preparato) del PDF delle destinazioni."""
+    from .rag_service import extract_destinations_text
+
+    source_key = _source_key(pdf_path)
+    with _prepared_text_lock:
+        text = _prepared_text_memo.get(source_key)
+        if text is not None:
+            _prepared_text_memo.move_to_end(source_key)
+            return source_key, text
+
+    # Estrazione fuori dal lock: due thread possono preparare lo stesso testo, con lo stesso risultato
+    text = department_index.prepare_text(extract_destinations_text(pdf_path))
+    with _prepared_text_lock:
+        _prepared_text_memo[source_key] = text
+        _prepared_text_memo.move_to_end(source_key)
+        while len(_prepared_text_memo) > _PREPARED_TEXT_MEMO_SIZE:
+            _prepared_text_memo.popitem(last=False)
+    return source_key, text
+
+
+def build_department_index(document_id: int, pdf_path: str) -> List[dict]:
+    """
+    Costruisce e salva l'indice dei dipartimenti di un documento delle destinazioni.
+
+    Returns:
+        Voci dell'indice salvate
+    """
+    source_key, text = _load_prepared_text(pdf_path)
+    entries = department_index.build_department_index(text)
+    db_manager.replace_department_index(document_id, source_key, entries)
+    print(f"✅ Indice dipartimenti: {len(entries)} sezioni per il documento {document_id}")
+    return entries
+
+
+def get_department_index(document: dict) -> List[dict]:
+    """
+    Restituisce l'indice dei dipartimenti del documento, costruendolo in modo lazy
+    se manca o se è stato calcolato su un testo diverso (PDF o estrattore cambiati).
+    """
+    entries = db_manager.get_department_index(document['id'])
+    if entries and entries[0]['source_key'] == _source_key(document['file_path']):
+        return entries
+    return build_department_index(document['id'], document['file_path'])
+
+
+def get_department_names(document: dict) -> List[str]:
+    """Nomi dei dipartimenti del documento, letti dall'indice (per /departments)."""
+    return department_index.department_names(get_department_index(document))
+
+
+@timed("destinations.section")
+def get_department_section(document: dict, department: str) -> str:
+    """
+    Sezione di testo del dipartimento richiesto, come slice del testo in cache.
+
+    Raises:
+        ValueError: Se il dipartimento non è presente nell'indice del documento
+    """
+    entries = get_department_index(document)
+    if not entries:
+        raise ValueError("Nel file non sono presenti header di dipartimento riconoscibili")
+
+    entry = department_index.match_department(entries, department)
+    if entry is None:
+        raise ValueError(f"Dipartimento '{department}' non trovato nel file delle destinazioni")
+
+    _, text = _load_prepared_text(document['file_path'])
+    section = department_index.slice_section(text, entry)
+    print(f"✅ Sezione per '{department}' dall'indice (linee {entry['start_line']}-{entry['end_line']}): {len(section)} caratteri")
+    return section
+
+
+@timed("destinations.index")
+def index_destinations_document(document_id: int, university_id: int, pdf_path: str) -> int:
+    """
+    Estrae e salva nella tabella `destinations` le righe di un PDF delle destinazioni
+    e costruisce l'indice dei suoi dipartimenti.
+    Da chiamare una sola volta all'upload (o in modo lazy per documenti già esistenti).
+
+    Args:
+        document_id: ID del documento in uploaded_documents
+        university_id: ID dell'università proprietaria
+        pdf_path: Percorso del PDF delle destinazioni
+
+    Returns:
+        Numero di righe salvate
+    """
+    from .rag_service import extract_destinations_text
+
+    text = extract_destinations_text(pdf_path)
+    rows = parse_destinations_table(text)
+    for row in rows:
+        row["department_key"] = normalize_department(row["department"])
+
+    db_manager.replace_destinations(document_id, university_id, rows)
+    print(f"✅ Indicizzate {len(rows)} destinazioni per il documento {document_id}")
+
+    build_department_index(document_id, pdf_path)
+    return len(rows)
+
+
+@timed("destinations.query")
+def query_destinations_for_department(document: dict, department: str) -> Optional[List[dict]]:
+    """
+    Restituisce le destinazioni del dipartimento leggendo dalla tabella strutturata.
+
+    Se il documento non è ancora stato indicizzato (upload precedente a questa funzionalità)
+    viene indicizzato al volo una sola volta: il marcatore destinations_indexed viene scritto
+    anche quando il parser non trova righe, così lo step 2 non ripete l'indicizzazione.
+
+    Args:
+        document: Riga di uploaded_documents del file delle destinazioni
+        department: Dipartimento selezionato dallo studente
+
+    Returns:
+        Lista di righe della tabella, oppure None se il dipartimento non è presente
+    """
+    document_id = document['id']
+    if not db_manager.is_destinations_indexed(document_id):
+        index_destinations_document(document_id, document['university_id'], document['file_path'])
+
+    department_key = normalize_department(department)
+    rows = db_manager.query_destinations(document_id=document_id, department_key=department_key)
+    if rows:
+        return rows
+
+    # Match tollerante (sottostringa / token) tramite l'indice dei dipartimenti
+    entry = department_index.match_department(get_department_index(document), department)
+    if entry is None or not entry['name']:
+        return None
+    rows = db_manager.query_destinations(
+        document_id=document_id, department_key=normalize_department(entry['name'])
+    )
+    return rows or None
+
+
+def describe_destination(row: dict) -> str:
+    """Descrizione sintetica e deterministica di una destinazione (senza LLM)."""
+    parts = []
+    if row.get('descrizione_area'):
+        parts.append(f"Area: {row['descrizione_area']}")
+    if row.get('posti'):
+        durata = f" da {row['durata_per_posto']}" if row.get('durata_per_posto') else ""
+        parts.append(f"{row['posti']} posti{durata}")
+    if row.get('requisiti_linguistici'):
+        parts.append(f"Requisiti linguistici: {row['requisiti_linguistici']}")
+    return ". ".join(parts) + ("." if parts else "")
+
+
+def rows_to_destinations(rows: List[dict], descriptions: Optional[dict] = None) -> List[dict]:
+    """
+    Converte le righe della tabella nel formato di DestinationUniversity.
+
+    Args:
+        rows: Righe restituite da query_destinations
+        descriptions: Descrizioni opzionali (nome istituzione -> testo) generate dall'LLM
+
+    Returns:
+        Lista di dizionari compatibili con lo schema DestinationUniversity
+    """
+    descriptions = descriptions or {}
+    destinations = []
+    for row in rows:
+        item = {column: row.get(column) or "" for column in DESTINATION_COLUMNS if column != "descrizione_area"}
+        item["name"] = row.get("nome_istituzione") or row.get("codice_europeo")
+        item["description"] = descriptions.get(item["name"]) or describe_destination(row)
+        destinations.append(item)
+    return destinations
@@ -3,71 +3,175 @@
 Questo modulo si occupa di:
 1. Caricare i PDF da una directory
 2. Dividerli in chunk di testo gestibili per il vector store
+
+Per la reindicizzazione massiva (scripts/index_calls.py) i PDF vengono estratti e
+divisi in parallelo da un pool di processi; i chunk vengono restituiti a blocchi,
+nell'ordine dei file (ordinati per nome), così l'embedding può iniziare mentre gli
+altri file sono ancora in elaborazione e l'output non dipende dal numero di worker.
 """
 
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
 
-def load_and_split_documents(data_path: str) -> List[Document]:
-    """Carica e divide i PDF in chunks.
+CHUNK_SIZE = 1000        # caratteri per chunk
+CHUNK_OVERLAP = 200      # overlap tra chunk
+
+
+def default_workers() -> int:
+    """Numero di worker predefinito per l'ingestion parallela."""
+    return max(1, (os.cpu_count() or 1) - 1)
 
-    Args:
-        data_path: percorso alla cartella con i PDF
+
+def _split_pdf(pdf_path: str) -> Tuple[str, int, List[Document], Optional[str]]:
+    """
+    Carica e divide un singolo PDF (eseguita anche nei processi del pool).
 
     Returns:
-        Lista di Document con il testo diviso in chunks
+        (nome del file, numero di pagine, chunk, messaggio di errore o None)
     """
+    name = Path(pdf_path).name
+    try:
+        # Carica il PDF
+        loader = PyPDFLoader(str(pdf_path))
+        pages = loader.load()
+
+        # Aggiungi solo il nome del file come metadata
+        for page in pages:
+            page.metadata["source"] = name
+
+        # Dividi in chunk
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+        )
+        chunks = text_splitter.split_documents(pages)
+        return name, len(pages), chunks, None
+    except Exception as e:
+        return name, 0, [], str(e)
+
+
+def _list_pdfs(data_path: str) -> List[Path]:
     data_dir = Path(data_path)
     if not data_dir.exists():
         raise ValueError(f"Directory {data_path} non trovata")
+    # Ordine deterministico, indipendente dal filesystem
+    return sorted(data_dir.glob("*.pdf"), key=lambda p: p.name)
 
-    documents = []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,        # caratteri per chunk
-        chunk_overlap=200,      # overlap tra chunk
-    )
-    
-    pdf_files = list(data_dir.glob("*.pdf"))
+
+def iter_split_documents(data_path: str, workers: int = 1) -> Iterator[Tuple[str, int, List[Document]]]:
+    """Estrae e divide i PDF di una directory, restituendoli uno alla volta in ordine.
+
+    Args:
+        data_path: percorso alla cartella con i PDF
+        workers: processi usati per estrazione e chunking (1 = nel processo corrente)
+
+    Yields:
+        (nome del file, numero di pagine, chunk) per ogni PDF processato correttamente
+    """
+    pdf_files = _list_pdfs(data_path)
     if not pdf_files:
         print(f"Nessun PDF trovato nella cartella {data_path}")
-        return []
-
-    # Processa ogni PDF nella directory
-    for pdf_path in pdf_files:
-        try:
-            # Carica il PDF
-            loader = PyPDFLoader(str(pdf_path))
-            pages = loader.load()
-            
-            # Aggiungi solo il nome del file come metadata
-            for page in pages:
-                page.metadata["source"] = pdf_path.name
-            
-            # Dividi in chunk
-            chunks = text_splitter.split_documents(pages)
-            documents.extend(chunks)
-            
-            print(f"Processato {pdf_path.name}: {len(chunks)} chunks creati")
-            
-        except Exception as e:
-            print(f"Errore nel processare {pdf_path.name}: {str(e)}")
-            continue
-    
+        return
+
+    paths = [str(p) for p in pdf_files]
+    workers = max(1, min(workers, len(paths)))
+
+    if workers == 1:
+        results = map(_split_pdf, paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # map restituisce i risultati nell'ordine dei file anche se finiscono in ordine diverso
+        results = executor.map(_split_pdf, paths)
+
+    try:
+        for name, pages, chunks, error in results:
+            if error:
+                print(f"Errore nel processare {name}: {error}")
+                continue
+            print(f"Processato {name}: {len(chunks)} chunks creati")
+            yield name, pages, chunks
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def iter_document_batches(data_path: str, workers: int = 1,
+                          batch_size: int = 256, stats: Optional[dict] = None) -> Iterator[List[Document]]:
+    """Raggruppa i chunk in blocchi da passare all'embedder.
+
+    Un blocco contiene sempre file interi (almeno batch_size chunk, salvo l'ultimo),
+    così ogni sorgente può essere sostituita nel vector store in un'unica scrittura.
+
+    Args:
+        data_path: percorso alla cartella con i PDF
+        workers: processi usati per estrazione e chunking
+        batch_size: numero minimo di chunk per blocco
+        stats: dizionario opzionale aggiornato con files, pages, chunks e seconds
+
+    Yields:
+        Liste di Document, nell'ordine dei file
+    """
+    if stats is not None:
+        stats.update(files=0, pages=0, chunks=0, seconds=0.0)
+    start = time.perf_counter()
+
+    batch: List[Document] = []
+    for name, pages, chunks in iter_split_documents(data_path, workers):
+        batch.extend(chunks)
+        if stats is not None:
+            stats["files"] += 1
+            stats["pages"] += pages
+            stats["chunks"] += len(chunks)
+            stats["seconds"] = time.perf_counter() - start
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+    if stats is not None:
+        stats["seconds"] = time.perf_counter() - start
+
+
+def throughput(stats: dict) -> str:
+    """Riga di riepilogo con pagine/s e chunk/s calcolati da stats."""
+    seconds = max(stats.get("seconds", 0.0), 1e-9)
+    return (f"{stats['files']} file, {stats['pages']} pagine, {stats['chunks']} chunks in {seconds:.1f}s "
+            f"({stats['pages'] / seconds:.1f} pagine/s, {stats['chunks'] / seconds:.1f} chunks/s)")
+
+
+def load_and_split_documents(data_path: str, workers: int = 1) -> List[Document]:
+    """Carica e divide i PDF in chunks.
+
+    Args:
+        data_path: percorso alla cartella con i PDF
+        workers: processi usati per estrazione e chunking (1 = sequenziale)
+
+    Returns:
+        Lista di Document con il testo diviso in chunks, nell'ordine dei file
+    """
+    documents = []
+    for _, _, chunks in iter_split_documents(data_path, workers):
+        documents.extend(chunks)
     return documents
 
 
-def process_calls(calls_dir: str = "data/calls") -> List[Document]:
+def process_calls(calls_dir: str = "data/calls", workers: int = 1) -> List[Document]:
     """Funzione dedicata per processare i bandi Erasmus.
 
     Args:
         calls_dir: percorso alla directory dei bandi
+        workers: processi usati per estrazione e chunking
 
     Returns:
         Lista di Document pronti per il vector store
     """
-    return load_and_split_documents(calls_dir)
-
+    return load_and_split_documents(calls_dir, workers)
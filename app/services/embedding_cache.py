@@ -0,0 +1,252 @@
+"""Cache persistente degli embedding dei chunk.
+
+Reindicizzare un bando invariato (scripts/index_calls.py, nuovo upload dello stesso
+file) produce gli stessi chunk: i loro vettori vengono letti dalla cache invece di
+essere ricalcolati dal modello.
+1. La chiave è l'hash SHA-256 del testo del chunk + l'identificativo del modello
+   (nome, backend e quantizzazione: varianti diverse danno vettori leggermente diversi)
+2. I vettori sono salvati come BLOB float32 (o float16, EMBEDDING_CACHE_FLOAT16)
+   nella tabella `embeddings` di data/cache.db
+3. Oltre EMBEDDING_CACHE_MAX_ENTRIES le voci usate meno di recente vengono rimosse (LRU)
+
+Solo i testi dei documenti passano dalla cache: le query degli utenti no.
+"""
+
+import hashlib
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..core.config import settings
+
+# Variabili per statement SQLite (limite prudente per le versioni meno recenti)
+_LOOKUP_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """Hash del testo di un chunk, usato come chiave della cache."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _pack(vector: List[float], dtype: str) -> bytes:
+    if dtype == "float16":
+        return struct.pack(f"<{len(vector)}e", *vector)
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes, dtype: str) -> List[float]:
+    if dtype == "float16":
+        return list(struct.unpack(f"<{len(blob) // 2}e", blob))
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Cache dei vettori dei chunk, indicizzata per hash del testo e modello.
+
+    Attributes:
+        db_path: Path del database SQLite della cache
+        max_entries: Numero massimo di vettori conservati (0 = illimitato)
+        dtype: Formato dei vettori salvati ("float32" o "float16")
+        hits: Numero di chunk serviti dalla cache
+        misses: Numero di chunk calcolati dal modello
+        evictions: Numero di voci rimosse dalla politica di eviction
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 200000, float16: bool = False):
+        """Inizializza la cache.
+
+        Args:
+            db_path: Percorso del file SQLite della cache
+            max_entries: Numero massimo di vettori (0 = illimitato)
+            float16: Salva i vettori in float16 (metà spazio, precisione ridotta)
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.dtype = "float16" if float16 else "float32"
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Crea una connessione al database della cache."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self) -> None:
+        """Crea la tabella della cache se non esiste."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    content_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    dtype TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (content_hash, model)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_many(self, hashes: List[str], model: str) -> Dict[str, List[float]]:
+        """Restituisce i vettori in cache per gli hash indicati (aggiornando l'ultimo accesso)."""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(f'''
+                    SELECT content_hash, dtype, vector FROM embeddings
+                    WHERE model = ? AND content_hash IN ({placeholders})
+                ''', (model, *batch))
+                for row in cursor.fetchall():
+                    found[row['content_hash']] = _unpack(row['vector'], row['dtype'])
+            if found:
+                now = time.time()
+                cursor.executemany(
+                    'UPDATE embeddings SET last_access = ? WHERE content_hash = ? AND model = ?',
+                    [(now, content_hash, model) for content_hash in found]
+                )
+                conn.commit()
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]], model: str) -> None:
+        """Salva i vettori calcolati e applica la politica di eviction."""
+        if not vectors:
+            return
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO embeddings (content_hash, model, dtype, vector, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (content_hash, model, self.dtype, _pack(vector, self.dtype), now, now)
+                for content_hash, vector in vectors.items()
+            ])
+            conn.commit()
+            self._evict(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Rimuove i vettori usati meno di recente oltre max_entries."""
+        if not self.max_entries:
+            return
+        entries = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        excess = entries - self.max_entries
+        if excess <= 0:
+            return
+        conn.execute('''
+            DELETE FROM embeddings WHERE rowid IN (
+                SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?
+            )
+        ''', (excess,))
+        conn.commit()
+        with self._lock:
+            self.evictions += excess
+        print(f"🧹 Embedding cache: rimosse {excess} voci (LRU)")
+
+    def record(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        """Restituisce contatori e dimensione corrente della cache."""
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                'SELECT COUNT(*) AS n, COALESCE(SUM(LENGTH(vector)), 0) AS total FROM embeddings'
+            ).fetchone()
+        finally:
+            conn.close()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": row['n'],
+            "size_bytes": row['total'],
+        }
+
+
+class CachedEmbeddings:
+    """Embedder che consulta la cache prima di calcolare i vettori dei documenti.
+
+    Espone la stessa interfaccia dell'embedder avvolto (embed_documents, embed_query,
+    index_signature), quindi può essere passato direttamente a Chroma.
+    """
+
+    def __init__(self, embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def __getattr__(self, name):
+        # index_signature, embed_queries, model_name, ... dell'embedder avvolto
+        return getattr(self.embeddings, name)
+
+    @property
+    def cache_model_id(self) -> str:
+        model_id = getattr(self.embeddings, "cache_model_id", None)
+        return model_id or type(self.embeddings).__name__
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        model = self.cache_model_id
+        hashes = [text_hash(text) for text in texts]
+        cached = self.cache.get_many(hashes, model)
+
+        # Testi mancanti, senza duplicati (chunk identici vengono calcolati una volta)
+        missing: Dict[str, str] = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in cached and content_hash not in missing:
+                missing[content_hash] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed, model)
+            cached.update(computed)
+
+        self.cache.record(hits=len(texts) - len(missing), misses=len(missing))
+        return [cached[content_hash] for content_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+# Istanza globale della cache (None se disabilitata)
+embedding_cache: Optional[EmbeddingCache] = (
+    EmbeddingCache(
+        db_path=settings.CACHE_DB_PATH,
+        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+        float16=settings.EMBEDDING_CACHE_FLOAT16,
+    )
+    if settings.EMBEDDING_CACHE_ENABLED else None
+)
@@ -0,0 +1,203 @@
+"""Backend di embedding su CPU per il vector store.
+
+Sostituisce HuggingFaceEmbeddings (una chiamata a encode() con i parametri di default)
+con un embedder configurabile, compatibile con l'interfaccia Embeddings di LangChain:
+1. batch size e numero di thread configurabili (EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS)
+2. esecuzione con PyTorch oppure con ONNX Runtime (EMBEDDING_BACKEND="onnx",
+   richiede sentence-transformers[onnx])
+3. quantizzazione int8 (EMBEDDING_QUANTIZE): dinamica sui layer lineari con PyTorch,
+   modello ONNX già quantizzato del repository del modello con ONNX
+4. vettori arrotondati a float16 (EMBEDDING_FLOAT16)
+
+Le varianti (backend, quantizzazione, float16) producono vettori nello stesso spazio
+del modello di riferimento e restano compatibili con gli indici esistenti. Il cambio
+di modello no: ogni categoria del vector store registra modello e dimensione in
+embedding.json (vedi index_signature) e un indice creato con un altro modello
+non viene aperto.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from langchain.embeddings.base import Embeddings
+
+from ..core.config import settings
+from ..core.metrics import registry, span
+
+# Modello usato finora: gli indici senza embedding.json sono stati creati con questo
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_DIMENSION = 384
+
+# File ONNX quantizzato int8 (x86 con AVX2) pubblicato nel repository del modello
+DEFAULT_ONNX_QUANTIZED_FILE = "onnx/model_quint8_avx2.onnx"
+
+INDEX_MARKER = "embedding.json"
+
+EMBEDDED_TEXTS = registry.counter(
+    "erasmus_embedded_texts_total", "Testi trasformati in embedding", ("kind",)
+)
+
+
+class SentenceEmbeddings(Embeddings):
+    """Embedder sentence-transformers con batch, thread, ONNX e quantizzazione configurabili.
+
+    Il modello viene caricato al primo utilizzo.
+
+    Attributes:
+        model_name: Nome del modello sentence-transformers
+        backend: "torch" o "onnx"
+        batch_size: Testi per batch in encode()
+        threads: Thread usati dal backend (0 = default della libreria)
+        quantize: Esecuzione con pesi int8
+        float16: Vettori arrotondati a float16
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, backend: str = "torch", batch_size: int = 32,
+                 threads: int = 0, quantize: bool = False, float16: bool = False,
+                 onnx_file: Optional[str] = None):
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Backend di embedding '{backend}' non supportato (torch, onnx)")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        self.quantize = quantize
+        self.float16 = float16
+        self.onnx_file = onnx_file
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    with span("embedding.load"):
+                        self._model = self._load()
+        return self._model
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "onnx":
+            try:
+                return self._load_onnx(SentenceTransformer)
+            except Exception as e:
+                print(f"⚠️ Backend ONNX non disponibile ({e}), uso PyTorch")
+                self.backend = "torch"
+
+        import torch
+
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.quantize:
+            # Quantizzazione dinamica: pesi dei layer lineari in int8, attivazioni in float
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _load_onnx(self, SentenceTransformer):
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        onnx_file = self.onnx_file or (DEFAULT_ONNX_QUANTIZED_FILE if self.quantize else None)
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        if self.threads > 0:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = options
+        return SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def index_signature(self) -> dict:
+        """Dati che devono coincidere tra l'indice su disco e l'embedder che lo interroga."""
+        return {"model": self.model_name, "dimension": self.dimension}
+
+    @property
+    def cache_model_id(self) -> str:
+        """Identificativo dei vettori prodotti, usato come chiave nella cache degli embedding."""
+        # Il backend effettivo è noto solo dopo il caricamento (fallback ONNX → PyTorch)
+        self.model
+        return (f"{self.model_name}:{self.backend}"
+                f"{':int8' if self.quantize else ''}{':fp16' if self.float16 else ''}")
+
+    def _encode(self, texts: List[str], kind: str) -> List[List[float]]:
+        if not texts:
+            return []
+        # Come HuggingFaceEmbeddings: gli a capo vengono sostituiti da spazi
+        texts = [text.replace("\n", " ") for text in texts]
+        with span(f"embedding.{kind}"):
+            vectors = self.model.encode(
+                texts, batch_size=self.batch_size, convert_to_numpy=True,
+                normalize_embeddings=False, show_progress_bar=False
+            )
+        if self.float16:
+            vectors = vectors.astype("float16")
+        EMBEDDED_TEXTS.inc(len(texts), kind=kind)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts), "documents")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embedding di più query in un solo batch."""
+        return self._encode(list(texts), "query")
+
+
+def create_embeddings() -> SentenceEmbeddings:
+    """Crea l'embedder configurato nelle impostazioni EMBEDDING_*."""
+    return SentenceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL,
+        backend=settings.EMBEDDING_BACKEND,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        threads=settings.EMBEDDING_THREADS,
+        quantize=settings.EMBEDDING_QUANTIZE,
+        float16=settings.EMBEDDING_FLOAT16,
+        onnx_file=settings.EMBEDDING_ONNX_FILE,
+    )
+
+
+def read_index_signature(db_path: Path) -> dict:
+    """Modello e dimensione con cui è stato creato l'indice (default per gli indici precedenti)."""
+    marker = Path(db_path) / INDEX_MARKER
+    if not marker.exists():
+        return {"model": DEFAULT_MODEL, "dimension": DEFAULT_DIMENSION}
+    return json.loads(marker.read_text(encoding="utf-8"))
+
+
+def write_index_signature(db_path: Path, embeddings) -> None:
+    """Registra in embedding.json il modello dell'indice, se non è già registrato."""
+    marker = Path(db_path) / INDEX_MARKER
+    if marker.exists() or not hasattr(embeddings, "index_signature"):
+        return
+    marker.write_text(json.dumps(embeddings.index_signature(), indent=2), encoding="utf-8")
+
+
+def check_index_compatibility(db_path: Path, category: str, embeddings) -> None:
+    """
+    Verifica che l'indice su disco sia stato creato con lo stesso modello dell'embedder.
+
+    Gli embedder senza index_signature (es. FakeEmbeddings negli script) non vengono verificati.
+
+    Raises:
+        ValueError: Se modello o dimensione non coincidono
+    """
+    if not hasattr(embeddings, "index_signature"):
+        return
+    stored = read_index_signature(db_path)
+    current = embeddings.index_signature()
+    if stored.get("model") != current["model"] or stored.get("dimension") != current["dimension"]:
+        raise ValueError(
+            f"Il database '{category}' è stato creato con {stored.get('model')} ({stored.get('dimension')} dimensioni), "
+            f"l'embedder attuale usa {current['model']} ({current['dimension']} dimensioni). "
+            f"Reindicizza la categoria (es. python scripts/index_calls.py --rebuild)"
+        )
@@ -0,0 +1,166 @@
+"""Contesto dei corsi per l'analisi di compatibilità degli esami (step 3).
+
+Invece di inserire nel prompt l'intero PDF dei corsi della destinazione, il catalogo
+viene diviso in chunk e indicizzato nella categoria "courses" del vector store al
+momento dell'upload (metadato "source" = stored_filename del documento). Allo step 3:
+1. Dal piano di studi si estraggono i nomi degli esami (righe con CFU/ECTS)
+2. Per ogni esame si recuperano i top-k chunk del catalogo della destinazione
+3. I chunk vengono inseriti a turno (il migliore di ogni esame, poi il secondo, ...)
+   finché non si esaurisce il budget di token
+
+I cataloghi che rientrano già nel budget vengono passati per intero.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from ..core.metrics import registry, estimate_tokens
+
+# Tipi di documento dei cataloghi dei corsi: gli upload usano 'corsi_erasmus',
+# i documenti registrati in precedenza 'erasmus_courses'
+COURSE_DOCUMENT_TYPES = ('corsi_erasmus', 'erasmus_courses')
+
+# Categoria del vector store con i chunk dei cataloghi
+COURSES_CATEGORY = 'courses'
+
+# Separatore tra i chunk nel prompt
+CHUNK_SEPARATOR = "\n---\n"
+
+EXAMS_CONTEXT_REQUESTS = registry.counter(
+    "erasmus_exams_context_total", "Analisi degli esami per modalità di costruzione del contesto", ("mode",)
+)
+EXAMS_CONTEXT_TOKENS = registry.counter(
+    "erasmus_exams_context_tokens_total",
+    "Token stimati del catalogo dei corsi: intero ('catalog') e inserito nel prompt ('context')",
+    ("kind",)
+)
+
+# Crediti di un esame (es. "9 CFU", "6 ECTS", "7,5 crediti")
+_CREDITS_RE = re.compile(r'\b\d{1,2}(?:[.,]\d)?\s*(?:CFU|ECTS|crediti|credits)\b', re.IGNORECASE)
+# Parti da rimuovere dal nome: codici tra parentesi quadre e parentesi con i crediti/ore
+_EXAM_NOISE_RE = re.compile(r'\[[^\]]*\]|\([^)]*(?:CFU|ECTS|ore|hours)[^)]*\)?', re.IGNORECASE)
+# Date, voti (28/30, 30 e lode) e numeri residui
+_EXAM_DIGITS_RE = re.compile(r'\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b|\be lode\b|\d+(?:[.,]\d+)?', re.IGNORECASE)
+
+
+def _clean_exam_name(line: str) -> str:
+    name = _EXAM_NOISE_RE.sub(' ', line)
+    name = _CREDITS_RE.sub(' ', name)
+    name = _EXAM_DIGITS_RE.sub(' ', name)
+    name = re.sub(r'[|\-–:;,.()\s]+', ' ', name)
+    return name.strip()
+
+
+def extract_study_plan_exams(study_plan_text: str, max_exams: int = 40) -> List[str]:
+    """
+    Estrae i nomi degli esami dal testo del piano di studi, da usare come query.
+
+    Vengono usate le righe che riportano i crediti (CFU/ECTS); se il piano non li
+    indica, le righe brevi con almeno due parole.
+
+    Args:
+        study_plan_text: Testo estratto dal PDF del piano di studi
+        max_exams: Numero massimo di esami restituiti
+
+    Returns:
+        Nomi degli esami, senza duplicati e nell'ordine del piano
+    """
+    lines = [line.strip() for line in study_plan_text.splitlines() if line.strip()]
+    candidates = [line for line in lines if _CREDITS_RE.search(line)]
+    if not candidates:
+        candidates = [line for line in lines if 5 <= len(line) <= 120 and len(re.findall(r'[^\W\d_]{2,}', line)) >= 2]
+
+    exams: List[str] = []
+    seen = set()
+    for line in candidates:
+        name = _clean_exam_name(line)
+        if len(re.findall(r'[^\W\d_]', name)) < 3 or name.lower() in seen:
+            continue
+        seen.add(name.lower())
+        exams.append(name)
+        if len(exams) >= max_exams:
+            break
+    return exams
+
+
+def pack_course_chunks(ranked_chunks: List[List[str]], token_budget: int) -> Tuple[str, int]:
+    """
+    Seleziona i chunk da inserire nel prompt entro il budget di token.
+
+    I chunk vengono presi a turno dai risultati di ogni esame (il primo di ogni
+    esame, poi il secondo, ...), così ogni esame ha almeno il proprio chunk migliore
+    prima che gli altri ricevano il secondo. I chunk già selezionati per un altro
+    esame non vengono ripetuti; quelli che non entrano nel budget residuo vengono saltati.
+
+    Args:
+        ranked_chunks: Per ogni esame, i testi dei chunk in ordine di rilevanza
+        token_budget: Token stimati disponibili per il catalogo
+
+    Returns:
+        Tupla (testo dei chunk selezionati, numero di chunk)
+    """
+    selected: List[str] = []
+    seen = set()
+    used = 0
+    separator_tokens = estimate_tokens(CHUNK_SEPARATOR)
+    depth = max((len(chunks) for chunks in ranked_chunks), default=0)
+    for rank in range(depth):
+        for chunks in ranked_chunks:
+            if rank >= len(chunks) or chunks[rank] in seen:
+                continue
+            tokens = estimate_tokens(chunks[rank]) + separator_tokens
+            if used + tokens > token_budget:
+                continue
+            seen.add(chunks[rank])
+            selected.append(chunks[rank])
+            used += tokens
+    return CHUNK_SEPARATOR.join(selected), len(selected)
+
+
+def truncate_to_budget(text: str, token_budget: int) -> str:
+    """Tronca il testo al budget di token, all'ultima riga completa."""
+    max_chars = token_budget * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars]
+
+
+def search_course_chunks(exams: List[str], source: str, top_k: int) -> List[List[str]]:
+    """
+    Recupera dal vector store i chunk del catalogo `source` più simili a ogni esame
+    (bloccante, da eseguire nel pool "vector").
+
+    Returns:
+        Per ogni esame, i testi dei chunk in ordine di rilevanza (liste vuote se il
+        catalogo non è indicizzato)
+    """
+    from .vector_db_service import vector_store_service
+
+    if not exams:
+        return []
+    try:
+        results = vector_store_service.search_many(
+            COURSES_CATEGORY, exams, top_k=top_k, filter_metadata={"source": source}
+        )
+    except ValueError:
+        # La categoria "courses" non esiste ancora
+        return [[] for _ in exams]
+    return [[doc.page_content for doc in docs] for docs in results]
+
+
+def record_context(mode: str, catalog_text: str, context_text: str) -> None:
+    """Registra modalità e dimensione del contesto costruito per un'analisi."""
+    EXAMS_CONTEXT_REQUESTS.inc(mode=mode)
+    EXAMS_CONTEXT_TOKENS.inc(estimate_tokens(catalog_text), kind="catalog")
+    EXAMS_CONTEXT_TOKENS.inc(estimate_tokens(context_text), kind="context")
+
+
+def describe_context(mode: str, catalog_text: str, context_text: str, chunks: Optional[int] = None) -> str:
+    """Riga di log con la riduzione del contesto rispetto al catalogo completo."""
+    catalog_tokens = estimate_tokens(catalog_text)
+    context_tokens = estimate_tokens(context_text)
+    ratio = context_tokens / catalog_tokens * 100 if catalog_tokens else 100.0
+    details = f", {chunks} chunk" if chunks is not None else ""
+    return (f"📦 Contesto corsi ({mode}{details}): {context_tokens} token su {catalog_tokens} "
+            f"del catalogo completo ({ratio:.0f}%)")
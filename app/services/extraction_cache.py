@@ -0,0 +1,233 @@
+"""Cache persistente del testo estratto dai PDF.
+
+Questo modulo evita di ri-eseguire pdfplumber sugli stessi file ad ogni richiesta:
+1. Il contenuto del PDF viene identificato con un hash SHA-256 (content-addressed)
+2. La chiave include anche il nome e la versione dell'estrattore usato
+3. Il testo estratto è salvato in SQLite (data/cache.db) e sopravvive ai riavvii
+4. Le voci meno usate vengono rimosse quando si superano i limiti configurati (LRU)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from ..core.config import settings
+
+# Hash memorizzati (un file modificato lascia la voce precedente, quindi il memo va limitato)
+_HASH_MEMO_SIZE = 1024
+
+
+class ExtractionCache:
+    """Cache del testo estratto dai PDF, indicizzata per hash del contenuto.
+
+    Attributes:
+        db_path: Path del database SQLite della cache
+        max_entries: Numero massimo di voci conservate
+        max_bytes: Dimensione massima complessiva (in byte) del testo conservato
+        hits: Numero di richieste servite dalla cache
+        misses: Numero di richieste che hanno richiesto un'estrazione
+        evictions: Numero di voci rimosse dalla politica di eviction
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 200, max_bytes: int = 200 * 1024 * 1024):
+        """Inizializza la cache.
+
+        Args:
+            db_path: Percorso del file SQLite della cache
+            max_entries: Numero massimo di voci (0 = illimitato)
+            max_bytes: Dimensione massima del testo conservato (0 = illimitata)
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # Memo LRU degli hash già calcolati: (path, mtime, size) -> sha256
+        self._hash_memo: "OrderedDict[Tuple[str, float, int], str]" = OrderedDict()
+        self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Crea una connessione al database della cache."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self) -> None:
+        """Crea la tabella della cache se non esiste."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS extracted_text (
+                content_hash TEXT NOT NULL,
+                extractor TEXT NOT NULL,
+                extractor_version INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (content_hash, extractor, extractor_version)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_extracted_text_last_access
+            ON extracted_text(last_access)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def file_hash(self, pdf_path: str) -> str:
+        """Calcola (o recupera dal memo) l'hash SHA-256 del contenuto del file.
+
+        Args:
+            pdf_path: Percorso del file
+
+        Returns:
+            Hash esadecimale del contenuto
+        """
+        stat = os.stat(pdf_path)
+        memo_key = (str(Path(pdf_path).resolve()), stat.st_mtime, stat.st_size)
+        with self._lock:
+            cached = self._hash_memo.get(memo_key)
+            if cached:
+                self._hash_memo.move_to_end(memo_key)
+                return cached
+
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        with self._lock:
+            self._hash_memo[memo_key] = content_hash
+            while len(self._hash_memo) > _HASH_MEMO_SIZE:
+                self._hash_memo.popitem(last=False)
+        return content_hash
+
+    def get(self, content_hash: str, extractor: str, version: int) -> Optional[str]:
+        """Restituisce il testo in cache (aggiornando l'ultimo accesso) oppure None."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT text FROM extracted_text
+                WHERE content_hash = ? AND extractor = ? AND extractor_version = ?
+            ''', (content_hash, extractor, version))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute('''
+                UPDATE extracted_text SET last_access = ?
+                WHERE content_hash = ? AND extractor = ? AND extractor_version = ?
+            ''', (time.time(), content_hash, extractor, version))
+            conn.commit()
+            return row['text']
+        finally:
+            conn.close()
+
+    def put(self, content_hash: str, extractor: str, version: int, text: str) -> None:
+        """Salva il testo estratto e applica la politica di eviction."""
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO extracted_text
+                (content_hash, extractor, extractor_version, text, size_bytes, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (content_hash, extractor, version, text, len(text.encode('utf-8')), now, now))
+            conn.commit()
+            self._evict(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Rimuove le voci usate meno di recente finché i limiti sono rispettati."""
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) AS n, COALESCE(SUM(size_bytes), 0) AS total FROM extracted_text')
+        row = cursor.fetchone()
+        entries, total_bytes = row['n'], row['total']
+
+        removed = 0
+        while ((self.max_entries and entries > self.max_entries)
+               or (self.max_bytes and total_bytes > self.max_bytes and entries > 1)):
+            cursor.execute('''
+                SELECT rowid, size_bytes FROM extracted_text
+                ORDER BY last_access ASC LIMIT 1
+            ''')
+            oldest = cursor.fetchone()
+            if oldest is None:
+                break
+            cursor.execute('DELETE FROM extracted_text WHERE rowid = ?', (oldest['rowid'],))
+            entries -= 1
+            total_bytes -= oldest['size_bytes']
+            removed += 1
+
+        if removed:
+            conn.commit()
+            with self._lock:
+                self.evictions += removed
+            print(f"🧹 Extraction cache: rimosse {removed} voci (LRU)")
+
+    def get_or_extract(self, pdf_path: str, extractor: str, version: int,
+                       extract_fn: Callable[[str], str]) -> str:
+        """Restituisce il testo estratto dal PDF, usando la cache quando possibile.
+
+        Args:
+            pdf_path: Percorso del PDF
+            extractor: Nome dell'estrattore (es. 'text:pymupdf:<versione>', 'tables_and_text:pdfplumber:<versione>')
+            version: Versione dell'estrattore; cambiarla invalida le voci precedenti
+            extract_fn: Funzione che esegue l'estrazione reale dato il path
+
+        Returns:
+            Testo estratto
+        """
+        content_hash = self.file_hash(pdf_path)
+        text = self.get(content_hash, extractor, version)
+        if text is not None:
+            with self._lock:
+                self.hits += 1
+            return text
+
+        with self._lock:
+            self.misses += 1
+        text = extract_fn(pdf_path)
+        self.put(content_hash, extractor, version, text)
+        return text
+
+    def stats(self) -> dict:
+        """Restituisce contatori e dimensione corrente della cache."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) AS n, COALESCE(SUM(size_bytes), 0) AS total FROM extracted_text')
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": row['n'],
+            "size_bytes": row['total'],
+        }
+
+
+# Istanza globale della cache
+extraction_cache = ExtractionCache(
+    db_path=settings.CACHE_DB_PATH,
+    max_entries=settings.EXTRACTION_CACHE_MAX_ENTRIES,
+    max_bytes=settings.EXTRACTION_CACHE_MAX_BYTES,
+)
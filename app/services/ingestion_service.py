@@ -0,0 +1,269 @@
+"""Indicizzazione in background dei documenti caricati dalle università.
+
+L'upload salva il file, registra il documento e accoda un job: estrazione del testo,
+chunking, embedding e popolamento delle cache vengono eseguiti da un pool di worker
+asyncio (ogni passo pesante gira nel pool "pdf" e gli aggiornamenti dei job nel pool "db",
+senza bloccare l'event loop).
+Lo stato dei job è salvato nella tabella `ingestion_jobs` di universities.db:
+1. Il client può seguire l'avanzamento con GET /api/universities/jobs/{id}
+2. I job rimasti in coda o interrotti vengono ripresi al riavvio del server
+"""
+
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from ..core.config import settings
+from ..core.database import db_manager
+from ..core.executors import run_blocking
+
+
+# Parametri di chunking dei bandi per il vector store
+CALL_CHUNK_SIZE = 1000
+CALL_CHUNK_OVERLAP = 200
+
+# Chunk più piccoli per i cataloghi dei corsi: pochi corsi per chunk, così allo
+# step 3 il retrieval seleziona solo quelli pertinenti agli esami dello studente
+COURSE_CHUNK_SIZE = 600
+COURSE_CHUNK_OVERLAP = 80
+
+
+def _now() -> str:
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+def split_call_document(file_path: str, stored_filename: str, university_name: str) -> List:
+    """Carica il PDF di un bando e lo divide in chunk per il vector store."""
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    loader = PyPDFLoader(str(file_path))
+    pages = loader.load()
+
+    # Aggiungi metadata
+    for page in pages:
+        page.metadata["source"] = stored_filename
+        page.metadata["university"] = university_name
+
+    # Dividi in chunks
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CALL_CHUNK_SIZE,
+        chunk_overlap=CALL_CHUNK_OVERLAP,
+    )
+    return text_splitter.split_documents(pages)
+
+
+def split_courses_document(text: str, stored_filename: str, university_id: int, university_name: str) -> List:
+    """Divide il testo estratto di un catalogo dei corsi in chunk per il vector store."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=COURSE_CHUNK_SIZE,
+        chunk_overlap=COURSE_CHUNK_OVERLAP,
+    )
+    metadata = {
+        "source": stored_filename,
+        "university_id": university_id,
+        "university": university_name,
+    }
+    return text_splitter.create_documents([text], metadatas=[metadata])
+
+
+def index_courses_document(document: dict) -> int:
+    """
+    Indicizza il catalogo dei corsi di un documento nella categoria "courses"
+    (bloccante), sostituendo i chunk di un'indicizzazione precedente.
+
+    Returns:
+        Numero di chunk indicizzati
+    """
+    from .rag_service import extract_text_from_pdf
+    from .vector_db_service import replace_source_documents
+    from .exams_context import COURSES_CATEGORY
+
+    university = db_manager.get_university_by_id(document['university_id']) or {}
+    text = extract_text_from_pdf(document['file_path'], document_type=document['document_type'])
+    chunks = split_courses_document(
+        text, document['stored_filename'], document['university_id'], university.get('university_name', '')
+    )
+    replace_source_documents(chunks, category=COURSES_CATEGORY, source=document['stored_filename'])
+    print(f"✅ Indicizzati {len(chunks)} chunks del catalogo {document['stored_filename']}")
+    return len(chunks)
+
+
+def run_ingestion(job: dict, report=None) -> None:
+    """
+    Esegue l'indicizzazione di un documento (bloccante, da eseguire in un thread).
+
+    Args:
+        job: Riga di ingestion_jobs
+        report: Callback opzionale report(stage, progress) per l'avanzamento
+
+    Raises:
+        ValueError: Se il documento non esiste più
+    """
+    from .rag_service import warm_extraction_cache
+    from .exams_context import COURSE_DOCUMENT_TYPES
+
+    report = report or (lambda stage, progress: None)
+
+    document = db_manager.get_document(job['document_id'])
+    if document is None:
+        raise ValueError(f"Documento {job['document_id']} non trovato")
+    if not document['is_active']:
+        report("documento disattivato, indicizzazione saltata", 1.0)
+        return
+
+    file_path = document['file_path']
+    document_type = document['document_type']
+
+    report("estrazione del testo", 0.1)
+    warm_extraction_cache(file_path, document_type)
+
+    if document_type == 'erasmus_call':
+        from .vector_db_service import replace_source_documents
+
+        university = db_manager.get_university_by_id(document['university_id']) or {}
+        report("suddivisione in chunk", 0.4)
+        chunks = split_call_document(file_path, document['stored_filename'], university.get('university_name', ''))
+
+        report(f"embedding di {len(chunks)} chunk", 0.6)
+        replace_source_documents(chunks, category='calls', source=document['stored_filename'])
+        print(f"✅ Indicizzati {len(chunks)} chunks nel vector store")
+
+    elif document_type == 'destinazioni':
+        from .destinations_service import index_destinations_document
+
+        report("indicizzazione delle destinazioni", 0.5)
+        index_destinations_document(document['id'], document['university_id'], file_path)
+
+    elif document_type in COURSE_DOCUMENT_TYPES:
+        report("embedding dei corsi", 0.5)
+        index_courses_document(document)
+
+    report("completato", 1.0)
+
+
+class IngestionQueue:
+    """Coda in-process dei job di indicizzazione con un pool di worker asyncio.
+
+    Attributes:
+        workers: Numero di worker (job eseguiti in parallelo)
+        completed: Numero di job completati dall'avvio
+        failed: Numero di job falliti dall'avvio
+    """
+
+    def __init__(self, workers: int = 2):
+        """Inizializza la coda (i worker partono con start()).
+
+        Args:
+            workers: Numero di job eseguiti in parallelo
+        """
+        self.workers = max(1, workers)
+        self.completed = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Avvia i worker e riaccoda i job non terminati."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"ingestion-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+        pending = await run_blocking("db", db_manager.get_unfinished_ingestion_jobs)
+        for job in pending:
+            self._queue.put_nowait(job['id'])
+        print(f"✅ Coda di indicizzazione avviata con {self.workers} worker"
+              + (f" ({len(pending)} job ripresi)" if pending else ""))
+
+    async def stop(self) -> None:
+        """Ferma i worker; i job non completati restano in tabella e vengono ripresi al riavvio."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def enqueue(self, document_id: int, university_id: int, document_type: str) -> int:
+        """
+        Registra e accoda un job di indicizzazione per un documento appena caricato.
+
+        Returns:
+            ID del job (per GET /api/universities/jobs/{id})
+        """
+        job_id = await run_blocking(
+            "db", db_manager.create_ingestion_job, document_id, university_id, document_type
+        )
+        if not self.running:
+            # Es. app avviata senza lifespan: i worker partono al primo job (ripreso da start)
+            await self.start()
+        else:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    def stats(self) -> dict:
+        """Restituisce numero di worker, job in coda e contatori."""
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: int) -> None:
+        job = await run_blocking("db", db_manager.get_ingestion_job, job_id)
+        if job is None or job['status'] in ('completed', 'failed'):
+            return
+
+        await run_blocking(
+            "db", db_manager.update_ingestion_job, job_id, status='running', started_at=_now(), error=None
+        )
+
+        loop = asyncio.get_running_loop()
+
+        def report(stage: str, progress: float) -> None:
+            # Chiamato dal thread del pool "pdf": l'aggiornamento passa comunque dal pool "db"
+            # e viene atteso, così le fasi restano in ordine
+            asyncio.run_coroutine_threadsafe(
+                run_blocking("db", db_manager.update_ingestion_job, job_id, stage=stage, progress=progress),
+                loop
+            ).result()
+
+        try:
+            await run_blocking("pdf", run_ingestion, job, report)
+        except Exception as e:
+            print(f"❌ Job di indicizzazione {job_id} fallito: {e}")
+            await run_blocking(
+                "db", db_manager.update_ingestion_job,
+                job_id, status='failed', stage='errore', error=str(e), finished_at=_now()
+            )
+            self.failed += 1
+            return
+
+        await run_blocking(
+            "db", db_manager.update_ingestion_job, job_id, status='completed', progress=1.0, finished_at=_now()
+        )
+        self.completed += 1
+        print(f"✅ Job di indicizzazione {job_id} completato (documento {job['document_id']})")
+
+
+# Istanza globale della coda
+ingestion_queue = IngestionQueue(workers=settings.INGESTION_WORKERS)
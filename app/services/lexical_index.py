@@ -0,0 +1,159 @@
+"""Indice lessicale (BM25) dei chunk, affiancato al database Chroma di ogni categoria.
+
+La ricerca vettoriale trova i paragrafi semanticamente vicini alla query ma spesso
+perde quelli che contengono termini precisi (scadenze, CFU, livelli linguistici).
+L'indice lessicale usa una tabella FTS5 di SQLite (indice invertito con ranking BM25)
+salvata in <categoria>/lexical.sqlite3 e aggiornata insieme a Chroma:
+1. Ogni chunk è registrato con il proprio ID (lo stesso di Chroma), sorgente e metadati
+2. Le query diventano un OR dei termini (senza stopword); i termini lunghi sono
+   cercati per prefisso, un'approssimazione dello stemming per l'italiano
+   (es. "scadenze" trova anche "scadenza")
+3. fuse_rankings() combina le classifiche (vettoriale e lessicale, anche di più query)
+   con la Reciprocal Rank Fusion
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+INDEX_FILENAME = "lexical.sqlite3"
+
+# Costante della Reciprocal Rank Fusion (valore standard della letteratura)
+RRF_K = 60
+
+# Parole troppo comuni per essere utili in una query (italiano e inglese)
+STOPWORDS = frozenset("""
+a ad al alla alle allo agli ai anche che chi con come da dal dalla dalle dei del della delle dello
+degli di e ed gli i il in la le lo nel nella nelle negli non o per più quale quali se si sono su sul
+sulla tra un una uno
+the of and or to in for on with by is are be at as an from
+""".split())
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def query_terms(query: str) -> List[str]:
+    """Termini della query in sintassi FTS5 (tra virgolette, con prefisso per i termini lunghi)."""
+    terms = []
+    for token in _TOKEN_RE.findall(query.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        # Prefisso: "requisiti" -> "requisi"*, "linguistici" -> "linguisti"*
+        term = f'"{token[:-2]}"*' if len(token) >= 6 else f'"{token}"'
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def fuse_rankings(rankings: Iterable[List[Hashable]], k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """
+    Reciprocal Rank Fusion: ogni elemento riceve 1 / (k + posizione) da ogni classifica.
+
+    Args:
+        rankings: Classifiche di chiavi (es. ID dei chunk), dalla più rilevante
+        k: Costante di smorzamento (valori alti riducono il peso delle prime posizioni)
+
+    Returns:
+        Coppie (chiave, punteggio) in ordine di punteggio decrescente
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for position, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """Indice BM25 dei chunk di una categoria (FTS5 in SQLite).
+
+    Le scritture sono serializzate dal lock di scrittura della categoria nel
+    VectorStoreService; ogni thread usa una propria connessione.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_database(self) -> None:
+        conn = self._get_connection()
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                content,
+                chunk_id UNINDEXED,
+                source UNINDEXED,
+                metadata UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        conn.commit()
+
+    def count(self) -> int:
+        return self._get_connection().execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[dict]) -> None:
+        """Aggiunge i chunk, sostituendo quelli con lo stesso ID."""
+        conn = self._get_connection()
+        conn.executemany('DELETE FROM chunks WHERE chunk_id = ?', [(chunk_id,) for chunk_id in ids])
+        conn.executemany(
+            'INSERT INTO chunks (content, chunk_id, source, metadata) VALUES (?, ?, ?, ?)',
+            [
+                (text, chunk_id, (metadata or {}).get("source", ""), json.dumps(metadata or {}, ensure_ascii=False))
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+        )
+        conn.commit()
+
+    def delete_source(self, source: str) -> int:
+        conn = self._get_connection()
+        removed = conn.execute('DELETE FROM chunks WHERE source = ?', (source,)).rowcount
+        conn.commit()
+        return removed
+
+    def search(self, query: str, top_k: int = 5,
+               filter_metadata: Optional[dict] = None) -> List[Tuple[str, str, dict]]:
+        """
+        Cerca i chunk più rilevanti per la query secondo BM25.
+
+        Args:
+            query: Testo della query
+            top_k: Numero massimo di risultati
+            filter_metadata: Filtro di uguaglianza sui metadati (es. {"source": "bando.pdf"})
+
+        Returns:
+            Terne (chunk_id, testo, metadati) dalla più rilevante
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        filter_metadata = dict(filter_metadata or {})
+        source = filter_metadata.pop("source", None)
+
+        sql = 'SELECT chunk_id, content, metadata FROM chunks WHERE chunks MATCH ?'
+        params: list = [" OR ".join(terms)]
+        if source is not None:
+            sql += ' AND source = ?'
+            params.append(source)
+        # Con filtri su altri metadati si leggono più candidati e si filtra dopo
+        sql += ' ORDER BY bm25(chunks) LIMIT ?'
+        params.append(top_k * 5 if filter_metadata else top_k)
+
+        results = []
+        for chunk_id, content, metadata in self._get_connection().execute(sql, params):
+            metadata = json.loads(metadata)
+            if all(metadata.get(key) == value for key, value in filter_metadata.items()):
+                results.append((chunk_id, content, metadata))
+                if len(results) >= top_k:
+                    break
+        return results
@@ -0,0 +1,190 @@
+"""Cache persistente delle risposte LLM (riassunti dei bandi).
+
+Il riassunto dello step 1 dipende solo dal bando attivo dell'università, quindi viene
+generato una volta e servito dalla cache SQLite (data/cache.db) alle richieste successive.
+La chiave comprende:
+1. ID del documento e hash del contenuto del PDF
+2. Nome del modello usato
+3. Hash del template del prompt (cambiare il prompt invalida le voci precedenti)
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+
+
+def prompt_hash(template: str) -> str:
+    """Hash breve del template di un prompt, usato come parte della chiave di cache."""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+
+class LLMResponseCache:
+    """Cache delle risposte LLM per documento.
+
+    Attributes:
+        db_path: Path del database SQLite della cache
+        hits: Numero di risposte servite dalla cache
+        misses: Numero di richieste che hanno richiesto una chiamata all'LLM
+        invalidations: Numero di voci rimosse per disattivazione/sostituzione del documento
+    """
+
+    def __init__(self, db_path: str):
+        """Inizializza la cache.
+
+        Args:
+            db_path: Percorso del file SQLite della cache
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._init_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Crea una connessione al database della cache."""
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self) -> None:
+        """Crea la tabella della cache se non esiste."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                kind TEXT NOT NULL,
+                document_id INTEGER NOT NULL,
+                university_id INTEGER,
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (kind, document_id, content_hash, model, prompt_hash)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_llm_responses_university
+            ON llm_responses(university_id, kind)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def get(self, kind: str, document_id: int, content_hash: str,
+            model: str, prompt_hash: str) -> Optional[str]:
+        """Restituisce la risposta in cache oppure None (aggiornando i contatori)."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT response FROM llm_responses
+                WHERE kind = ? AND document_id = ? AND content_hash = ?
+                AND model = ? AND prompt_hash = ?
+            ''', (kind, document_id, content_hash, model, prompt_hash))
+            row = cursor.fetchone()
+            if row is not None:
+                cursor.execute('''
+                    UPDATE llm_responses SET last_access = ?
+                    WHERE kind = ? AND document_id = ? AND content_hash = ?
+                    AND model = ? AND prompt_hash = ?
+                ''', (time.time(), kind, document_id, content_hash, model, prompt_hash))
+                conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row['response'] if row is not None else None
+
+    def get_latest(self, kind: str, document_id: int, model: str) -> Optional[str]:
+        """
+        Risposta più recente per il documento, anche se generata da una versione
+        precedente del PDF o del prompt. Usata come ripiego quando l'LLM non è disponibile.
+        """
+        conn = self._get_connection()
+        try:
+            row = conn.execute('''
+                SELECT response FROM llm_responses
+                WHERE kind = ? AND document_id = ? AND model = ?
+                ORDER BY created_at DESC LIMIT 1
+            ''', (kind, document_id, model)).fetchone()
+        finally:
+            conn.close()
+        return row['response'] if row is not None else None
+
+    def put(self, kind: str, document_id: int, content_hash: str, model: str,
+            prompt_hash: str, response: str, university_id: int = None) -> None:
+        """Salva una risposta generata dall'LLM."""
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_responses
+                (kind, document_id, university_id, content_hash, model, prompt_hash,
+                 response, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (kind, document_id, university_id, content_hash, model, prompt_hash,
+                  response, now, now))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _delete(self, where: str, params: tuple) -> int:
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'DELETE FROM llm_responses WHERE {where}', params)
+            removed = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.invalidations += removed
+        return removed
+
+    def invalidate_document(self, document_id: int) -> int:
+        """Rimuove le risposte generate a partire da un documento (es. bando disattivato)."""
+        return self._delete('document_id = ?', (document_id,))
+
+    def invalidate_university(self, university_id: int, kind: str = None) -> int:
+        """Rimuove le risposte dei documenti di un'università (es. nuovo bando caricato)."""
+        if kind:
+            return self._delete('university_id = ? AND kind = ?', (university_id, kind))
+        return self._delete('university_id = ?', (university_id,))
+
+    def stats(self) -> dict:
+        """Restituisce contatori e numero di voci della cache."""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) AS n FROM llm_responses')
+            entries = cursor.fetchone()['n']
+        finally:
+            conn.close()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+# Istanza globale della cache
+llm_cache = LLMResponseCache(db_path=settings.CACHE_DB_PATH)
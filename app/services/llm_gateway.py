@@ -0,0 +1,338 @@
+"""Gateway delle chiamate LLM: limiti di concorrenza, timeout, retry e circuit breaker.
+
+Tutte le generazioni dei servizi passano da llm_gateway invece di chiamare direttamente
+il provider, così quota esaurita e risposte lente non si accumulano:
+1. Concorrenza: un semaforo globale (LLM_MAX_CONCURRENCY) e uno per scopo
+   (LLM_PURPOSE_MAX_CONCURRENCY), così ad esempio le sezioni dei bandi lunghi non
+   occupano tutti i posti dell'analisi degli esami
+2. Deadline: ogni chiamata ha un tempo massimo complessivo (LLM_DEADLINE_SECONDS) che
+   comprende attesa in coda, tentativi e pause; ogni tentativo ha il proprio timeout
+   (LLM_TIMEOUT_SECONDS), ridotto al tempo rimasto
+3. Retry con backoff esponenziale (e jitter) per gli errori transitori: timeout,
+   quota esaurita (429) ed errori del server (5xx)
+4. Circuit breaker: dopo LLM_CIRCUIT_FAILURE_THRESHOLD fallimenti transitori consecutivi
+   le chiamate falliscono subito con LLMUnavailableError per LLM_CIRCUIT_RESET_SECONDS;
+   poi una chiamata di prova decide se richiudere il circuito
+
+I servizi gestiscono LLMUnavailableError con un contenuto di ripiego (riassunto in
+cache, messaggio con il link al PDF). Ogni esito viene contato in
+erasmus_llm_gateway_total{purpose, outcome}.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import registry
+from .llm_provider import get_llm_provider
+
+# Codici HTTP degli errori transitori (quota esaurita, errori del server)
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Eccezioni di google.api_core equivalenti, riconosciute per nome
+RETRYABLE_ERROR_NAMES = (
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "BadGateway", "GatewayTimeout",
+)
+
+LLM_GATEWAY_CALLS = registry.counter(
+    "erasmus_llm_gateway_total",
+    "Esiti delle chiamate al gateway LLM (ok, retry, timeout, error, circuit_open, deadline)",
+    ("purpose", "outcome")
+)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Il modello non è raggiungibile: circuito aperto, deadline esaurita o errori transitori ripetuti."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True per gli errori transitori: timeout, quota esaurita (429) ed errori 5xx."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if getattr(error, "code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+class CircuitBreaker:
+    """Circuit breaker a tre stati (closed, open, half_open).
+
+    Attributes:
+        failure_threshold: Fallimenti consecutivi che aprono il circuito
+        reset_seconds: Durata dell'apertura prima della chiamata di prova
+        state: Stato corrente
+        opened: Numero di aperture del circuito
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True se la chiamata può partire (nello stato half_open passa una sola prova)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (
+                self.state == "closed" and self.failure_threshold and self.failures >= self.failure_threshold
+            ):
+                if self.state != "open":
+                    self.opened += 1
+                    print(f"🚫 Circuito LLM aperto dopo {self.failures} errori consecutivi")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Libera la prova in corso senza esito (es. errore non transitorio o annullamento)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class LLMGateway:
+    """Punto unico delle chiamate al provider LLM configurato.
+
+    Attributes:
+        max_concurrency: Chiamate contemporanee in totale
+        purpose_concurrency: Chiamate contemporanee per scopo
+        timeout_seconds: Timeout di un singolo tentativo
+        deadline_seconds: Tempo massimo di una chiamata (coda, tentativi e pause)
+        max_retries: Tentativi aggiuntivi dopo un errore transitorio
+        backoff_base: Pausa prima del primo retry (raddoppia ad ogni tentativo)
+        backoff_max: Pausa massima tra due tentativi
+        breaker: Circuit breaker condiviso
+    """
+
+    def __init__(self, max_concurrency: int, purpose_concurrency: int, timeout_seconds: float,
+                 deadline_seconds: float, max_retries: int, backoff_base: float, backoff_max: float,
+                 breaker: CircuitBreaker):
+        self.max_concurrency = max_concurrency
+        self.purpose_concurrency = purpose_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+        # Semafori (globale e per scopo) di ciascun event loop, creati al primo uso: un
+        # asyncio.Semaphore resta legato al loop in cui è stato usato la prima volta
+        self._loop_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, Dict[str, asyncio.Semaphore]]]" = \
+            weakref.WeakKeyDictionary()
+        self._random = random.Random()
+
+        self.in_flight = 0
+        self.waiting = 0
+
+    def _semaphores(self, purpose: str) -> tuple:
+        """Semafori per scopo e globale dell'event loop corrente."""
+        loop = asyncio.get_running_loop()
+        entry = self._loop_semaphores.get(loop)
+        if entry is None:
+            entry = self._loop_semaphores[loop] = (asyncio.Semaphore(max(1, self.max_concurrency)), {})
+        global_semaphore, purposes = entry
+        if purpose not in purposes:
+            purposes[purpose] = asyncio.Semaphore(max(1, self.purpose_concurrency))
+        return purposes[purpose], global_semaphore
+
+    def _deadline(self, deadline: Optional[float]) -> float:
+        return deadline if deadline is not None else time.monotonic() + self.deadline_seconds
+
+    def _check_circuit(self, purpose: str) -> None:
+        if not self.breaker.allow():
+            LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="circuit_open")
+            raise LLMUnavailableError("Servizio LLM temporaneamente non disponibile (circuito aperto)")
+
+    async def _acquire(self, purpose: str, deadline: float) -> tuple:
+        """Acquisisce i semafori di scopo e globale entro la deadline."""
+        acquired = []
+        self.waiting += 1
+        try:
+            for semaphore in self._semaphores(purpose):
+                remaining = deadline - time.monotonic()
+                await asyncio.wait_for(semaphore.acquire(), timeout=max(0.0, remaining))
+                acquired.append(semaphore)
+        except BaseException as e:
+            for held in acquired:
+                held.release()
+            self.breaker.release_probe()
+            if isinstance(e, asyncio.TimeoutError):
+                LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="deadline")
+                raise LLMUnavailableError("Deadline esaurita in attesa di un posto libero per la chiamata LLM") from e
+            raise
+        finally:
+            self.waiting -= 1
+        return tuple(acquired)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Jitter: le richieste fallite insieme non riprovano tutte nello stesso istante
+        return delay * self._random.uniform(0.5, 1.0)
+
+    async def _retry_or_raise(self, purpose: str, error: BaseException, attempt: int, deadline: float) -> None:
+        """Registra un errore; attende il backoff se è possibile un altro tentativo, altrimenti solleva."""
+        if not is_retryable(error):
+            self.breaker.release_probe()
+            LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="error")
+            raise error
+
+        self.breaker.record_failure()
+        outcome = "timeout" if isinstance(error, asyncio.TimeoutError) else "transient_error"
+        delay = self._backoff(attempt)
+        if attempt >= self.max_retries or self.breaker.state == "open" \
+                or time.monotonic() + delay >= deadline:
+            LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome=outcome)
+            raise LLMUnavailableError(f"Servizio LLM non disponibile: {error!r}") from error
+
+        LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="retry")
+        print(f"⚠️ Chiamata LLM '{purpose}' fallita ({error!r}), nuovo tentativo tra {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def generate(self, prompt: str, model: str, purpose: Optional[str] = None,
+                       deadline: Optional[float] = None) -> str:
+        """
+        Genera la risposta completa al prompt rispettando limiti, timeout e circuit breaker.
+
+        Args:
+            prompt: Prompt da inviare
+            model: Nome del modello
+            purpose: Scopo della chiamata (semaforo dedicato ed etichetta delle metriche)
+            deadline: Istante limite (time.monotonic()); default ora + LLM_DEADLINE_SECONDS
+
+        Raises:
+            LLMUnavailableError: Circuito aperto, deadline esaurita o errori transitori ripetuti
+        """
+        purpose = purpose or "other"
+        deadline = self._deadline(deadline)
+        self._check_circuit(purpose)
+        semaphores = await self._acquire(purpose, deadline)
+        self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                timeout = min(self.timeout_seconds, deadline - time.monotonic())
+                try:
+                    text = await asyncio.wait_for(
+                        get_llm_provider().generate(prompt, model, purpose=purpose), timeout=max(0.0, timeout)
+                    )
+                except asyncio.CancelledError:
+                    self.breaker.release_probe()
+                    raise
+                except Exception as e:
+                    await self._retry_or_raise(purpose, e, attempt, deadline)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="ok")
+                return text
+        finally:
+            self.in_flight -= 1
+            for semaphore in semaphores:
+                semaphore.release()
+
+    async def stream(self, prompt: str, model: str, purpose: Optional[str] = None,
+                     deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Variante in streaming di generate().
+
+        Il timeout del tentativo vale per il primo chunk; i chunk successivi devono
+        arrivare entro la deadline. Si riprova solo se il modello non ha ancora
+        prodotto testo (i chunk già inoltrati non possono essere ritirati).
+
+        Raises:
+            LLMUnavailableError: Circuito aperto, deadline esaurita o errori transitori ripetuti
+        """
+        purpose = purpose or "other"
+        deadline = self._deadline(deadline)
+        self._check_circuit(purpose)
+        semaphores = await self._acquire(purpose, deadline)
+        self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                chunks = get_llm_provider().stream(prompt, model, purpose=purpose)
+                started = False
+                try:
+                    while True:
+                        if started:
+                            timeout = deadline - time.monotonic()
+                        else:
+                            timeout = min(self.timeout_seconds, deadline - time.monotonic())
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0.0, timeout))
+                        except StopAsyncIteration:
+                            break
+                        started = True
+                        yield chunk
+                except (asyncio.CancelledError, GeneratorExit):
+                    self.breaker.release_probe()
+                    raise
+                except Exception as e:
+                    if started:
+                        if is_retryable(e):
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.release_probe()
+                        LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="error")
+                        raise
+                    await self._retry_or_raise(purpose, e, attempt, deadline)
+                    attempt += 1
+                    continue
+                finally:
+                    await chunks.aclose()
+                self.breaker.record_success()
+                LLM_GATEWAY_CALLS.inc(purpose=purpose, outcome="ok")
+                return
+        finally:
+            self.in_flight -= 1
+            for semaphore in semaphores:
+                semaphore.release()
+
+    def stats(self) -> dict:
+        """Stato del circuito e chiamate in corso, per /metrics e l'endpoint di debug."""
+        return {
+            "circuit_open": self.breaker.state != "closed",
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "consecutive_failures": self.breaker.failures,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+        }
+
+
+# Gateway condiviso, configurato dalle impostazioni LLM_*
+llm_gateway = LLMGateway(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    purpose_concurrency=settings.LLM_PURPOSE_MAX_CONCURRENCY,
+    timeout_seconds=settings.LLM_TIMEOUT_SECONDS,
+    deadline_seconds=settings.LLM_DEADLINE_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+    breaker=CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS),
+)
@@ -0,0 +1,319 @@
+"""Provider dei modelli generativi usati dal servizio RAG.
+
+Tutte le generazioni (riassunto del bando, destinazioni, descrizioni, analisi degli
+esami) passano dal gateway (llm_gateway.py: concorrenza, timeout, retry, circuit
+breaker), che usa il provider di get_llm_provider(), scelto con LLM_PROVIDER:
+1. "gemini": Google Gemini tramite google.generativeai (richiede GOOGLE_API_KEY)
+2. "fake": provider locale senza rete che restituisce risposte valide per gli schemi
+   dell'API, con latenza e velocità di generazione configurabili; serve per load test
+   e misure di latenza senza una chiave e senza consumare quota
+
+Ogni chiamata indica lo scopo ("purpose"), usato dal provider fake per scegliere
+il formato della risposta e come etichetta delle metriche (durata nella fase
+"llm.<purpose>", chiamate e token stimati). model_id() distingue i modelli nella
+cache LLM, così le risposte finte non vengono mai servite come risposte reali.
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from ..core.config import settings
+from ..core.metrics import span, record_llm_call, estimate_tokens
+
+# Scopi delle generazioni
+PURPOSE_CALL_SUMMARY = "call_summary"
+PURPOSE_CALL_SECTION = "call_section"
+PURPOSE_DESTINATIONS = "destinations"
+PURPOSE_DESTINATION_DESCRIPTIONS = "destination_descriptions"
+PURPOSE_EXAMS_COMPATIBILITY = "exams_compatibility"
+
+
+class LLMProvider(ABC):
+    """Interfaccia comune dei provider.
+
+    Le sottoclassi implementano _generate e _stream; generate e stream aggiungono
+    le metriche di durata, esito e token.
+
+    Attributes:
+        name: Nome del provider (valore di LLM_PROVIDER)
+    """
+
+    name = ""
+
+    def model_id(self, model: str) -> str:
+        """Identificativo del modello usato nella chiave della cache LLM."""
+        return model
+
+    async def generate(self, prompt: str, model: str, purpose: Optional[str] = None) -> str:
+        """Genera la risposta completa al prompt."""
+        text = ""
+        try:
+            with span(f"llm.{purpose or 'other'}"):
+                text = await self._generate(prompt, model, purpose)
+        except Exception:
+            record_llm_call(self.name, purpose, prompt, text, "error")
+            raise
+        record_llm_call(self.name, purpose, prompt, text, "ok")
+        return text
+
+    async def stream(self, prompt: str, model: str, purpose: Optional[str] = None) -> AsyncIterator[str]:
+        """Genera la risposta a pezzi, man mano che il modello la produce."""
+        text = ""
+        try:
+            with span(f"llm.{purpose or 'other'}"):
+                async for chunk in self._stream(prompt, model, purpose):
+                    text += chunk
+                    yield chunk
+        except Exception:
+            record_llm_call(self.name, purpose, prompt, text, "error")
+            raise
+        record_llm_call(self.name, purpose, prompt, text, "ok")
+
+    @abstractmethod
+    async def _generate(self, prompt: str, model: str, purpose: Optional[str]) -> str:
+        """Chiamata al modello che restituisce la risposta completa."""
+
+    @abstractmethod
+    def _stream(self, prompt: str, model: str, purpose: Optional[str]) -> AsyncIterator[str]:
+        """Chiamata al modello in streaming (generatore async dei pezzi della risposta)."""
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini (google.generativeai)."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str]):
+        import google.generativeai as genai
+
+        self._genai = genai
+        # Un client per modello, riusato da tutte le chiamate
+        self._models: Dict[str, object] = {}
+        # Configura la libreria con la chiave API caricata da .env
+        try:
+            if not api_key:
+                raise ValueError("GOOGLE_API_KEY non è impostato nel file .env o non è stato caricato.")
+            genai.configure(api_key=api_key)
+        except Exception as e:
+            print(f"ATTENZIONE: Errore durante la configurazione di Google AI: {e}")
+
+    def _model(self, model: str):
+        client = self._models.get(model)
+        if client is None:
+            client = self._models.setdefault(model, self._genai.GenerativeModel(model))
+        return client
+
+    async def _generate(self, prompt: str, model: str, purpose: Optional[str]) -> str:
+        response = await self._model(model).generate_content_async(prompt)
+        return response.text
+
+    async def _stream(self, prompt: str, model: str, purpose: Optional[str]) -> AsyncIterator[str]:
+        response = await self._model(model).generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk senza testo (es. solo metadati o finish_reason)
+                continue
+            if text:
+                yield text
+
+
+# --- Risposte del provider fake, per scopo ---
+
+def _fake_call_summary(prompt: str) -> str:
+    return (
+        "## Riassunto del bando (risposta simulata)\n\n"
+        "- **Periodo di apertura:** dal 1 febbraio al 15 marzo\n"
+        "- **Requisiti:** iscrizione regolare e conoscenza della lingua del paese ospitante (livello B1/B2)\n"
+        "- **Scadenze:** candidatura online entro il 15 marzo, graduatorie ad aprile\n"
+        "- **Candidatura:** compilazione del modulo online e caricamento del Learning Agreement\n"
+        "- **CFU minimi:** 12 CFU per semestre\n"
+    )
+
+
+def _fake_call_section(prompt: str) -> str:
+    return (
+        "- Candidatura online entro il 15 marzo (risposta simulata)\n"
+        "- Requisito linguistico: livello B1\n"
+    )
+
+
+def _fake_destinations(prompt: str) -> str:
+    return json.dumps([
+        {
+            "name": "UNIVERSITÄT TEST", "codice_europeo": "D TEST01", "nome_istituzione": "UNIVERSITÄT TEST",
+            "codice_area": "0613", "posti": "2", "durata_per_posto": "5", "livello": "U",
+            "dettagli_livello": "", "requisiti_linguistici": "German B1",
+            "description": "Università simulata per i test di carico.",
+        },
+        {
+            "name": "UNIVERSIDAD DE PRUEBA", "codice_europeo": "E PRUEBA01", "nome_istituzione": "UNIVERSIDAD DE PRUEBA",
+            "codice_area": "0613", "posti": "1", "durata_per_posto": "10", "livello": "U,P",
+            "dettagli_livello": "", "requisiti_linguistici": "Spanish B2",
+            "description": "Seconda destinazione simulata per i test di carico.",
+        },
+    ], ensure_ascii=False)
+
+
+def _fake_destination_descriptions(prompt: str) -> str:
+    # Le università sono elencate come "- NOME" dopo l'intestazione del prompt
+    section = prompt.split("--- UNIVERSITÀ ---", 1)[-1]
+    names = re.findall(r"^\s*-\s+(.+?)\s*$", section, re.MULTILINE)
+    return json.dumps(
+        {name: f"{name.title()}: destinazione simulata per i test di carico." for name in names},
+        ensure_ascii=False
+    )
+
+
+def _fake_exams_compatibility(prompt: str) -> str:
+    return json.dumps({
+        "matched_exams": [
+            {
+                "student_exam": "Algoritmi e Strutture Dati", "destination_course": "Algorithms and Data Structures",
+                "compatibility": "alta", "credits_student": "6 CFU", "credits_destination": "6 ECTS",
+                "notes": "Corrispondenza simulata",
+            }
+        ],
+        "suggested_exams": [
+            {
+                "course_name": "Machine Learning", "credits": "6 ECTS",
+                "reason": "Suggerimento simulato", "category": "Computer Science",
+            }
+        ],
+        "compatibility_score": 75.0,
+        "analysis_summary": "Analisi simulata generata dal provider locale.",
+    }, ensure_ascii=False)
+
+
+FAKE_RESPONDERS: Dict[str, Callable[[str], str]] = {
+    PURPOSE_CALL_SUMMARY: _fake_call_summary,
+    PURPOSE_CALL_SECTION: _fake_call_section,
+    PURPOSE_DESTINATIONS: _fake_destinations,
+    PURPOSE_DESTINATION_DESCRIPTIONS: _fake_destination_descriptions,
+    PURPOSE_EXAMS_COMPATIBILITY: _fake_exams_compatibility,
+}
+
+
+class FakeLLMProvider(LLMProvider):
+    """Provider locale che simula la latenza di un modello remoto.
+
+    Il tempo di una risposta è: latenza iniziale (time to first token, estratta dalla
+    distribuzione configurata) + token del prompt / token letti al secondo
+    + numero di token generati / token al secondo.
+
+    Attributes:
+        latency_ms: Latenza iniziale media in millisecondi
+        latency_jitter_ms: Deviazione standard della latenza iniziale
+        distribution: "fixed", "normal" o "lognormal"
+        tokens_per_second: Velocità di generazione (0 = istantanea)
+        prompt_tokens_per_second: Velocità di lettura del prompt (0 = istantanea)
+        calls: Numero di generazioni servite
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float, latency_jitter_ms: float, distribution: str,
+                 tokens_per_second: float, seed: Optional[int] = None,
+                 prompt_tokens_per_second: float = 0.0):
+        if distribution not in ("fixed", "normal", "lognormal"):
+            raise ValueError(f"Distribuzione '{distribution}' non supportata (fixed, normal, lognormal)")
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.distribution = distribution
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def model_id(self, model: str) -> str:
+        return f"fake:{model}"
+
+    def _first_token_delay(self, prompt: str) -> float:
+        """Latenza iniziale in secondi, compresa la lettura del prompt."""
+        prefill = 0.0
+        if self.prompt_tokens_per_second > 0:
+            prefill = estimate_tokens(prompt) / self.prompt_tokens_per_second
+        mean, jitter = self.latency_ms, self.latency_jitter_ms
+        if self.distribution == "fixed" or jitter <= 0 or mean <= 0:
+            delay = mean
+        elif self.distribution == "normal":
+            delay = self._random.gauss(mean, jitter)
+        else:
+            # Lognormale con media e deviazione standard indicate (coda lunga come le API reali)
+            sigma2 = math.log(1 + (jitter / mean) ** 2)
+            delay = self._random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        return max(0.0, delay) / 1000 + prefill
+
+    def _respond(self, prompt: str, purpose: Optional[str]) -> str:
+        self.calls += 1
+        responder = FAKE_RESPONDERS.get(purpose)
+        if responder is None:
+            return "Risposta simulata dal provider locale."
+        return responder(prompt)
+
+    @staticmethod
+    def _tokens(text: str) -> list:
+        """Divide il testo in "token" (parole con lo spazio che le segue)."""
+        return re.findall(r"\S+\s*|\s+", text)
+
+    async def _generate(self, prompt: str, model: str, purpose: Optional[str]) -> str:
+        text = self._respond(prompt, purpose)
+        delay = self._first_token_delay(prompt)
+        if self.tokens_per_second > 0:
+            delay += len(self._tokens(text)) / self.tokens_per_second
+        await asyncio.sleep(delay)
+        return text
+
+    async def _stream(self, prompt: str, model: str, purpose: Optional[str]) -> AsyncIterator[str]:
+        text = self._respond(prompt, purpose)
+        await asyncio.sleep(self._first_token_delay(prompt))
+        tokens = self._tokens(text)
+        # Chunk da ~8 token, come i chunk in streaming di Gemini
+        for i in range(0, len(tokens), 8):
+            chunk = tokens[i:i + 8]
+            if i and self.tokens_per_second > 0:
+                await asyncio.sleep(len(chunk) / self.tokens_per_second)
+            yield "".join(chunk)
+
+
+def create_llm_provider() -> LLMProvider:
+    """Crea il provider configurato in LLM_PROVIDER.
+
+    Raises:
+        ValueError: Se il provider non è supportato
+    """
+    if settings.LLM_PROVIDER == "gemini":
+        return GeminiProvider(settings.GOOGLE_API_KEY)
+    if settings.LLM_PROVIDER == "fake":
+        return FakeLLMProvider(
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_jitter_ms=settings.FAKE_LLM_LATENCY_JITTER_MS,
+            distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            seed=settings.FAKE_LLM_SEED,
+            prompt_tokens_per_second=settings.FAKE_LLM_PROMPT_TOKENS_PER_SECOND,
+        )
+    raise ValueError(f"LLM_PROVIDER '{settings.LLM_PROVIDER}' non supportato (gemini, fake)")
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """Provider condiviso, creato al primo uso."""
+    global _provider
+    if _provider is None:
+        _provider = create_llm_provider()
+    return _provider
+
+
+def set_llm_provider(provider: LLMProvider) -> None:
+    """Sostituisce il provider condiviso (script di benchmark e load test)."""
+    global _provider
+    _provider = provider
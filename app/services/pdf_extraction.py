@@ -0,0 +1,233 @@
+"""Motori di estrazione del testo dai PDF.
+
+Due backend con la stessa interfaccia (testo per pagina):
+1. PyMuPDF (fitz): molto più veloce, usato per il testo semplice (bandi, corsi, piani di studio)
+2. pdfplumber: più lento ma con estrazione delle tabelle, usato per i PDF delle destinazioni
+   (le righe " | " sono l'input del parser deterministico delle destinazioni)
+
+Il motore viene scelto in base al tipo di documento (engine_for). Sui PDF lunghi
+le pagine vengono divise in intervalli ed estratte in parallelo da un pool di processi;
+l'output è sempre nell'ordine delle pagine.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+import fitz  # PyMuPDF
+import pdfplumber
+
+from ..core.config import settings
+from ..core.metrics import span
+
+
+# --- Estrazione di un intervallo di pagine (eseguita anche nei processi del pool) ---
+
+def _pymupdf_text_pages(pdf_path: str, start: int, end: int) -> List[str]:
+    with fitz.open(pdf_path) as doc:
+        return [doc[i].get_text("text") or "" for i in range(start, end)]
+
+
+def _pdfplumber_text_pages(pdf_path: str, start: int, end: int) -> List[str]:
+    with pdfplumber.open(pdf_path) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _pdfplumber_tables_and_text_pages(pdf_path: str, start: int, end: int) -> List[str]:
+    """Per ogni pagina: righe delle tabelle (celle separate da " | ") seguite dal testo normale."""
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for i in range(start, end):
+            page = pdf.pages[i]
+            page_text = ""
+
+            # Estrai tabelle strutturate
+            for table in page.extract_tables():
+                for row in table:
+                    cleaned_row = [
+                        cell.replace('\n', ' ').strip() if cell is not None else ""
+                        for cell in row
+                    ]
+                    page_text += " | ".join(cleaned_row) + "\n"
+
+            # Estrai anche testo normale (non in tabelle)
+            text = page.extract_text()
+            if text:
+                page_text += text + "\n"
+            pages.append(page_text)
+    return pages
+
+
+def _page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+class PdfExtractionEngine:
+    """Motore di estrazione: nome, versione (per la cache) e funzioni per intervallo di pagine.
+
+    Attributes:
+        name: Nome del motore, usato nella chiave della cache di estrazione
+        version: Versione della libreria sottostante, anch'essa nella chiave della cache
+        text_pages: Funzione (pdf_path, start, end) -> testo di ogni pagina
+        tables_pages: Come text_pages ma con le tabelle in righe " | " (None se non supportato)
+    """
+
+    def __init__(self, name: str, version: str, text_pages: Callable, tables_pages: Optional[Callable] = None):
+        self.name = name
+        self.version = version
+        self.text_pages = text_pages
+        self.tables_pages = tables_pages
+
+    @property
+    def supports_tables(self) -> bool:
+        return self.tables_pages is not None
+
+    @property
+    def cache_key(self) -> str:
+        """Nome e versione del motore: aggiornare la libreria non riusa testo estratto da quella vecchia."""
+        return f"{self.name}:{self.version}"
+
+
+ENGINES = {
+    "pymupdf": PdfExtractionEngine("pymupdf", fitz.VersionBind, _pymupdf_text_pages),
+    "pdfplumber": PdfExtractionEngine(
+        "pdfplumber", pdfplumber.__version__, _pdfplumber_text_pages, _pdfplumber_tables_and_text_pages
+    ),
+}
+
+# Motore predefinito per tipo di documento (testo semplice)
+DEFAULT_TEXT_ENGINE = "pymupdf"
+TABLES_ENGINE = "pdfplumber"
+
+
+def get_engine(name: str) -> PdfExtractionEngine:
+    """Restituisce un motore per nome.
+
+    Raises:
+        ValueError: Se il motore non esiste
+    """
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Motore di estrazione '{name}' non supportato (disponibili: {', '.join(ENGINES)})")
+
+
+def engine_for(document_type: Optional[str] = None, tables: bool = False) -> PdfExtractionEngine:
+    """
+    Sceglie il motore per un tipo di documento.
+
+    Le tabelle (PDF delle destinazioni) richiedono pdfplumber; per il testo semplice
+    si usa PDF_TEXT_ENGINE se impostato, altrimenti PyMuPDF.
+    """
+    if tables or document_type == 'destinazioni':
+        return get_engine(TABLES_ENGINE)
+    configured = settings.PDF_TEXT_ENGINE
+    return get_engine(DEFAULT_TEXT_ENGINE if configured == "auto" else configured)
+
+
+# --- Parallelismo per pagine ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _workers() -> int:
+    return settings.PDF_EXTRACTION_WORKERS or max(1, (os.cpu_count() or 1) - 1)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Pool di processi condiviso, creato al primo PDF abbastanza lungo.
+
+    I processi sono avviati con "spawn": il server è multi-thread (pool di thread, client
+    Chroma) e un fork ne copierebbe i lock in uno stato incoerente.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Chiude il pool di processi (se creato); chiamata alla chiusura dell'app."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def extract_pages(pdf_path: str, page_fn: Callable, parallel: Optional[bool] = None) -> List[str]:
+    """
+    Esegue page_fn su tutte le pagine, in parallelo per intervalli se il PDF è lungo.
+
+    Args:
+        pdf_path: Percorso del PDF
+        page_fn: Funzione (pdf_path, start, end) -> lista di testi per pagina
+        parallel: Forza (True) o disattiva (False) il parallelismo; None = automatico
+
+    Returns:
+        Testo di ogni pagina, nell'ordine del documento
+    """
+    n_pages = _page_count(pdf_path)
+    workers = _workers()
+    if parallel is None:
+        parallel = workers > 1 and n_pages >= settings.PDF_PARALLEL_MIN_PAGES
+    if not parallel or n_pages < 2:
+        return page_fn(pdf_path, 0, n_pages)
+
+    # Intervalli contigui di pagine, uno per worker
+    step = -(-n_pages // workers)
+    ranges = [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+    pool = _get_pool()
+    futures = [pool.submit(page_fn, pdf_path, start, end) for start, end in ranges]
+
+    pages: List[str] = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def extract_text(pdf_path: str, engine: Optional[PdfExtractionEngine] = None,
+                 parallel: Optional[bool] = None) -> str:
+    """
+    Estrae il testo semplice di tutte le pagine.
+
+    Raises:
+        ValueError: Se il PDF è vuoto o non leggibile
+    """
+    engine = engine or engine_for()
+    try:
+        with span(f"pdf.{engine.name}.text"):
+            pages = extract_pages(pdf_path, engine.text_pages, parallel)
+    except Exception as e:
+        raise ValueError(f"Errore nell'estrazione del testo dal PDF '{pdf_path}': {e}")
+
+    text = "\n".join(p.strip("\n") for p in pages if p and p.strip())
+    if not text.strip():
+        raise ValueError(f"Il PDF '{pdf_path}' è vuoto o non è stato possibile estrarre il testo.")
+    return text.strip()
+
+
+def extract_tables_and_text(pdf_path: str, engine: Optional[PdfExtractionEngine] = None,
+                            parallel: Optional[bool] = None) -> str:
+    """
+    Estrae per ogni pagina le tabelle (righe " | ") seguite dal testo normale.
+
+    Raises:
+        ValueError: Se il PDF è vuoto, non leggibile o il motore non supporta le tabelle
+    """
+    engine = engine or engine_for(tables=True)
+    if not engine.supports_tables:
+        raise ValueError(f"Il motore '{engine.name}' non supporta l'estrazione delle tabelle")
+
+    with span(f"pdf.{engine.name}.tables"):
+        full_text = "".join(extract_pages(pdf_path, engine.tables_pages, parallel))
+    if not full_text.strip():
+        raise ValueError("Il PDF è vuoto o non è stato possibile estrarre il testo.")
+    return full_text
@@ -1,16 +1,40 @@
 # app/services/rag_service.py
 import os
 import json
-import google.generativeai as genai
-import fitz  # PyMuPDF
-import pdfplumber
 import re
 import markdown
 from pathlib import Path
 
-from .vector_db_service import get_retriever
+from .vector_db_service import get_retriever, vector_store_service
+from .extraction_cache import extraction_cache
+from . import pdf_extraction
+from .llm_cache import llm_cache, prompt_hash
+from .llm_gateway import llm_gateway, LLMUnavailableError
+from .llm_provider import (
+    get_llm_provider, PURPOSE_CALL_SUMMARY, PURPOSE_DESTINATIONS,
+    PURPOSE_DESTINATION_DESCRIPTIONS, PURPOSE_EXAMS_COMPATIBILITY
+)
+from .destinations_service import (
+    query_destinations_for_department, rows_to_destinations,
+    get_department_names, get_department_section
+)
+from . import department_index
+from .call_summarizer import condense_call_text, SECTION_PROMPT as CALL_SECTION_PROMPT
+from .destinations_parser import parse_destinations_table
+from .exams_context import (
+    COURSE_DOCUMENT_TYPES, extract_study_plan_exams, pack_course_chunks,
+    truncate_to_budget, search_course_chunks, record_context, describe_context
+)
 from ..core.config import settings
+from ..core.executors import run_blocking
+from ..core.metrics import span, timed, estimate_tokens
+from ..core.singleflight import singleflight, singleflight_stream
 
+# Versioni degli estrattori: incrementarle quando cambia l'output per invalidare la cache
+TEXT_EXTRACTOR_VERSION = 1
+TABLES_AND_TEXT_EXTRACTOR_VERSION = 1
+
+@timed("parse_json")
 def clean_and_parse_json_response(response_text: str, expected_type: str = "array") -> any:
     """
     Utility per pulire e parsare le risposte JSON dai modelli AI.
@@ -84,6 +108,7 @@ def clean_and_parse_json_response(response_text: str, expected_type: str = "arra
     except json.JSONDecodeError as e:
         raise ValueError(f"Errore nel parsing JSON: {e}. Testo: {json_match.group(0)[:200]}...")
 
+@timed("markdown_to_html")
 def markdown_to_html(text: str) -> str:
     """
     Converte testo in formato Markdown in HTML.
@@ -110,6 +135,7 @@ def markdown_to_html(text: str) -> str:
     
     return html
 
+@timed("destinations.extract_department_section")
 def extract_department_section(full_text: str, department: str) -> str:
     """
     Estrae la sezione del/i dipartimento/i dal testo completo delle destinazioni.
@@ -118,6 +144,10 @@ def extract_department_section(full_text: str, department: str) -> str:
     - Non richiede più la presenza di "n° borse" vicino all'header
     - È più tollerante a spazi, maiuscole/minuscole e punteggiatura
 
+    Usa le stesse regole dell'indice dei dipartimenti (department_index), costruito
+    al volo sul testo fornito; per i documenti caricati usare invece
+    destinations_service.get_department_section, che legge l'indice salvato.
+
     Args:
         full_text: Testo completo delle destinazioni (con newline preservati)
         department: Testo selezionato dall'utente (anche con più dipartimenti)
@@ -128,139 +158,43 @@ def extract_department_section(full_text: str, department: str) -> str:
     Raises:
         ValueError: Se nessun dipartimento dell'input viene trovato
     """
-    # Prepara le righe e una versione normalizzata per i confronti
-    lines = full_text.split('\n')
-    def normalize(s: str) -> str:
-        s = s.lower().replace('\u2019', "'")
-        s = re.sub(r"\s+", " ", s)
-        return s.strip()
-
-    lines_norm = [normalize(l) for l in lines]
-
-    # Individua tutti gli header di dipartimento nel documento
-    header_regex = re.compile(r'\bdipartiment[oi]\b', re.IGNORECASE)
-    header_indexes = [i for i, l in enumerate(lines) if header_regex.search(l or '')]
+    text = department_index.prepare_text(full_text)
+    entries = department_index.build_department_index(text)
 
-    if not header_indexes:
+    if not entries:
         raise ValueError("Nel file non sono presenti header di dipartimento riconoscibili")
 
-    # L'input può contenere più dipartimenti concatenati: splitta per tentare ogni candidato
-    raw = normalize(department)
-    # Spezza ogni volta che ricompare "dipartimento ..."
-    parts = re.split(r'(?=\bdipartiment[oi]\s+)', raw, flags=re.IGNORECASE)
-    # Pulisci i prefissi "dipartimento (di)"
-    def strip_prefix(p: str) -> str:
-        p = re.sub(r'^dipartiment[oi]\s+di\s+', '', p.strip(), flags=re.IGNORECASE)
-        p = re.sub(r'^dipartiment[oi]\s+', '', p, flags=re.IGNORECASE)
-        return p.strip()
-
-    candidates = [strip_prefix(p) for p in parts if p.strip()]
-    # Rimuovi duplicati mantenendo l'ordine
-    seen = set()
-    candidates = [c for c in candidates if not (c in seen or seen.add(c))]
-
-    # Funzione di match: substring oppure match di parole principali
-    def find_start_index(search_core: str) -> int | None:
-        if not search_core:
-            return None
-        # Approccio 1: substring diretto
-        for idx in header_indexes:
-            if search_core in lines_norm[idx]:
-                return idx
-        # Approccio 2: tutte le parole significative presenti
-        tokens = [t for t in re.split(r'\W+', search_core) if len(t) >= 3]
-        for idx in header_indexes:
-            line = lines_norm[idx]
-            if all(tok in line for tok in tokens[: min(3, len(tokens))]):
-                return idx
-        return None
+    entry = department_index.match_department(entries, department)
+    if entry is None:
+        raise ValueError(f"Dipartimento '{department}' non trovato nel file delle destinazioni")
 
-    # Tenta i candidati in ordine; alla prima sezione valida, restituisci
-    for cand in candidates:
-        search_core = normalize(cand)
-        start_idx = find_start_index(search_core)
-        if start_idx is None:
-            continue
-
-        # Trova il prossimo header successivo come fine sezione
-        next_headers = [i for i in header_indexes if i > start_idx]
-        end_idx = next_headers[0] if next_headers else len(lines)
-
-        section = '\n'.join(lines[start_idx:end_idx]).strip()
-        if section:
-            print(f"✅ Header dipartimento trovato: '{lines[start_idx].strip()[:120]}' (linea {start_idx})")
-            print(f"✅ Estratta sezione per '{cand}': {len(section)} caratteri")
-            return section
-
-    # Se arrivi qui, nessun candidato è stato trovato
-    raise ValueError(f"Dipartimento '{department}' non trovato nel file delle destinazioni")
-
-# --- CONFIGURAZIONE DI GOOGLE AI ---
-# Questa parte viene eseguita una sola volta quando il servizio viene importato.
-# Configura la libreria con la chiave API caricata da .env
-try:
-    if not settings.GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY non è impostato nel file .env o non è stato caricato.")
-    genai.configure(api_key=settings.GOOGLE_API_KEY)
-except Exception as e:
-    print(f"ATTENZIONE: Errore durante la configurazione di Google AI: {e}")
-    pass
+    section = department_index.slice_section(text, entry)
+    print(f"✅ Estratta sezione per '{department}': {len(section)} caratteri (linea {entry['start_line']})")
+    return section
 
-async def get_call_summary(university_name: str) -> dict:
-    """
-    Identifica il bando dal database, recupera i dati e genera un riassunto
-    utilizzando il Google AI Python SDK (genai).
-    """
-    try:
-        from ..core.database import db_manager
-        
-        # --- 1. RECUPERA IL BANDO DAL DATABASE ---
-        active_calls = db_manager.get_all_active_calls()
-        
-        # Cerca il bando per l'università specificata
-        target_call = None
-        for call in active_calls:
-            if call.get('university_name', '').lower() == university_name.lower():
-                target_call = call
-                break
-        
-        if not target_call:
-            return {"has_program": False, "summary": f"Nessun bando trovato per '{university_name}'."}
-        
-        target_filename = target_call.get('stored_filename')
-        file_path = target_call.get('file_path')
+# --- MODELLO GENERATIVO ---
+# Le chiamate passano dal provider configurato in LLM_PROVIDER (Gemini o locale, vedi llm_provider)
+GENERATION_MODEL = "gemini-2.0-flash"
 
-        # --- 2. ESTRAI IL TESTO DAL PDF ---
-        if not os.path.exists(file_path):
-            return {"has_program": False, "summary": f"File del bando non trovato: {file_path}"}
-        
-        # Estrai tutto il testo dal PDF
-        call_text = extract_text_from_pdf(file_path)
-        
-        # --- 3. RECUPERA I CHUNK SOLO DA QUEL FILE (se il vector DB è configurato) ---
-        # Prova a usare il vector DB, altrimenti usa il testo completo
-        try:
-            K_VALUE = 5
-            retriever = get_retriever(settings.DB_PATH, category='calls', top_k=K_VALUE)
-            retriever.search_kwargs = {'filter': {'source': target_filename}}
-            query = "riassunto completo del bando erasmus: requisiti, scadenze e procedura"
-            docs = retriever.get_relevant_documents(query)
-        except Exception as e:
-            print(f"⚠️ Vector DB non disponibile, uso testo completo: {e}")
-            docs = None
-        
-        # --- 4. PREPARA IL CONTESTO PER GEMINI ---
-        if docs and len(docs) > 0:
-            # Usa i chunk dal vector DB se disponibili
-            full_context = "\n\n---\n\n".join([doc.page_content for doc in docs])
-        else:
-            # Altrimenti usa il testo completo (troncato se troppo lungo)
-            max_chars = 30000  # Limite per evitare token overflow
-            full_context = call_text[:max_chars]
-            if len(call_text) > max_chars:
-                full_context += "\n\n[... testo troncato ...]"
-        
-        template = f"""
+# --- PROMPT DEL RIASSUNTO DEL BANDO (STEP 1) ---
+# Modello, query di retrieval e template fanno parte della chiave della cache LLM:
+# modificarli invalida automaticamente i riassunti salvati.
+CALL_SUMMARY_MODEL = GENERATION_MODEL
+CALL_SUMMARY_CACHE_KIND = "call_summary"
+CALL_SUMMARY_QUERY = "riassunto completo del bando erasmus: requisiti, scadenze e procedura"
+CALL_SUMMARY_TOP_K = 5
+# Retrieval ibrido: una query per ogni punto richiesto dal prompt, così ogni sezione
+# del bando (scadenze, requisiti linguistici, CFU...) contribuisce con i propri chunk
+CALL_SUMMARY_QUERIES = [
+    "apertura del bando e periodo di mobilità",
+    "requisiti di ammissione e requisiti linguistici, certificazione della lingua",
+    "scadenza per la presentazione della domanda",
+    "procedura di candidatura e domanda online",
+    "numero minimo di CFU crediti da conseguire all'estero",
+]
+CALL_SUMMARY_HYBRID_TOP_K = 8
+CALL_SUMMARY_MAX_CHARS = 30000
+CALL_SUMMARY_PROMPT = """
         Sei un assistente specializzato in programmi Erasmus. 
         Analizza il seguente testo estratto da un bando Erasmus e creane un riassunto conciso 
         evidenziando:
@@ -273,20 +207,170 @@ async def get_call_summary(university_name: str) -> dict:
         Contesto estratto dal bando:
         {full_context}
         """
+CALL_SUMMARY_PROMPT_HASH = prompt_hash(
+    f"{CALL_SUMMARY_PROMPT}|{CALL_SUMMARY_QUERY}|{CALL_SUMMARY_TOP_K}|{CALL_SUMMARY_MAX_CHARS}"
+    + (f"|hybrid|{CALL_SUMMARY_QUERIES}|{CALL_SUMMARY_HYBRID_TOP_K}" if settings.CALL_RETRIEVAL_MODE == "hybrid" else "")
+    + (f"|map_reduce|{CALL_SECTION_PROMPT}|{settings.CALL_SUMMARY_SECTION_CHARS}"
+       if settings.CALL_SUMMARY_LONG_MODE == "map_reduce" else "")
+)
 
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = await model.generate_content_async(template)
-        summary_text = response.text
+async def _prepare_call_summary(university_name: str) -> dict:
+    """
+    Passi comuni a get_call_summary e stream_call_summary: recupera il bando attivo,
+    controlla la cache LLM e, se serve una generazione, costruisce il prompt.
+    Le operazioni bloccanti (SQLite, estrazione PDF, Chroma) girano nei pool dedicati.
 
-        # Costruisci un link pubblico al PDF del bando per gli studenti
-        call_pdf_url = f"/api/students/files/calls/{target_filename}"
+    Returns:
+        Dizionario con "result" (risposta finale: bando mancante o riassunto in cache)
+        oppure con "template", "target_call", "content_hash" e "link_html"
+    """
+    from ..core.database import db_manager
+
+    # --- 1. RECUPERA IL BANDO DAL DATABASE ---
+    active_calls = await run_blocking("db", db_manager.get_all_active_calls)
+
+    # Cerca il bando per l'università specificata
+    target_call = None
+    for call in active_calls:
+        if call.get('university_name', '').lower() == university_name.lower():
+            target_call = call
+            break
+
+    if not target_call:
+        return {"result": {"has_program": False, "summary": f"Nessun bando trovato per '{university_name}'."}}
+
+    target_filename = target_call.get('stored_filename')
+    file_path = target_call.get('file_path')
+
+    # --- 2. ESTRAI IL TESTO DAL PDF ---
+    if not os.path.exists(file_path):
+        return {"result": {"has_program": False, "summary": f"File del bando non trovato: {file_path}"}}
+
+    # Il riassunto dipende solo dal bando: se è già stato generato, servilo dalla cache
+    content_hash = await run_blocking("pdf", extraction_cache.file_hash, file_path)
+    if settings.LLM_CACHE_ENABLED:
+        cached_summary = await run_blocking(
+            "db", llm_cache.get, CALL_SUMMARY_CACHE_KIND, target_call['id'], content_hash,
+            get_llm_provider().model_id(CALL_SUMMARY_MODEL), CALL_SUMMARY_PROMPT_HASH
+        )
+        if cached_summary is not None:
+            print(f"⚡ Riassunto del bando servito dalla cache ({target_filename})")
+            return {"result": {"has_program": True, "summary": cached_summary}}
+
+    # Estrai tutto il testo dal PDF
+    call_text = await run_blocking("pdf", extract_text_from_pdf, file_path, document_type='erasmus_call')
+
+    # --- 3. RECUPERA I CHUNK SOLO DA QUEL FILE (se il vector DB è configurato) ---
+    # Prova a usare il vector DB, altrimenti usa il testo completo
+    def retrieve():
+        with span("vector.retrieve"):
+            if settings.CALL_RETRIEVAL_MODE == "hybrid":
+                return vector_store_service.hybrid_search(
+                    'calls', CALL_SUMMARY_QUERIES, top_k=CALL_SUMMARY_HYBRID_TOP_K,
+                    filter_metadata={'source': target_filename}
+                )
+            retriever = get_retriever(settings.DB_PATH, category='calls', top_k=CALL_SUMMARY_TOP_K)
+            retriever.search_kwargs = {'filter': {'source': target_filename}}
+            return retriever.get_relevant_documents(CALL_SUMMARY_QUERY)
+
+    try:
+        docs = await run_blocking("vector", retrieve)
+    except Exception as e:
+        print(f"⚠️ Vector DB non disponibile, uso testo completo: {e}")
+        docs = None
+
+    # --- 4. PREPARA IL CONTESTO PER GEMINI ---
+    if docs and len(docs) > 0:
+        # Usa i chunk dal vector DB se disponibili
+        full_context = "\n\n---\n\n".join([doc.page_content for doc in docs])
+    elif settings.CALL_SUMMARY_LONG_MODE == "map_reduce":
+        # Altrimenti usa il testo completo; i bandi troppo lunghi vengono riassunti per sezioni
+        try:
+            full_context = await condense_call_text(
+                call_text, CALL_SUMMARY_MODEL, max_chars=CALL_SUMMARY_MAX_CHARS,
+                section_chars=settings.CALL_SUMMARY_SECTION_CHARS,
+                concurrency=settings.CALL_SUMMARY_MAP_CONCURRENCY
+            )
+        except LLMUnavailableError as e:
+            print(f"⚠️ Riassunto per sezioni non disponibile, uso il testo troncato: {e}")
+            full_context = call_text[:CALL_SUMMARY_MAX_CHARS]
+    else:
+        # Altrimenti usa il testo completo (troncato se troppo lungo)
+        max_chars = CALL_SUMMARY_MAX_CHARS  # Limite per evitare token overflow
+        full_context = call_text[:max_chars]
+        if len(call_text) > max_chars:
+            full_context += "\n\n[... testo troncato ...]"
+
+    # Costruisci un link pubblico al PDF del bando per gli studenti
+    call_pdf_url = f"/api/students/files/calls/{target_filename}"
+    link_html = f'<p><strong>Link al bando:</strong> <a href="{call_pdf_url}" target="_blank" rel="noopener">apri il PDF ufficiale</a></p>'
+
+    return {
+        "template": CALL_SUMMARY_PROMPT.format(full_context=full_context),
+        "target_call": target_call,
+        "content_hash": content_hash,
+        "link_html": link_html,
+    }
+
+
+async def _call_summary_fallback(prepared: dict, error: Exception) -> dict:
+    """
+    Risposta dello step 1 quando l'LLM non è disponibile: l'ultimo riassunto generato
+    per il bando (anche con un prompt precedente) oppure un avviso con il link al PDF.
+    """
+    print(f"⚠️ Riassunto del bando non generato ({error}): uso il contenuto di ripiego")
+    target_call = prepared["target_call"]
+    stale_summary = await run_blocking(
+        "db", llm_cache.get_latest, CALL_SUMMARY_CACHE_KIND, target_call['id'],
+        get_llm_provider().model_id(CALL_SUMMARY_MODEL)
+    )
+    if stale_summary is not None:
+        return {"has_program": True, "summary": stale_summary}
+    notice = (
+        "<p>Il riassunto automatico del bando non è al momento disponibile. "
+        "Consulta il PDF ufficiale o riprova tra qualche minuto.</p>"
+    )
+    return {"has_program": True, "summary": notice + prepared["link_html"]}
+
+
+async def _store_call_summary(prepared: dict, summary_with_link: str) -> None:
+    """Salva nella cache LLM il riassunto completo (HTML + link) appena generato."""
+    if settings.LLM_CACHE_ENABLED:
+        target_call = prepared["target_call"]
+        await run_blocking(
+            "db", llm_cache.put, CALL_SUMMARY_CACHE_KIND, target_call['id'], prepared["content_hash"],
+            get_llm_provider().model_id(CALL_SUMMARY_MODEL), CALL_SUMMARY_PROMPT_HASH, summary_with_link, university_id=target_call.get('university_id')
+        )
+
+
+# Stessa normalizzazione del confronto con i bandi attivi in _prepare_call_summary
+@singleflight("call_summary", key=lambda university_name: university_name.lower())
+@timed("step1.call_summary")
+async def get_call_summary(university_name: str) -> dict:
+    """
+    Identifica il bando dal database, recupera i dati e genera un riassunto
+    con il provider LLM configurato (Gemini o locale).
+    Il riassunto HTML viene salvato nella cache LLM e riutilizzato finché il bando
+    resta attivo e il prompt non cambia.
+    """
+    try:
+        prepared = await _prepare_call_summary(university_name)
+        if "result" in prepared:
+            return prepared["result"]
+
+        try:
+            summary_text = await llm_gateway.generate(
+                prepared["template"], CALL_SUMMARY_MODEL, purpose=PURPOSE_CALL_SUMMARY
+            )
+        except LLMUnavailableError as e:
+            return await _call_summary_fallback(prepared, e)
 
         # Converti il Markdown in HTML per una corretta renderizzazione nel frontend
         summary_html = markdown_to_html(summary_text)
 
         # Aggiungi SEMPRE il link al sito/bando (PDF)
-        link_html = f'<p><strong>Link al bando:</strong> <a href="{call_pdf_url}" target="_blank" rel="noopener">apri il PDF ufficiale</a></p>'
-        summary_with_link = summary_html + link_html
+        summary_with_link = summary_html + prepared["link_html"]
+        await _store_call_summary(prepared, summary_with_link)
 
         return {"has_program": True, "summary": summary_with_link}
         
@@ -294,10 +378,85 @@ async def get_call_summary(university_name: str) -> dict:
         print(f"Errore in get_call_summary: {e}")
         raise e
 
+
+@singleflight_stream("call_summary_stream", key=lambda university_name: university_name.lower())
+async def stream_call_summary(university_name: str):
+    """
+    Variante in streaming di get_call_summary per l'endpoint SSE dello step 1.
+
+    Inoltra i chunk del modello man mano che arrivano: ad ogni chunk il Markdown
+    accumulato viene ri-renderizzato in HTML, così il frontend può sostituire
+    il contenuto del riquadro senza dover gestire blocchi Markdown incompleti.
+    I riassunti già in cache vengono emessi con un unico evento finale; le richieste
+    concorrenti per la stessa università condividono la stessa generazione.
+
+    Yields:
+        Dizionari {"event": "summary", "html": ...} per ogni chunk e infine
+        {"event": "done", "has_program": ..., "summary": ...} con il riassunto completo
+    """
+    prepared = await _prepare_call_summary(university_name)
+    if "result" in prepared:
+        yield {"event": "done", **prepared["result"]}
+        return
+
+    summary_text = ""
+    try:
+        async for text in llm_gateway.stream(
+            prepared["template"], CALL_SUMMARY_MODEL, purpose=PURPOSE_CALL_SUMMARY
+        ):
+            summary_text += text
+            yield {"event": "summary", "html": markdown_to_html(summary_text)}
+    except LLMUnavailableError as e:
+        # Il gateway ritenta solo prima del primo chunk: qui non è stato inviato nulla
+        yield {"event": "done", **(await _call_summary_fallback(prepared, e))}
+        return
+
+    summary_with_link = markdown_to_html(summary_text) + prepared["link_html"]
+    await _store_call_summary(prepared, summary_with_link)
+    yield {"event": "done", "has_program": True, "summary": summary_with_link}
+
+@timed("destinations.lookup")
+def _get_destinations_document(home_university: str) -> dict:
+    """
+    Restituisce il documento delle destinazioni più recente dell'università.
+
+    Raises:
+        FileNotFoundError: Se l'università, il documento o il file non esistono
+    """
+    from ..core.database import db_manager
+
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM universities WHERE university_name = ?', (home_university,))
+    uni_row = cursor.fetchone()
+    conn.close()
+
+    if not uni_row:
+        raise FileNotFoundError(f"Università '{home_university}' non trovata nel database")
+
+    university_id = uni_row['id']
+
+    # Recupera il documento delle destinazioni
+    destinations_docs = db_manager.get_university_documents(university_id, document_type='destinazioni')
+
+    if not destinations_docs:
+        raise FileNotFoundError(f"Nessun file di destinazioni trovato per '{home_university}'")
+
+    # Prendi il più recente
+    dest_doc = destinations_docs[0]
+    pdf_path = dest_doc.get('file_path')
+
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"Il file delle destinazioni non è stato trovato: {pdf_path}")
+    return dest_doc
+
+@singleflight("departments", key=lambda home_university: home_university)
+@timed("departments")
 async def get_available_departments(home_university: str) -> list[str]:
     """
-    Estrae tutti i dipartimenti disponibili dal file delle destinazioni dell'università nel database.
-    Il PDF viene processato in memoria senza salvare file temporanei.
+    Restituisce tutti i dipartimenti disponibili nel file delle destinazioni dell'università.
+    I nomi sono letti dall'indice dei dipartimenti salvato all'upload (costruito al primo
+    accesso per i documenti caricati in precedenza).
     
     Args:
         home_university: Nome dell'università di origine
@@ -310,105 +469,15 @@ async def get_available_departments(home_university: str) -> list[str]:
         ValueError: Se non è possibile estrarre i dipartimenti
     """
     try:
-        from ..core.database import db_manager
-        
         # --- 1. RECUPERA IL FILE DELLE DESTINAZIONI DAL DATABASE ---
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM universities WHERE university_name = ?', (home_university,))
-        uni_row = cursor.fetchone()
-        conn.close()
-        
-        if not uni_row:
-            raise FileNotFoundError(f"Università '{home_university}' non trovata nel database")
-        
-        university_id = uni_row['id']
-        
-        # Recupera il documento delle destinazioni
-        destinations_docs = db_manager.get_university_documents(university_id, document_type='destinazioni')
-        
-        if not destinations_docs:
-            raise FileNotFoundError(f"Nessun file di destinazioni trovato per '{home_university}'")
-        
-        # Prendi il più recente
-        dest_doc = destinations_docs[0]
-        pdf_path = dest_doc.get('file_path')
-
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"Il file delle destinazioni non è stato trovato: {pdf_path}")
-
-        # --- 2. ESTRAI IL TESTO DAL PDF (IN MEMORIA) ---
-        full_text = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                # Estrai tabelle strutturate
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        cleaned_row = [
-                            cell.replace('\n', ' ').strip() if cell is not None else "" 
-                            for cell in row
-                        ]
-                        line = " | ".join(cleaned_row)
-                        full_text += line + "\n"
-                
-                # Estrai anche testo normale (non in tabelle)
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
-        
-        if not full_text.strip():
-            raise ValueError("Il PDF è vuoto o non è stato possibile estrarre il testo.")
-
-        # Non comprimere tutto: mantieni le linee separate
-        print(f"✅ Testo estratto dal database ({len(full_text)} caratteri)")
-
-        # --- 3. ESTRAI I DIPARTIMENTI CON REGEX ---
-        # Prima rimuovi tutta la colonna "note per gli studenti" dal testo
-        # Cerca tutte le occorrenze dopo "note per gli studenti" fino alla fine della riga o tabella
-        text_without_notes = re.sub(
-            r'(note per gli studenti|note per lo studente).*?(?=\n|$)', 
-            '', 
-            full_text, 
-            flags=re.IGNORECASE
-        )
-        
-        # Dividi il testo in linee
-        lines = text_without_notes.split('\n')
-        
-        # Usa un set per eliminare automaticamente i duplicati
-        departments_set = set()
+        dest_doc = await run_blocking("db", _get_destinations_document, home_university)
+
+        # --- 2. LEGGI I DIPARTIMENTI DALL'INDICE PRECALCOLATO (COSTRUITO ALL'UPLOAD) ---
+        departments = await run_blocking("pdf", get_department_names, dest_doc)
         
-        for line in lines:
-            line_stripped = line.strip()
-            line_lower = line_stripped.lower()
-            
-            # Cerca solo le linee che INIZIANO con "dipartimento" o "dipartimenti"
-            if line_lower.startswith('dipartiment'):
-                # Estrai solo la parte prima di "n° borse" o "n°borse" o "|"
-                if 'n°' in line_lower or 'n °' in line_lower:
-                    # Prendi tutto prima di "n°"
-                    dept_line = re.split(r'n\s*°', line_stripped, flags=re.IGNORECASE)[0]
-                elif '|' in line_stripped:
-                    # Se c'è un pipe, prendi solo la prima parte
-                    dept_line = line_stripped.split('|')[0]
-                else:
-                    dept_line = line_stripped
-                
-                # Pulisci la linea: rimuovi caratteri non alfanumerici (tranne spazi e apostrofi)
-                dept_line = re.sub(r"[^a-zA-Z0-9\s'àèéìòùÀÈÉÌÒÙ]", '', dept_line)
-                # Rimuovi spazi multipli
-                dept_line = re.sub(r'\s+', ' ', dept_line).strip()
-                
-                # Aggiungi solo se ha senso (almeno 10 caratteri per evitare frammenti)
-                if dept_line and len(dept_line) >= 10:
-                    departments_set.add(dept_line)
-        
-        if not departments_set:
+        if not departments:
             raise ValueError("Nessun dipartimento trovato nel file delle destinazioni")
         
-        # Converti il set in lista ordinata
-        departments = sorted(list(departments_set))
         print(f"✅ Trovati {len(departments)} dipartimenti: {departments}")
         return departments
         
@@ -447,8 +516,7 @@ def get_erasmus_suggestions(course: str, preferences: str) -> list:
     """
     
     # 3. Generazione (Generation)
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    #response = model.generate_content(template)
+    #response = get_llm_provider().generate(template, GENERATION_MODEL)
     response = "test"
     
     try:
@@ -486,138 +554,60 @@ def get_available_universities() -> list[str]:
         print(f"Errore nel recupero delle università dal database: {e}")
         return []
 
+@singleflight(
+    "destinations",
+    key=lambda home_university, department, period: (home_university, department, getattr(period, "value", period))
+)
+@timed("step2.destinations")
 async def analyze_destinations_for_department(home_university: str, department: str, period: str) -> list:
     """
     Analizza il PDF delle destinazioni per un'università specifica dal database:
     1. Recupera il file dal database
-    2. Estrae il testo con pdfplumber (IN MEMORIA)
-    3. Estrae solo la sezione del dipartimento specificato
-    4. Usa Gemini per analizzare solo quella sezione e trovare le destinazioni
+    2. Legge le destinazioni del dipartimento dalla tabella strutturata (parsata all'upload);
+       Gemini viene usato solo, se abilitato, per le descrizioni testuali
+    3. Fallback: estrae il testo (cache), isola la sezione del dipartimento e la
+       converte con il parser deterministico; Gemini estrae i campi solo se il
+       layout della tabella non viene riconosciuto
     """
     try:
-        from ..core.database import db_manager
-        
         # --- 1. RECUPERA IL FILE DELLE DESTINAZIONI DAL DATABASE ---
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM universities WHERE university_name = ?', (home_university,))
-        uni_row = cursor.fetchone()
-        conn.close()
-        
-        if not uni_row:
-            raise FileNotFoundError(f"Università '{home_university}' non trovata nel database")
-        
-        university_id = uni_row['id']
-        
-        # Recupera il documento delle destinazioni
-        destinations_docs = db_manager.get_university_documents(university_id, document_type='destinazioni')
-        
-        if not destinations_docs:
-            raise FileNotFoundError(f"Nessun file di destinazioni trovato per '{home_university}'")
-        
-        # Prendi il più recente
-        dest_doc = destinations_docs[0]
-        pdf_path = dest_doc.get('file_path')
-
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"Il file delle destinazioni non è stato trovato: {pdf_path}")
-
-        # --- 2. ESTRAI IL TESTO DAL PDF (IN MEMORIA) ---
-        full_text = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                # Estrai tabelle strutturate
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        cleaned_row = [
-                            cell.replace('\n', ' ').strip() if cell is not None else "" 
-                            for cell in row
-                        ]
-                        line = " | ".join(cleaned_row)
-                        full_text += line + "\n"
-
-                # Estrai anche testo normale (non in tabelle)
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
-
-        if not full_text.strip():
-            raise ValueError("Il PDF è vuoto o non è stato possibile estrarre il testo.")
-
-        # Pulisci il testo mantenendo la struttura a righe per l'estrazione del dipartimento
-        llm_ready_text = "\n".join(line.strip() for line in full_text.splitlines()).strip()
-        print(f"✅ Testo estratto dal database ({len(llm_ready_text)} caratteri)")
-
-        # --- 3. ESTRAI SOLO LA SEZIONE DEL DIPARTIMENTO SPECIFICO ---
+        dest_doc = await run_blocking("db", _get_destinations_document, home_university)
+
+        # --- 2. RISPONDI DALLA TABELLA STRUTTURATA (PARSATA ALL'UPLOAD) ---
         try:
-            department_section = extract_department_section(llm_ready_text, department)
+            rows = await run_blocking("pdf", query_destinations_for_department, dest_doc, department)
+        except Exception as e:
+            print(f"⚠️ Tabella destinazioni non disponibile, uso l'analisi con Gemini: {e}")
+            rows = None
+
+        if rows:
+            descriptions = None
+            if settings.DESTINATIONS_LLM_DESCRIPTIONS:
+                descriptions = await generate_destination_descriptions(rows, department)
+            destinations_data = rows_to_destinations(rows, descriptions)
+            print(f"✅ Trovate {len(destinations_data)} destinazioni per {department} (tabella strutturata)")
+            return destinations_data
+
+        # --- 3. FALLBACK: ESTRAI SOLO LA SEZIONE DEL DIPARTIMENTO (SLICE TRAMITE L'INDICE) ---
+        try:
+            department_section = await run_blocking("pdf", get_department_section, dest_doc, department)
             print(f"📋 Sezione del dipartimento estratta: {len(department_section)} caratteri")
         except ValueError as e:
             print(f"❌ Errore nell'estrazione della sezione del dipartimento: {e}")
             raise e
 
-        # --- 4. GENERA L'ANALISI CON GEMINI USANDO SOLO LA SEZIONE SPECIFICA ---
-        template = f"""
-        Sei un assistente universitario esperto nell'analisi di bandi Erasmus.
-        Il tuo compito è analizzare la sezione specifica del dipartimento "{department}" fornita di seguito.
-        Considera il periodo "{period}" per filtrare le destinazioni. Se non ci sono info sul periodo ignoralo.
-        
-        Estrai TUTTE le università partner elencate nella sezione, mantenendo ESATTAMENTE i campi come sono scritti nel file originale.
-
-        Per ogni università partner trovata, crea un oggetto JSON con i seguenti campi:
-        - "name": il nome dell'università estratto dal campo "NOME ISTITUZIONE"
-        - "codice_europeo": valore del campo "CODICE EUROPEO"
-        - "nome_istituzione": valore del campo "NOME ISTITUZIONE"
-        - "codice_area": valore del campo "CODICE AREA"
-        - "posti": valore del campo "POSTI"
-        - "durata_per_posto": valore del campo "DURATA PER POSTO"
-        - "livello": valore del campo "LIVELLO"
-        - "dettagli_livello": valore del campo "DETTAGLI LIVELLO"
-        - "requisiti_linguistici": valore del campo "REQUISITI LINGUISTICI"
-        - "description": una breve descrizione accattivante di 1-2 frasi sull'università
-
-        IMPORTANTE: 
-        - Restituisci ESCLUSIVAMENTE un array JSON valido
-        - Non aggiungere testo, spiegazioni o commenti prima o dopo l'array
-        - Se un campo è vuoto nel file, inserisci una stringa vuota "" o null
-        - Se non trovi destinazioni per il dipartimento, restituisci un array vuoto: []
-        - Assicurati che il JSON sia sintatticamente corretto
-        - Mantieni i valori dei campi esattamente come appaiono nel file
-        - I campi devono corrispondere esattamente a quelli del file: CODICE EUROPEO | NOME ISTITUZIONE | CODICE AREA | DESCRIZIONE AREA ISCED | POSTI | DURATA PER POSTO | LIVELLO | DETTAGLI LIVELLO | REQUISITI LINGUISTICI | BLENDED | SHORT MOBILITY | BIP | CIRCLE U | SOTTO CONDIZIONE | NOTE PER GLI STUDENTI
-
-        Esempio di formato richiesto:
-        [
-          {{
-            "name": "UNIVERSIDAD DE BARCELONA",
-            "codice_europeo": "E BARCELO01",
-            "nome_istituzione": "UNIVERSIDAD DE BARCELONA",
-            "codice_area": "0732",
-            "posti": "2",
-            "durata_per_posto": "5",
-            "livello": "U",
-            "dettagli_livello": "",
-            "requisiti_linguistici": "Spanish B2",
-            "description": "Prestigiosa università catalana con forti programmi in ingegneria civile."
-          }}
-        ]
-
-        --- SEZIONE DEL DIPARTIMENTO "{department}" ---
-        {department_section}
-        """
-
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = await model.generate_content_async(template)
-        
-        print(f"🔍 Risposta di Gemini (primi 500 caratteri): {response.text[:500]}")
-        
-        try:
-            destinations_data = clean_and_parse_json_response(response.text, "array")
-            print(f"✅ Trovate {len(destinations_data)} destinazioni per {department}")
+        # --- 4. PARSER DETERMINISTICO DELLA SEZIONE (SENZA LLM) ---
+        section_rows = await run_blocking("pdf", parse_destinations_table, department_section)
+        if section_rows:
+            descriptions = None
+            if settings.DESTINATIONS_LLM_DESCRIPTIONS:
+                descriptions = await generate_destination_descriptions(section_rows, department)
+            destinations_data = rows_to_destinations(section_rows, descriptions)
+            print(f"✅ Trovate {len(destinations_data)} destinazioni per {department} (parser deterministico)")
             return destinations_data
-        except ValueError as e:
-            print(f"❌ Errore nel parsing della risposta di Gemini: {e}")
-            raise e
+
+        # --- 5. ULTIMA RISORSA: ESTRAZIONE DEI CAMPI CON GEMINI (LAYOUT NON RICONOSCIUTO) ---
+        return await extract_destinations_with_llm(department_section, department, period)
 
     except FileNotFoundError as e:
         print(f"Errore file in analyze_destinations: {e}")
@@ -626,6 +616,178 @@ async def analyze_destinations_for_department(home_university: str, department:
         print(f"Errore generico in analyze_destinations: {e}")
         raise e
 
+async def extract_destinations_with_llm(department_section: str, department: str, period: str) -> list:
+    """
+    Estrae con Gemini le destinazioni dalla sezione di testo di un dipartimento.
+    Usato solo quando il parser deterministico non riconosce il layout della tabella
+    (e dallo script di benchmark per il confronto tra i due metodi).
+    
+    Args:
+        department_section: Sezione del testo delle destinazioni relativa al dipartimento
+        department: Dipartimento selezionato
+        period: Periodo Erasmus (fall/spring)
+        
+    Returns:
+        Lista di destinazioni nel formato di DestinationUniversity
+        
+    Raises:
+        ValueError: Se la risposta di Gemini non è un array JSON valido
+    """
+    template = f"""
+    Sei un assistente universitario esperto nell'analisi di bandi Erasmus.
+    Il tuo compito è analizzare la sezione specifica del dipartimento "{department}" fornita di seguito.
+    Considera il periodo "{period}" per filtrare le destinazioni. Se non ci sono info sul periodo ignoralo.
+    
+    Estrai TUTTE le università partner elencate nella sezione, mantenendo ESATTAMENTE i campi come sono scritti nel file originale.
+
+    Per ogni università partner trovata, crea un oggetto JSON con i seguenti campi:
+    - "name": il nome dell'università estratto dal campo "NOME ISTITUZIONE"
+    - "codice_europeo": valore del campo "CODICE EUROPEO"
+    - "nome_istituzione": valore del campo "NOME ISTITUZIONE"
+    - "codice_area": valore del campo "CODICE AREA"
+    - "posti": valore del campo "POSTI"
+    - "durata_per_posto": valore del campo "DURATA PER POSTO"
+    - "livello": valore del campo "LIVELLO"
+    - "dettagli_livello": valore del campo "DETTAGLI LIVELLO"
+    - "requisiti_linguistici": valore del campo "REQUISITI LINGUISTICI"
+    - "description": una breve descrizione accattivante di 1-2 frasi sull'università
+
+    IMPORTANTE: 
+    - Restituisci ESCLUSIVAMENTE un array JSON valido
+    - Non aggiungere testo, spiegazioni o commenti prima o dopo l'array
+    - Se un campo è vuoto nel file, inserisci una stringa vuota "" o null
+    - Se non trovi destinazioni per il dipartimento, restituisci un array vuoto: []
+    - Assicurati che il JSON sia sintatticamente corretto
+    - Mantieni i valori dei campi esattamente come appaiono nel file
+    - I campi devono corrispondere esattamente a quelli del file: CODICE EUROPEO | NOME ISTITUZIONE | CODICE AREA | DESCRIZIONE AREA ISCED | POSTI | DURATA PER POSTO | LIVELLO | DETTAGLI LIVELLO | REQUISITI LINGUISTICI | BLENDED | SHORT MOBILITY | BIP | CIRCLE U | SOTTO CONDIZIONE | NOTE PER GLI STUDENTI
+
+    Esempio di formato richiesto:
+    [
+      {{
+        "name": "UNIVERSIDAD DE BARCELONA",
+        "codice_europeo": "E BARCELO01",
+        "nome_istituzione": "UNIVERSIDAD DE BARCELONA",
+        "codice_area": "0732",
+        "posti": "2",
+        "durata_per_posto": "5",
+        "livello": "U",
+        "dettagli_livello": "",
+        "requisiti_linguistici": "Spanish B2",
+        "description": "Prestigiosa università catalana con forti programmi in ingegneria civile."
+      }}
+    ]
+
+    --- SEZIONE DEL DIPARTIMENTO "{department}" ---
+    {department_section}
+    """
+
+    response_text = await llm_gateway.generate(template, GENERATION_MODEL, purpose=PURPOSE_DESTINATIONS)
+    
+    print(f"🔍 Risposta di Gemini (primi 500 caratteri): {response_text[:500]}")
+    
+    try:
+        destinations_data = clean_and_parse_json_response(response_text, "array")
+        print(f"✅ Trovate {len(destinations_data)} destinazioni per {department}")
+        return destinations_data
+    except ValueError as e:
+        print(f"❌ Errore nel parsing della risposta di Gemini: {e}")
+        raise e
+
+async def generate_destination_descriptions(rows: list, department: str) -> dict | None:
+    """
+    Genera con Gemini una breve descrizione per ogni istituzione partner.
+    È l'unica parte facoltativa dello step 2 che richiede l'LLM: i campi
+    vengono sempre letti dalla tabella strutturata.
+    
+    Args:
+        rows: Righe della tabella destinations del dipartimento
+        department: Dipartimento selezionato
+        
+    Returns:
+        Dizionario nome istituzione -> descrizione, oppure None in caso di errore
+    """
+    names = sorted({row.get('nome_istituzione') for row in rows if row.get('nome_istituzione')})
+    if not names:
+        return None
+
+    names_list = "\n".join(f"- {name}" for name in names)
+    template = f"""
+    Sei un assistente universitario esperto di programmi Erasmus.
+    Per ciascuna delle seguenti università partner del dipartimento "{department}"
+    scrivi una breve descrizione accattivante di 1-2 frasi.
+
+    Restituisci ESCLUSIVAMENTE un oggetto JSON valido in cui le chiavi sono i nomi
+    delle università ESATTAMENTE come scritti sotto e i valori sono le descrizioni.
+
+    --- UNIVERSITÀ ---
+    {names_list}
+    """
+
+    try:
+        response_text = await llm_gateway.generate(
+            template, GENERATION_MODEL, purpose=PURPOSE_DESTINATION_DESCRIPTIONS
+        )
+        descriptions = clean_and_parse_json_response(response_text, "object")
+        return {str(k): str(v) for k, v in descriptions.items()}
+    except Exception as e:
+        print(f"⚠️ Descrizioni delle destinazioni non generate: {e}")
+        return None
+
+@timed("step3.courses_context")
+async def build_courses_context(course_doc: dict, catalog_text: str, student_study_plan_text: str) -> tuple:
+    """
+    Costruisce il testo del catalogo dei corsi da inserire nel prompt dello step 3.
+
+    Con EXAMS_CONTEXT_MODE="retrieval" i cataloghi più grandi di EXAMS_CONTEXT_TOKEN_BUDGET
+    vengono sostituiti dai chunk pertinenti agli esami del piano di studi. Un catalogo
+    caricato prima dell'indicizzazione dei corsi viene indicizzato al primo utilizzo;
+    se il vector store non è disponibile il catalogo viene troncato al budget.
+
+    Args:
+        course_doc: Riga di uploaded_documents del catalogo
+        catalog_text: Testo completo estratto dal PDF del catalogo
+        student_study_plan_text: Testo del piano di studi dello studente
+
+    Returns:
+        Tupla (testo del catalogo per il prompt, modalità: "full", "retrieval" o "truncated")
+    """
+    from .ingestion_service import index_courses_document
+
+    budget = settings.EXAMS_CONTEXT_TOKEN_BUDGET
+    source = course_doc['stored_filename']
+
+    if settings.EXAMS_CONTEXT_MODE == "full" or estimate_tokens(catalog_text) <= budget:
+        record_context("full", catalog_text, catalog_text)
+        return catalog_text, "full"
+
+    exams = extract_study_plan_exams(student_study_plan_text, settings.EXAMS_CONTEXT_MAX_EXAMS)
+    if not exams:
+        # Piano di studi senza righe riconoscibili: l'intero testo come unica query
+        exams = [student_study_plan_text[:1000]]
+
+    ranked = []
+    try:
+        ranked = await run_blocking("vector", search_course_chunks, exams, source, settings.EXAMS_CONTEXT_TOP_K)
+        if not any(ranked):
+            print(f"📚 Catalogo {source} non ancora indicizzato, indicizzazione in corso...")
+            await run_blocking("vector", index_courses_document, course_doc)
+            ranked = await run_blocking("vector", search_course_chunks, exams, source, settings.EXAMS_CONTEXT_TOP_K)
+    except Exception as e:
+        print(f"⚠️ Retrieval dei corsi non disponibile ({e}), uso il catalogo troncato")
+
+    if any(ranked):
+        context, chunks = pack_course_chunks(ranked, budget)
+        mode = "retrieval"
+    else:
+        context, chunks = truncate_to_budget(catalog_text, budget), None
+        mode = "truncated"
+
+    record_context(mode, catalog_text, context)
+    print(describe_context(mode, catalog_text, context, chunks) + f", {len(exams)} esami")
+    return context, mode
+
+
+@timed("step3.exams_compatibility")
 async def analyze_exams_compatibility(destination_university_name: str, student_study_plan_text: str, period: str = None) -> dict:
     """
     Analizza la compatibilità degli esami tra il piano di studi dello studente 
@@ -654,27 +816,31 @@ async def analyze_exams_compatibility(destination_university_name: str, student_
         
         # --- 1. CERCA IL FILE PDF DEGLI ESAMI NEL DATABASE ---
         # Cerca l'università nel database
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        # Cerca per nome esatto o parziale
-        cursor.execute('''
-            SELECT d.* 
-            FROM uploaded_documents d
-            JOIN universities u ON d.university_id = u.id
-            WHERE d.document_type = 'erasmus_courses' 
-            AND d.is_active = 1
-            AND (
-                LOWER(u.university_name) = LOWER(?)
-                OR LOWER(u.university_name) LIKE LOWER(?)
-                OR LOWER(?) LIKE '%' || LOWER(u.university_name) || '%'
-            )
-            ORDER BY d.upload_date DESC
-            LIMIT 1
-        ''', (destination_university_name, f'%{destination_university_name}%', destination_university_name))
+        def find_course_doc():
+            conn = db_manager.get_connection()
+            cursor = conn.cursor()
+        
+            # Cerca per nome esatto o parziale
+            cursor.execute('''
+                SELECT d.* 
+                FROM uploaded_documents d
+                JOIN universities u ON d.university_id = u.id
+                WHERE d.document_type IN (?, ?)
+                AND d.is_active = 1
+                AND (
+                    LOWER(u.university_name) = LOWER(?)
+                    OR LOWER(u.university_name) LIKE LOWER(?)
+                    OR LOWER(?) LIKE '%' || LOWER(u.university_name) || '%'
+                )
+                ORDER BY d.upload_date DESC
+                LIMIT 1
+            ''', (*COURSE_DOCUMENT_TYPES, destination_university_name, f'%{destination_university_name}%', destination_university_name))
         
-        course_doc = cursor.fetchone()
-        conn.close()
+            course_doc = cursor.fetchone()
+            conn.close()
+            return course_doc
+
+        course_doc = await run_blocking("db", timed("exams.lookup")(find_course_doc))
         
         if not course_doc:
             raise FileNotFoundError(f"Nessun file di esami trovato per '{destination_university_name}' nel database")
@@ -687,10 +853,14 @@ async def analyze_exams_compatibility(destination_university_name: str, student_
             raise FileNotFoundError(f"File degli esami non trovato: {exam_pdf_path}")
         
         # --- 2. ESTRAI IL TESTO DAL PDF DEGLI ESAMI ---
-        exam_text = extract_text_from_pdf(exam_pdf_path)
+        catalog_text = await run_blocking("pdf", extract_text_from_pdf, exam_pdf_path, document_type='corsi_erasmus')
 
-        print(f"✅ Estratto testo da {target_filename} ({len(exam_text)} caratteri)")
+        print(f"✅ Estratto testo da {target_filename} ({len(catalog_text)} caratteri)")
         print(f"🎓 Piano di studi studente ({len(student_study_plan_text)} caratteri)")
+
+        # Solo i corsi pertinenti agli esami del piano di studi, entro il budget di token
+        exam_text, context_mode = await build_courses_context(course_doc, catalog_text, student_study_plan_text)
+        catalog_note = " (estratto del catalogo: solo i corsi pertinenti agli esami del piano di studi)" if context_mode == "retrieval" else ""
         
         # Prepara l'informazione sul periodo per il prompt
         period_info = ""
@@ -707,7 +877,7 @@ async def analyze_exams_compatibility(destination_university_name: str, student_
         **PIANO DI STUDI DELLO STUDENTE:**
         {student_study_plan_text}
 
-        **ESAMI DISPONIBILI PRESSO L'UNIVERSITÀ DI DESTINAZIONE ({destination_university_name}):**
+        **ESAMI DISPONIBILI PRESSO L'UNIVERSITÀ DI DESTINAZIONE ({destination_university_name}){catalog_note}:**
         {exam_text}
         {period_info}
         **ISTRUZIONI:**
@@ -750,13 +920,25 @@ async def analyze_exams_compatibility(destination_university_name: str, student_
         {f"- Nel riassunto finale, specifica esplicitamente quanti esami sono compatibili con il periodo {period_name}" if period else ""}
         """
 
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = await model.generate_content_async(template)
+        try:
+            response_text = await llm_gateway.generate(
+                template, GENERATION_MODEL, purpose=PURPOSE_EXAMS_COMPATIBILITY
+            )
+        except LLMUnavailableError as e:
+            print(f"⚠️ Analisi degli esami non disponibile: {e}")
+            return {
+                "matched_exams": [],
+                "suggested_exams": [],
+                "compatibility_score": 0.0,
+                "analysis_summary": "Il servizio di analisi automatica non è al momento disponibile. Riprova tra qualche minuto o consulta manualmente il PDF dei corsi disponibili.",
+                "exams_pdf_url": f"/api/students/files/exams/{target_filename}",
+                "exams_pdf_filename": target_filename
+            }
         
-        print(f"🔍 Risposta di Gemini per analisi esami (primi 500 caratteri): {response.text[:500]}")
+        print(f"🔍 Risposta di Gemini per analisi esami (primi 500 caratteri): {response_text[:500]}")
         
         try:
-            analysis_result = clean_and_parse_json_response(response.text, "object")
+            analysis_result = clean_and_parse_json_response(response_text, "object")
             print(f"✅ Analisi completata: {len(analysis_result.get('matched_exams', []))} corrispondenze, score: {analysis_result.get('compatibility_score', 0)}")
             
             # Aggiungi le informazioni del PDF al risultato
@@ -785,12 +967,16 @@ async def analyze_exams_compatibility(destination_university_name: str, student_
         raise e
         raise e
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+@timed("pdf.text")
+def extract_text_from_pdf(pdf_path: str, use_cache: bool = True, document_type: str = None) -> str:
     """
     Utility per estrarre testo da un file PDF.
+    Il risultato viene servito dalla cache di estrazione quando disponibile.
     
     Args:
         pdf_path: Percorso al file PDF
+        use_cache: False per file temporanei che non vanno conservati (es. piani di studio)
+        document_type: Tipo di documento, usato per scegliere il motore di estrazione
         
     Returns:
         Testo estratto dal PDF
@@ -798,18 +984,49 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     Raises:
         ValueError: Se il PDF è vuoto o non leggibile
     """
-    try:
-        text = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        
-        if not text.strip():
-            raise ValueError(f"Il PDF '{pdf_path}' è vuoto o non è stato possibile estrarre il testo.")
-            
-        return text.strip()
-        
-    except Exception as e:
-        raise ValueError(f"Errore nell'estrazione del testo dal PDF '{pdf_path}': {e}")
\ No newline at end of file
+    engine = pdf_extraction.engine_for(document_type)
+    extract_fn = lambda path: pdf_extraction.extract_text(path, engine)
+    if not use_cache:
+        return extract_fn(pdf_path)
+    # Nome e versione del motore fanno parte della chiave: cambiare motore non riusa testo diverso
+    return extraction_cache.get_or_extract(
+        pdf_path, f"text:{engine.cache_key}", TEXT_EXTRACTOR_VERSION, extract_fn
+    )
+
+def _extract_tables_and_text_uncached(pdf_path: str) -> str:
+    """
+    Estrae da un PDF delle destinazioni le tabelle (righe separate da " | ")
+    seguite dal testo normale di ogni pagina, con pdfplumber (senza cache).
+    """
+    return pdf_extraction.extract_tables_and_text(pdf_path)
+
+def destinations_extractor_key() -> str:
+    """Estrattore (motore delle tabelle con la sua versione) nella chiave della cache delle destinazioni."""
+    return f"tables_and_text:{pdf_extraction.engine_for(tables=True).cache_key}"
+
+@timed("pdf.destinations_text")
+def extract_destinations_text(pdf_path: str) -> str:
+    """
+    Restituisce il testo (tabelle + testo) di un PDF delle destinazioni,
+    usando la cache di estrazione persistente.
+    
+    Raises:
+        ValueError: Se il PDF è vuoto o non leggibile
+    """
+    return extraction_cache.get_or_extract(
+        pdf_path, destinations_extractor_key(), TABLES_AND_TEXT_EXTRACTOR_VERSION, _extract_tables_and_text_uncached
+    )
+
+def warm_extraction_cache(pdf_path: str, document_type: str) -> None:
+    """
+    Popola la cache di estrazione subito dopo l'upload di un documento,
+    così la prima richiesta degli studenti non deve attendere l'estrazione.
+    
+    Args:
+        pdf_path: Percorso del PDF appena salvato
+        document_type: Tipo di documento ('erasmus_call', 'destinazioni', 'corsi_erasmus', ...)
+    """
+    if document_type == 'destinazioni':
+        extract_destinations_text(pdf_path)
+    else:
+        extract_text_from_pdf(pdf_path, document_type=document_type)
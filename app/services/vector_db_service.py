@@ -2,63 +2,383 @@
 
 Questo modulo gestisce:
 1. Creazione del database vettoriale da documenti (create_vector_store)
-2. Caricamento e ricerca nei documenti (get_retriever)
+2. Aggiornamento incrementale per sorgente (add_documents, replace_source, delete_by_source)
+3. Caricamento e ricerca nei documenti (get_retriever, search)
+4. Ricerca ibrida: BM25 sull'indice lessicale affiancato a Chroma + vettori,
+   combinati con la Reciprocal Rank Fusion (hybrid_search, vedi lexical_index.py)
 
-Il database usa Chroma come backend e SentenceTransformers per gli embeddings.
+Il database usa Chroma come backend e SentenceTransformers per gli embeddings
+(backend configurabile, vedi embeddings.py).
+Per ogni categoria viene mantenuto un solo client Chroma aperto e riutilizzato
+da tutte le richieste: viene ricaricato quando l'indice su disco cambia e
+scaricato dalla memoria se resta inutilizzato troppo a lungo.
 """
 
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Iterable, List, Optional
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.schema import Document
 from pathlib import Path
 
+from ..core.config import settings
+from ..core.metrics import span, timed
+from .embeddings import create_embeddings, check_index_compatibility, write_index_signature
+from .embedding_cache import CachedEmbeddings, embedding_cache
+from .lexical_index import LexicalIndex, INDEX_FILENAME as LEXICAL_INDEX_FILENAME, fuse_rankings
+
+
+class _LoadedStore:
+    """Client Chroma aperto per una categoria, con i dati per reload ed eviction."""
+
+    def __init__(self, db: Chroma, signature: tuple):
+        self.db = db
+        self.signature = signature
+        self.last_used = time.monotonic()
+
 
 class VectorStoreService:
-    """Gestore del database vettoriale."""
+    """Gestore del database vettoriale.
+
+    Attributes:
+        max_loaded: Numero massimo di categorie tenute aperte in memoria
+        idle_seconds: Secondi di inattività dopo i quali una categoria viene scaricata
+        loads: Numero di aperture di un client Chroma (miss della cache)
+        reuses: Numero di richieste servite da un client già aperto
+        reloads: Numero di ricaricamenti dovuti a un indice modificato
+        evictions: Numero di categorie scaricate (LRU o inattività)
+    """
     
-    def __init__(self, base_path: str = "vector_db"):
+    def __init__(self, base_path: str = "vector_db", max_loaded: int = 4, idle_seconds: float = 1800):
         """Inizializza il servizio.
         
         Args:
             base_path: Directory base per i database vettoriali
+            max_loaded: Numero massimo di categorie aperte contemporaneamente
+            idle_seconds: Inattività (secondi) oltre la quale una categoria viene scaricata
         """
         self.base_path = Path(base_path)
         self._embeddings = None
+        self._embeddings_lock = threading.Lock()
+
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+
+        # Client aperti per categoria, in ordine di ultimo utilizzo (LRU)
+        self._stores: "OrderedDict[str, _LoadedStore]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Un lock per categoria: l'apertura di una categoria non blocca le altre
+        self._load_locks: dict = {}
+        # Le scritture su una categoria sono serializzate
+        self._write_locks: dict = {}
+        # Indici lessicali (BM25) per categoria
+        self._lexical: dict = {}
+
+        self.loads = 0
+        self.reuses = 0
+        self.reloads = 0
+        self.evictions = 0
     
     @property
     def embeddings(self):
         """Lazy loading del modello di embeddings."""
         if self._embeddings is None:
-            self._embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={'device': 'cpu'}  # usa CPU, cambia in 'cuda' se hai GPU
-            )
+            with self._embeddings_lock:
+                if self._embeddings is None:
+                    embeddings = create_embeddings()
+                    if embedding_cache is not None:
+                        # I chunk già visti (stesso testo, stesso modello) non passano dal modello
+                        embeddings = CachedEmbeddings(embeddings, embedding_cache)
+                    self._embeddings = embeddings
         return self._embeddings
 
-    def create_vector_store(self, docs: List[Document], category: str) -> None:
-        """Crea un nuovo database vettoriale per una categoria di documenti.
+    def _signature(self, db_path: Path) -> tuple:
+        """
+        Firma dell'indice su disco (mtime e dimensione dei file di primo livello).
+        Cambia quando un altro processo (es. scripts/index_calls.py) riscrive l'indice.
+        """
+        signature = []
+        for entry in sorted(os.scandir(db_path), key=lambda e: e.name):
+            # L'indice lessicale è aggiornato insieme a Chroma: non richiede un reload
+            if entry.is_file() and not entry.name.startswith(LEXICAL_INDEX_FILENAME):
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _evict_idle(self) -> None:
+        """Scarica le categorie inattive e quelle oltre max_loaded (da chiamare con self._lock)."""
+        now = time.monotonic()
+        for category in list(self._stores):
+            if now - self._stores[category].last_used > self.idle_seconds:
+                del self._stores[category]
+                self.evictions += 1
+                print(f"🧹 Vector DB '{category}' scaricato per inattività")
+        while len(self._stores) > self.max_loaded:
+            category, _ = self._stores.popitem(last=False)
+            self.evictions += 1
+            print(f"🧹 Vector DB '{category}' scaricato (limite di {self.max_loaded} categorie)")
+
+    def get_store(self, category: str) -> Chroma:
+        """Restituisce il client Chroma della categoria, aprendolo solo se necessario.
         
         Args:
-            docs: Lista di Document Langchain con testo e metadati
-            category: Categoria dei documenti (es. 'calls', 'courses')
+            category: Categoria (es. 'calls', 'courses')
+            
+        Returns:
+            Database Chroma condiviso della categoria
+            
+        Raises:
+            ValueError: se la categoria non esiste
         """
-        # Percorso per questa categoria
         db_path = self.base_path / category
         
-        # Crea database Chroma
-        db = Chroma.from_documents(
-            documents=docs,
-            embedding=self.embeddings,
-            persist_directory=str(db_path)
-        )
+        if not db_path.exists():
+            raise ValueError(
+                f"Database '{category}' non trovato. "
+                f"Esegui prima create_vector_store per la categoria '{category}'"
+            )
+
+        signature = self._signature(db_path)
+        with self._lock:
+            self._evict_idle()
+            loaded = self._stores.get(category)
+            if loaded is not None and loaded.signature == signature:
+                loaded.last_used = time.monotonic()
+                self._stores.move_to_end(category)
+                self.reuses += 1
+                return loaded.db
+            load_lock = self._load_locks.setdefault(category, threading.Lock())
+
+        with load_lock:
+            # Un'altra richiesta potrebbe aver già aperto la categoria nel frattempo
+            with self._lock:
+                loaded = self._stores.get(category)
+                if loaded is not None and loaded.signature == signature:
+                    loaded.last_used = time.monotonic()
+                    self.reuses += 1
+                    return loaded.db
+                stale = loaded is not None
+
+            # Un indice creato con un altro modello darebbe risultati senza senso
+            check_index_compatibility(db_path, category, self.embeddings)
+
+            # Carica database esistente
+            with span("vector.load"):
+                db = Chroma(
+                    persist_directory=str(db_path),
+                    embedding_function=self.embeddings
+                )
+
+            with self._lock:
+                self._stores[category] = _LoadedStore(db, signature)
+                self._stores.move_to_end(category)
+                self.loads += 1
+                if stale:
+                    self.reloads += 1
+                    # L'indice potrebbe essere stato ricreato: si riapre anche quello lessicale
+                    self._lexical.pop(category, None)
+                    print(f"🔄 Vector DB '{category}' ricaricato: indice modificato su disco")
+                self._evict_idle()
+            return db
+
+    def reload(self, category: str) -> None:
+        """Scarta il client aperto della categoria: la prossima richiesta riapre l'indice.
         
-        # Salva su disco
+        Da chiamare dopo aver modificato l'indice su disco.
+        """
+        with self._lock:
+            self._lexical.pop(category, None)
+            if self._stores.pop(category, None) is not None:
+                self.reloads += 1
+
+    def stats(self) -> dict:
+        """Restituisce contatori e categorie attualmente aperte."""
+        now = time.monotonic()
+        with self._lock:
+            loaded = {
+                category: round(now - store.last_used, 1)
+                for category, store in self._stores.items()
+            }
+        return {
+            "loads": self.loads,
+            "reuses": self.reuses,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "loaded_categories_idle_seconds": loaded,
+        }
+
+    @staticmethod
+    def chunk_id(source: str, index: int) -> str:
+        """ID stabile di un chunk: nome del file salvato + indice del chunk nel file."""
+        return f"{source}:{index}"
+
+    def _write_lock(self, category: str) -> threading.Lock:
+        with self._lock:
+            return self._write_locks.setdefault(category, threading.Lock())
+
+    def _open_for_write(self, category: str) -> Chroma:
+        """Client condiviso della categoria, creando la directory se non esiste ancora."""
+        db_path = self.base_path / category
+        if not db_path.exists():
+            db_path.mkdir(parents=True)
+            # Nuovo indice: registra il modello con cui viene creato
+            write_index_signature(db_path, self.embeddings)
+        return self.get_store(category)
+
+    def _after_write(self, category: str, db: Chroma) -> None:
+        """Salva su disco e aggiorna la firma, così la modifica non causa un reload."""
         db.persist()
+        signature = self._signature(self.base_path / category)
+        with self._lock:
+            loaded = self._stores.get(category)
+            if loaded is not None and loaded.db is db:
+                loaded.signature = signature
+
+    def lexical_index(self, category: str) -> LexicalIndex:
+        """Indice BM25 della categoria, ricostruito dai chunk di Chroma se manca.
+
+        Raises:
+            ValueError: se la categoria non esiste
+        """
+        db = self.get_store(category)
+        with self._lock:
+            index = self._lexical.get(category)
+            if index is not None:
+                return index
+            index = LexicalIndex(self.base_path / category / LEXICAL_INDEX_FILENAME)
+            self._lexical[category] = index
+
+        if index.count() == 0:
+            # Categoria indicizzata prima dell'indice lessicale: lo si costruisce da Chroma
+            with self._write_lock(category):
+                if index.count() == 0:
+                    existing = db._collection.get(include=["documents", "metadatas"])
+                    if existing.get("ids"):
+                        index.upsert(existing["ids"], existing["documents"], existing["metadatas"])
+                        print(f"✅ Indice lessicale '{category}' costruito con {len(existing['ids'])} chunk")
+        return index
+
+    def _delete_where_source(self, db: Chroma, source: str) -> int:
+        existing = db._collection.get(where={"source": source}, include=[])
+        ids = existing.get("ids") or []
+        if ids:
+            db._collection.delete(ids=ids)
+        return len(ids)
+
+    @timed("vector.upsert")
+    def add_documents(self, docs: List[Document], category: str) -> int:
+        """Aggiunge (o sovrascrive) chunk nel database di una categoria.
+
+        Gli ID sono stabili (chunk_id): i chunk di ogni sorgente (metadato "source")
+        sono numerati nell'ordine in cui compaiono, quindi reindicizzare lo stesso
+        file sovrascrive i chunk esistenti invece di duplicarli.
+        
+        Args:
+            docs: Lista di Document Langchain con testo e metadato "source"
+            category: Categoria dei documenti (es. 'calls', 'courses')
+
+        Returns:
+            Numero di chunk scritti
+        """
+        if not docs:
+            return 0
+
+        counters: dict = {}
+        ids = []
+        for doc in docs:
+            source = doc.metadata.get("source", "")
+            index = counters.get(source, 0)
+            counters[source] = index + 1
+            ids.append(self.chunk_id(source, index))
+
+        db = self._open_for_write(category)
+        lexical = self.lexical_index(category)
+        with self._write_lock(category):
+            # Rimuovi eventuali chunk con gli stessi ID (upsert)
+            db._collection.delete(ids=ids)
+            db.add_documents(docs, ids=ids)
+            lexical.upsert(ids, [doc.page_content for doc in docs], [doc.metadata for doc in docs])
+            self._after_write(category, db)
+        return len(ids)
+
+    @timed("vector.delete")
+    def delete_by_source(self, category: str, source: str) -> int:
+        """Rimuove tutti i chunk di una sorgente (es. bando disattivato).
+        
+        Args:
+            category: Categoria dei documenti
+            source: Valore del metadato "source" (stored_filename del documento)
+
+        Returns:
+            Numero di chunk rimossi (0 se la categoria non esiste)
+        """
+        if not (self.base_path / category).exists():
+            return 0
+
+        db = self.get_store(category)
+        lexical = self.lexical_index(category)
+        with self._write_lock(category):
+            removed = self._delete_where_source(db, source)
+            lexical.delete_source(source)
+            if removed:
+                self._after_write(category, db)
+        return removed
+
+    def replace_source(self, docs: List[Document], category: str, source: str) -> int:
+        """Sostituisce tutti i chunk di una sorgente con quelli forniti.
+
+        A differenza di add_documents rimuove anche i chunk in eccesso se il file
+        reindicizzato produce meno chunk di prima.
+
+        Returns:
+            Numero di chunk scritti
+        """
+        for doc in docs:
+            doc.metadata["source"] = source
+
+        db = self._open_for_write(category)
+        lexical = self.lexical_index(category)
+        with self._write_lock(category):
+            self._delete_where_source(db, source)
+            lexical.delete_source(source)
+            if docs:
+                ids = [self.chunk_id(source, index) for index in range(len(docs))]
+                db.add_documents(docs, ids=ids)
+                lexical.upsert(ids, [doc.page_content for doc in docs], [doc.metadata for doc in docs])
+            self._after_write(category, db)
+        return len(docs)
+
+    def count(self, category: str) -> int:
+        """Numero di chunk presenti nel database di una categoria."""
+        if not (self.base_path / category).exists():
+            return 0
+        return self.get_store(category)._collection.count()
+
+    def create_vector_store(self, docs: List[Document], category: str) -> None:
+        """Indicizza i documenti di una categoria, sostituendo i chunk delle stesse sorgenti.
+
+        Reindicizzare gli stessi file (es. scripts/index_calls.py) non duplica i
+        vettori: per ogni sorgente i chunk precedenti vengono sostituiti.
+        
+        Args:
+            docs: Lista di Document Langchain con testo e metadati
+            category: Categoria dei documenti (es. 'calls', 'courses')
+        """
+        by_source: "OrderedDict[str, List[Document]]" = OrderedDict()
+        for doc in docs:
+            by_source.setdefault(doc.metadata.get("source", ""), []).append(doc)
+
+        for source, source_docs in by_source.items():
+            self.replace_source(source_docs, category, source)
         
     def get_retriever(self, category: str, top_k: int = 5):
-        """Carica il retriever per una categoria di documenti.
+        """Crea un retriever sul client condiviso di una categoria di documenti.
+
+        Il retriever è un oggetto leggero creato ad ogni chiamata (i chiamanti ne
+        modificano search_kwargs, es. per il filtro sulla sorgente); il client Chroma
+        sottostante viene invece riutilizzato.
         
         Args:
             category: Categoria (es. 'calls', 'courses')
@@ -70,19 +390,7 @@ class VectorStoreService:
         Raises:
             ValueError: se la categoria non esiste
         """
-        db_path = self.base_path / category
-        
-        if not db_path.exists():
-            raise ValueError(
-                f"Database '{category}' non trovato. "
-                f"Esegui prima create_vector_store per la categoria '{category}'"
-            )
-        
-        # Carica database esistente
-        db = Chroma(
-            persist_directory=str(db_path),
-            embedding_function=self.embeddings
-        )
+        db = self.get_store(category)
         
         # Configura e restituisci retriever
         return db.as_retriever(
@@ -92,11 +400,13 @@ class VectorStoreService:
             }
         )
 
+    @timed("vector.search")
     def search(self, 
                category: str,
                query: str,
                top_k: int = 5,
-               filter_metadata: Optional[dict] = None) -> List[Document]:
+               filter_metadata: Optional[dict] = None,
+               mode: str = "vector") -> List[Document]:
         """Esegue una ricerca diretta nel database.
         
         Args:
@@ -104,24 +414,112 @@ class VectorStoreService:
             query: Testo della query
             top_k: Numero massimo di risultati
             filter_metadata: Filtro sui metadati (es. {"type": "call"})
+            mode: "vector" (similarità), "lexical" (BM25) o "hybrid" (entrambi, fusi con la RRF)
             
         Returns:
             Lista di Document con i risultati più rilevanti
         """
-        retriever = self.get_retriever(category, top_k)
-        return retriever.get_relevant_documents(
-            query,
-            filter=filter_metadata
-        )
+        if mode == "hybrid":
+            return self.hybrid_search(category, [query], top_k, filter_metadata)
+        if mode == "lexical":
+            return [
+                Document(page_content=content, metadata=metadata)
+                for _, content, metadata in self.lexical_index(category).search(query, top_k, filter_metadata)
+            ]
+        db = self.get_store(category)
+        return db.similarity_search(query, k=top_k, filter=filter_metadata)
+
+    @timed("vector.hybrid_search")
+    def hybrid_search(self,
+                      category: str,
+                      queries: List[str],
+                      top_k: int = 5,
+                      filter_metadata: Optional[dict] = None,
+                      candidates: Optional[int] = None) -> List[Document]:
+        """Ricerca ibrida: BM25 e similarità vettoriale per ogni query, fuse con la RRF.
+
+        Per ogni query vengono letti `candidates` risultati dall'indice vettoriale e
+        altrettanti dall'indice lessicale; tutte le classifiche vengono combinate in
+        un'unica graduatoria (Reciprocal Rank Fusion). Più query permettono di coprire
+        aspetti diversi dello stesso documento (es. scadenze, requisiti, CFU).
+
+        Args:
+            category: Categoria in cui cercare
+            queries: Testi delle query
+            top_k: Numero di risultati restituiti
+            filter_metadata: Filtro sui metadati (es. {"source": "bando.pdf"})
+            candidates: Risultati letti da ogni indice per ogni query (default HYBRID_CANDIDATES)
+
+        Returns:
+            Lista di Document in ordine di punteggio fuso
+        """
+        candidates = candidates or settings.HYBRID_CANDIDATES
+        db = self.get_store(category)
+        lexical = self.lexical_index(category)
+        embed_queries = getattr(self.embeddings, "embed_queries", self.embeddings.embed_documents)
+        vectors = embed_queries(list(queries))
+
+        def key(content: str, metadata: dict) -> tuple:
+            return (metadata.get("source", ""), content)
+
+        documents: dict = {}
+        rankings = []
+        for query, vector in zip(queries, vectors):
+            ranking = []
+            for doc in db.similarity_search_by_vector(vector, k=candidates, filter=filter_metadata):
+                documents.setdefault(key(doc.page_content, doc.metadata), doc)
+                ranking.append(key(doc.page_content, doc.metadata))
+            rankings.append(ranking)
+
+            ranking = []
+            for _, content, metadata in lexical.search(query, top_k=candidates, filter_metadata=filter_metadata):
+                documents.setdefault(key(content, metadata), Document(page_content=content, metadata=metadata))
+                ranking.append(key(content, metadata))
+            rankings.append(ranking)
+
+        return [documents[doc_key] for doc_key, _ in fuse_rankings(rankings, k=settings.HYBRID_RRF_K)[:top_k]]
+
+    @timed("vector.search_many")
+    def search_many(self,
+                    category: str,
+                    queries: List[str],
+                    top_k: int = 5,
+                    filter_metadata: Optional[dict] = None) -> List[List[Document]]:
+        """Esegue più ricerche, calcolando gli embedding di tutte le query in un solo batch.
+
+        Args:
+            category: Categoria in cui cercare
+            queries: Testi delle query
+            top_k: Numero massimo di risultati per query
+            filter_metadata: Filtro sui metadati (es. {"source": "corsi.pdf"})
+
+        Returns:
+            Per ogni query, la lista di Document più rilevanti
+        """
+        db = self.get_store(category)
+        embed_queries = getattr(self.embeddings, "embed_queries", self.embeddings.embed_documents)
+        vectors = embed_queries(list(queries))
+        return [db.similarity_search_by_vector(vector, k=top_k, filter=filter_metadata) for vector in vectors]
 
 # Istanza globale del servizio
-vector_store_service = VectorStoreService()
+vector_store_service = VectorStoreService(
+    max_loaded=settings.VECTOR_STORE_MAX_LOADED,
+    idle_seconds=settings.VECTOR_STORE_IDLE_SECONDS,
+)
 
 # Funzioni di comodo che usano l'istanza globale
 def create_vector_store(docs: List[Document], category: str) -> None:
     """Wrapper per VectorStoreService.create_vector_store."""
     vector_store_service.create_vector_store(docs, category)
 
+def replace_source_documents(docs: List[Document], category: str, source: str) -> int:
+    """Wrapper per VectorStoreService.replace_source."""
+    return vector_store_service.replace_source(docs, category, source)
+
+def delete_source_documents(category: str, source: str) -> int:
+    """Wrapper per VectorStoreService.delete_by_source."""
+    return vector_store_service.delete_by_source(category, source)
+
 def get_retriever(db_path: str, category: str, top_k: int = 5):
     """Wrapper per VectorStoreService.get_retriever.
     
@@ -132,3 +530,6 @@ def get_retriever(db_path: str, category: str, top_k: int = 5):
     """
     return vector_store_service.get_retriever(category, top_k)
 
+def reload_vector_store(category: str) -> None:
+    """Wrapper per VectorStoreService.reload."""
+    vector_store_service.reload(category)
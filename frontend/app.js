@@ -590,6 +590,68 @@ async function loadDepartments() {
   }
 }
 
+// Legge una risposta Server-Sent Events e chiama onEvent(nome, dati) per ogni evento
+async function readSseStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      const dataLines = [];
+      raw.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+      });
+      if (dataLines.length) onEvent(event, JSON.parse(dataLines.join("\n")));
+    }
+  }
+}
+
+// Step 1 in streaming: il riassunto viene mostrato man mano che arriva.
+// Restituisce null se lo streaming non è disponibile (si usa allora /step1).
+async function fetchBandoStream(homeUniversity) {
+  if (!window.ReadableStream || !window.TextDecoder) return null;
+
+  const res = await fetch(`${state.apiBase}/step1/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ home_university: homeUniversity }),
+  });
+  if (res.status === 404 || res.status === 405 || !res.body) return null;
+  if (!res.ok) {
+    const errorData = await res.json().catch(() => ({}));
+    throw new Error(errorData.detail || `Errore ${res.status}`);
+  }
+
+  let payload = null;
+  let departmentsPromise = null;
+  await readSseStream(res, (event, data) => {
+    if (event === "session") {
+      // Il session_id arriva prima del riassunto: i dipartimenti si caricano in parallelo
+      state.sessionId = data.session_id;
+      setSession(SESSION_KEYS.SESSION_ID, data.session_id);
+      departmentsPromise = loadDepartments();
+    } else if (event === "summary") {
+      state.bando = { has_program: true, summary: data.html, session_id: state.sessionId };
+      renderBando();
+    } else if (event === "done") {
+      payload = data;
+    } else if (event === "error") {
+      throw new Error(data.detail || "Errore durante lo streaming del riassunto");
+    }
+  });
+  if (departmentsPromise) await departmentsPromise;
+  if (!payload) throw new Error("Streaming del riassunto interrotto");
+  return payload;
+}
+
 async function fetchBando() {
   setLoading(true);
   setError(null);
@@ -600,6 +662,14 @@ async function fetchBando() {
       payload = mockBando;
       state.sessionId = payload.session_id;
     } else {
+      payload = await fetchBandoStream(state.universityFrom.trim());
+      if (payload) {
+        state.bando = payload;
+        setSession(SESSION_KEYS.UNIVERSITY_FROM, state.universityFrom.trim());
+        state.step = 1;
+        return;
+      }
+
       const res = await fetch(`${state.apiBase}/step1`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark dei metodi principali di DatabaseManager, prima e dopo
+connessioni riutilizzate, WAL e indici sui percorsi caldi.
+
+Lo script crea un database temporaneo con --universities università e
+--documents documenti per università (il database reale non viene toccato), poi misura:
+- "prima": una nuova connessione per query, journal rollback, senza gli indici di MIGRATIONS
+- "dopo": connessione per thread, WAL e indici (configurazione attuale)
+
+Uso esempi (PowerShell):
+  python scripts/benchmark_database.py
+  python scripts/benchmark_database.py --universities 200 --documents 20 --repeat 2000
+"""
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from app.core.database import DatabaseManager, MIGRATIONS
+
+DOCUMENT_TYPES = ["erasmus_call", "destinazioni", "corsi_erasmus"]
+
+
+def populate(db: DatabaseManager, universities: int, documents: int) -> None:
+    """Inserisce università e documenti di prova con una sola transazione."""
+    conn = sqlite3.connect(str(db.db_path))
+    password_hash = db.hash_password("Benchmark123")
+    conn.executemany(
+        "INSERT INTO universities (university_name, institutional_email, password_hash) VALUES (?, ?, ?)",
+        [(f"Università {i}", f"erasmus{i}@uni{i}.it", password_hash) for i in range(universities)],
+    )
+    rows = []
+    for u in range(1, universities + 1):
+        for d in range(documents):
+            doc_type = DOCUMENT_TYPES[d % len(DOCUMENT_TYPES)]
+            stored = f"uni{u}_{doc_type}_{d}.pdf"
+            rows.append((u, doc_type, stored, stored, f"/tmp/{stored}", f"2025-01-{1 + d % 28:02d} 10:00:00",
+                         1 if d < len(DOCUMENT_TYPES) else 0))
+    conn.executemany(
+        """INSERT INTO uploaded_documents
+           (university_id, document_type, original_filename, stored_filename, file_path, upload_date, is_active)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def downgrade(db_path: Path) -> None:
+    """Riporta il database allo stato precedente: niente indici delle migrazioni, journal rollback."""
+    conn = sqlite3.connect(str(db_path))
+    for _, statements in MIGRATIONS:
+        for statement in statements:
+            index_name = statement.split("EXISTS")[1].split()[0]
+            conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.commit()
+    conn.close()
+
+
+def bench(label: str, fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    median = statistics.median(timings)
+    print(f"  {label:<38} mediana {median:9.1f} µs   p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:9.1f} µs")
+    return median
+
+
+def run_suite(db: DatabaseManager, universities: int, repeat: int) -> dict:
+    target = universities // 2 or 1
+    email = f"erasmus{target - 1}@uni{target - 1}.it"
+    doc_id = {"n": 0}
+
+    def add_and_deactivate():
+        doc_id["n"] += 1
+        new_id = db.add_document(target, "corsi_erasmus", "bench.pdf", f"bench_{doc_id['n']}.pdf", "/tmp/bench.pdf")
+        db.deactivate_document(new_id, target)
+
+    def by_stored_filename():
+        conn = db.get_connection()
+        conn.execute(
+            "SELECT file_path FROM uploaded_documents WHERE stored_filename = ? AND is_active = 1",
+            (f"uni{target}_corsi_erasmus_2.pdf",),
+        ).fetchone()
+        conn.close()
+
+    return {
+        "get_all_active_calls": bench("get_all_active_calls", db.get_all_active_calls, repeat),
+        "get_university_documents": bench(
+            "get_university_documents(type)",
+            lambda: db.get_university_documents(target, document_type="destinazioni"), repeat),
+        "get_university_by_email": bench("get_university_by_email", lambda: db.get_university_by_email(email), repeat),
+        "get_document": bench("get_document", lambda: db.get_document(target), repeat),
+        "stored_filename": bench("ricerca per stored_filename", by_stored_filename, repeat),
+        "add_document+deactivate": bench("add_document + deactivate_document", add_and_deactivate, max(1, repeat // 10)),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Micro-benchmark di DatabaseManager")
+    p.add_argument("--universities", type=int, default=100, help="Università di prova")
+    p.add_argument("--documents", type=int, default=30, help="Documenti per università")
+    p.add_argument("--repeat", type=int, default=500, help="Ripetizioni per metodo")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "benchmark.db"
+        setup = DatabaseManager(db_path, pooled=False)
+        populate(setup, args.universities, args.documents)
+        print(f"Database di prova: {args.universities} università, "
+              f"{args.universities * args.documents} documenti\n")
+
+        downgrade(db_path)
+        print("=== PRIMA (connessione per query, senza indici, journal rollback) ===")
+        before_db = DatabaseManager.__new__(DatabaseManager)
+        before_db.db_path, before_db.pooled = db_path, False
+        before_db._connect = lambda: _legacy_connect(db_path)
+        before = run_suite(before_db, args.universities, args.repeat)
+
+        print("\n=== DOPO (connessione per thread, WAL, indici) ===")
+        after_db = DatabaseManager(db_path)
+        print(f"  Versione schema: {after_db.schema_version()}")
+        after = run_suite(after_db, args.universities, args.repeat)
+
+        print("\n=== SPEEDUP ===")
+        for name in before:
+            print(f"  {name:<38} x{before[name] / max(after[name], 1e-9):.1f}")
+    return 0
+
+
+def _legacy_connect(db_path: Path) -> sqlite3.Connection:
+    """get_connection come era prima: nessun pragma, una connessione nuova ogni volta."""
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
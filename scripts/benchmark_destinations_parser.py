@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+Benchmark del parser deterministico delle destinazioni contro l'estrazione con Gemini.
+
+Per ogni dipartimento del file delle destinazioni misura:
+- la latenza del parser deterministico (destinations_parser.parse_destinations_table)
+- l'accuratezza del parser rispetto a un riferimento annotato a mano (REFERENCE:
+  alcuni dipartimenti del file UniPi incluso, righe trascritte dal testo originale)
+- opzionalmente (--llm, richiede GOOGLE_API_KEY) latenza e accuratezza dell'estrazione
+  con Gemini sugli stessi dipartimenti e rispetto allo stesso riferimento
+
+Il riferimento vale solo per il file UniPi incluso: con --file diverso viene misurata
+solo la latenza (e, con --llm, Gemini viene confrontato con il parser).
+
+Uso esempi (PowerShell):
+  # Solo parser, sul file UniPi incluso nel repository
+  python scripts/benchmark_destinations_parser.py
+
+  # Confronto con Gemini sui dipartimenti del riferimento annotato
+  python scripts/benchmark_destinations_parser.py --llm --max-departments 3
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from app.services.destinations_parser import DESTINATION_COLUMNS, parse_destinations_table
+
+DEFAULT_FILE = root_dir / "data" / "destinazioni" / "processed" / "destinazioni_unipi_2025.pdf_LLM_ready.txt"
+
+# Campi confrontati tra parser e LLM (la descrizione è testo libero e non viene confrontata)
+COMPARED_FIELDS = [c for c in DESTINATION_COLUMNS if c != "descrizione_area"]
+
+# Riferimento annotato a mano su DEFAULT_FILE: dipartimento -> righe, con i campi nell'ordine
+# di COMPARED_FIELDS. Comprende un dipartimento il cui nome è prefisso dell'header di un
+# altro dipartimento (Energia / Energia + Informazione) e due sezioni con una sola riga.
+REFERENCE = {
+    "Dipartimento di Ingegneria Civile e Industriale, Dipartimento di Ingegneria dell'Informazione": [
+        ("E LEON01", "UNIVERSIDAD DE LEON", "0710", "2", "9 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "Spanish B1 English B1"),
+    ],
+    "Dipartimento di Ingegneria dell'Energia, dei Sistemi, del Territorio e delle Costruzioni": [
+        ("B LIEGE01", "UNIVERSITE DE LIEGE", "0730", "1", "10 mesi", "2",
+         "Laurea Magistrale", "English B1 French B1"),
+        ("D AACHEN01", "RHEINISCH- WESTFÄLISCHE TECHNISCHE HOCHSCHULE AACHEN", "0710", "2", "6 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "German B1 English B1"),
+        ("D KEMPTEN01", "Hochschule für angewandte Wissenschaften Kempten", "0713", "2", "6 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "German B1 English B2"),
+        ("E SEVILLA01", "UNIVERSIDAD DE SEVILLA", "0713", "2", "9 mesi", "1",
+         "Laurea Triennale", "Spanish B2"),
+        ("E VALENCI02", "UNIVERSITAT POLITECNICA DE VALENCIA", "0713", "1", "10 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "Spanish B1 English B2"),
+        ("G THESSAL01", "ARISTOTELIO PANEPISTIMIO THESSALONIKIS", "0713", "2", "6 mesi", "1, 2, 3",
+         "Laurea Triennale, Laurea Magistrale, Ciclo Unico e Dottorato", "English B2"),
+        ("PL GLIWICE01", "POLITECHNIKA SLASKA", "0730", "2", "12 mesi", "1, 2",
+         "Laurea Triennale, Laurea Magistrale e Ciclo Unico", "English B2"),
+        ("PL LUBLIN03", "POLITECHNIKA LUBELSKA", "0710", "2", "6 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "English B1"),
+        ("RO BACAU01", '"Vasile Alecsandri" University of Bacau', "0713", "2", "5 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "Romanian A1 English B1"),
+        ("RO BUCURES07", "“Ion Mincu” University of Architecture and Urbanism", "0731", "4", "5 mesi", "1, 2",
+         "Ciclo Unico e Laurea Magistrale", "English B2"),
+        ("TR ISTANBU50", "Istanbul Esenyurt University", "0730", "2", "9 mesi", "1, 2",
+         "Laurea Triennale e Ciclo Unico", "English B1 Turkish B1"),
+        ("TR TRABZON01", "KARADENIZ TEKNIK UNIVERSITESI", "0713", "2", "10 mesi", "1, 2",
+         "Laurea Trienn. e Laurea Magistrale", "English B2 Turkish B2"),
+    ],
+    "Dipartimento di Ingegneria dell'Energia, dei Sistemi, del Territorio e delle Costruzioni, "
+    "Dipartimento di Ingegneria dell'Informazione": [
+        ("P LISBOA109", "UNIVERSIDADE DE LISBOA", "0713", "2", "10 mesi", "2",
+         "Laurea Magistrale", "English B2"),
+    ],
+}
+
+
+def reference_rows(department: str) -> list:
+    """Righe annotate a mano del dipartimento, come dizionari con i campi di COMPARED_FIELDS."""
+    return [dict(zip(COMPARED_FIELDS, values)) for values in REFERENCE[department]]
+
+
+def _normalize(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+
+def _count_candidate_rows(text: str) -> int:
+    """Righe di tabella che non sono header di dipartimento o intestazioni di colonna."""
+    count = 0
+    for line in text.splitlines():
+        first = line.split("|")[0].strip().lower()
+        if "|" in line and first and not first.startswith("dipartiment") and first != "codice europeo":
+            count += 1
+    return count
+
+
+def _field_accuracy(reference: list, predicted: list) -> tuple:
+    """
+    Confronta le righe predette con quelle di riferimento (stesso codice europeo, in ordine).
+
+    Returns:
+        (righe trovate, campi corretti, campi totali)
+    """
+    remaining = list(predicted)
+    found = 0
+    correct = 0
+    total = 0
+    for ref in reference:
+        match = next(
+            (p for p in remaining if _normalize(p.get("codice_europeo")) == _normalize(ref["codice_europeo"])),
+            None,
+        )
+        total += len(COMPARED_FIELDS)
+        if match is None:
+            continue
+        remaining.remove(match)
+        found += 1
+        correct += sum(_normalize(match.get(f)) == _normalize(ref.get(f)) for f in COMPARED_FIELDS)
+    return found, correct, total
+
+
+def _print_accuracy(label: str, found: int, expected: int, extra: int, correct: int, fields: int) -> None:
+    print(f"    {label}: righe {found}/{expected} (recall {found / max(expected, 1):.1%}, "
+          f"{extra} in più) | campi corretti {correct}/{fields} ({correct / max(fields, 1):.1%})")
+
+
+def score_parser(rows: list) -> None:
+    """Confronta le righe del parser (documento intero) con il riferimento annotato a mano."""
+    print("\n=== PARSER VS RIFERIMENTO ANNOTATO ===")
+    totals = [0, 0, 0, 0, 0]
+    for department in REFERENCE:
+        reference = reference_rows(department)
+        predicted = [row for row in rows if row["department"] == department]
+        found, correct, fields = _field_accuracy(reference, predicted)
+        scores = (found, len(reference), len(predicted) - found, correct, fields)
+        totals = [a + b for a, b in zip(totals, scores)]
+        print(f"- {department[:70]}")
+        _print_accuracy("parser", *scores)
+    print("\n  Totale:")
+    _print_accuracy("parser", *totals)
+
+
+def benchmark_parser(text: str, repeat: int) -> list:
+    """Esegue il parser `repeat` volte e restituisce le righe dell'ultima esecuzione."""
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = parse_destinations_table(text)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    candidates = _count_candidate_rows(text)
+    timings.sort()
+    print("=== PARSER DETERMINISTICO ===")
+    print(f"  Righe estratte: {len(rows)} (righe candidate nel file: {candidates}, "
+          f"duplicati/continuazioni: {candidates - len(rows)})")
+    print(f"  Latenza documento intero: mediana {timings[len(timings) // 2]:.2f} ms, "
+          f"min {timings[0]:.2f} ms su {repeat} esecuzioni")
+    return rows
+
+
+async def benchmark_llm(text: str, departments: list, annotated: bool) -> None:
+    """
+    Confronta per dipartimento l'estrazione con Gemini e il parser sulla stessa sezione.
+
+    Con annotated=True entrambi vengono valutati sul riferimento annotato a mano;
+    altrimenti (file senza riferimento) Gemini viene confrontato con le righe del parser.
+    """
+    from app.services.rag_service import extract_department_section, extract_destinations_with_llm
+
+    print("\n=== CONFRONTO CON GEMINI ===")
+    if not annotated:
+        print("  (nessun riferimento annotato per questo file: Gemini confrontato con il parser)")
+    total_llm = [0, 0, 0, 0, 0]
+    total_parser = [0, 0, 0, 0, 0]
+    total_llm_ms = total_parser_ms = 0.0
+
+    for department in departments:
+        section = extract_department_section(text, department)
+
+        start = time.perf_counter()
+        parsed = parse_destinations_table(section)
+        parser_ms = (time.perf_counter() - start) * 1000
+        reference = reference_rows(department) if annotated else parsed
+
+        start = time.perf_counter()
+        try:
+            predicted = await extract_destinations_with_llm(section, department, period="")
+        except Exception as e:
+            print(f"  ❌ {department}: errore Gemini: {e}")
+            continue
+        llm_ms = (time.perf_counter() - start) * 1000
+
+        found, correct, fields = _field_accuracy(reference, predicted)
+        llm_scores = (found, len(reference), len(predicted) - found, correct, fields)
+        total_llm = [a + b for a, b in zip(total_llm, llm_scores)]
+        total_llm_ms += llm_ms
+        total_parser_ms += parser_ms
+
+        print(f"- {department[:70]}")
+        print(f"    parser {parser_ms:8.2f} ms | gemini {llm_ms:9.0f} ms")
+        if annotated:
+            found, correct, fields = _field_accuracy(reference, parsed)
+            parser_scores = (found, len(reference), len(parsed) - found, correct, fields)
+            total_parser = [a + b for a, b in zip(total_parser, parser_scores)]
+            _print_accuracy("parser", *parser_scores)
+        _print_accuracy("gemini", *llm_scores)
+
+    if total_llm[1]:
+        print("\n  Totale:")
+        print(f"    Latenza parser: {total_parser_ms:.2f} ms | latenza Gemini: {total_llm_ms:.0f} ms "
+              f"(x{total_llm_ms / max(total_parser_ms, 1e-6):.0f})")
+        if annotated:
+            _print_accuracy("parser", *total_parser)
+        _print_accuracy("gemini", *total_llm)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark parser destinazioni vs Gemini")
+    p.add_argument("--file", type=Path, default=DEFAULT_FILE, help="File di testo delle destinazioni")
+    p.add_argument("--repeat", type=int, default=20, help="Ripetizioni per la misura del parser")
+    p.add_argument("--llm", action="store_true", help="Confronta anche con l'estrazione Gemini")
+    p.add_argument("--max-departments", type=int, default=3, help="Dipartimenti da confrontare con Gemini")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.file.exists():
+        print(f"❌ File non trovato: {args.file}")
+        return 1
+
+    text = args.file.read_text(encoding="utf-8")
+    rows = benchmark_parser(text, args.repeat)
+
+    # Il riferimento annotato vale solo per il file UniPi incluso nel repository
+    annotated = args.file.resolve() == DEFAULT_FILE.resolve()
+    if annotated:
+        score_parser(rows)
+
+    if args.llm:
+        if annotated:
+            departments = list(REFERENCE)[:args.max_departments]
+        else:
+            departments = list(dict.fromkeys(row["department"] for row in rows))[:args.max_departments]
+        asyncio.run(benchmark_llm(text, departments, annotated))
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
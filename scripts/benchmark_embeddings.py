@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Benchmark dei backend di embedding (app/services/embeddings.py) sui chunk dei bandi.
+
+Per ogni configurazione misura:
+- frasi/s nell'embedding di tutti i chunk (migliore di --repeat esecuzioni)
+- recall@k rispetto al modello attuale (PyTorch float32, batch 32 come
+  HuggingFaceEmbeddings): per ogni query, quanti dei k chunk più vicini secondo il
+  riferimento vengono trovati anche dalla configurazione in prova
+
+I chunk vengono letti dall'indice "calls" (vector_db/calls) o, se l'indice non
+esiste, estratti dai PDF in data/calls. Le query sono domande tipiche sui bandi più
+l'inizio di --sample-queries chunk scelti a caso.
+
+Configurazioni: backend ("torch" o "onnx") con i suffissi opzionali "-int8"
+(quantizzazione) e "-fp16" (vettori float16), es. "torch-int8", "onnx-int8-fp16".
+
+Uso esempi (PowerShell):
+  python scripts/benchmark_embeddings.py
+  python scripts/benchmark_embeddings.py --configs torch torch-int8 onnx onnx-int8 --batch-size 128
+  python scripts/benchmark_embeddings.py --threads 4 --k 10 --repeat 3
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import SentenceEmbeddings
+
+QUERIES = [
+    "requisiti linguistici per la candidatura",
+    "scadenza per presentare la domanda",
+    "importo della borsa di mobilità mensile",
+    "numero minimo di CFU da acquisire all'estero",
+    "learning agreement e riconoscimento degli esami",
+    "graduatoria e criteri di selezione",
+    "durata del periodo di mobilità",
+    "contributo aggiuntivo per studenti con disabilità",
+    "rinuncia alla mobilità assegnata",
+    "documenti da caricare nella domanda online",
+    "mobilità per tirocinio traineeship",
+    "certificazione linguistica richiesta dall'università ospitante",
+]
+
+
+def load_chunks(calls_dir: str) -> list:
+    """Testi dei chunk dei bandi: dall'indice se esiste, altrimenti dai PDF."""
+    from app.services.vector_db_service import vector_store_service
+
+    try:
+        collection = vector_store_service.get_store("calls")._collection
+        texts = collection.get(include=["documents"])["documents"]
+        if texts:
+            print(f"Chunk letti dall'indice 'calls': {len(texts)}")
+            return texts
+    except ValueError as e:
+        print(f"Indice 'calls' non disponibile ({e})")
+
+    from app.services.document_service import load_and_split_documents
+
+    texts = [doc.page_content for doc in load_and_split_documents(calls_dir)]
+    print(f"Chunk estratti dai PDF in {calls_dir}: {len(texts)}")
+    return texts
+
+
+def parse_config(spec: str, batch_size: int, threads: int) -> SentenceEmbeddings:
+    parts = spec.split("-")
+    return SentenceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL,
+        backend=parts[0],
+        batch_size=batch_size,
+        threads=threads,
+        quantize="int8" in parts,
+        float16="fp16" in parts,
+    )
+
+
+def _top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Indici dei k chunk più vicini (distanza L2, come l'indice Chroma) per ogni query."""
+    distances = (
+        (query_vectors ** 2).sum(axis=1)[:, None]
+        - 2 * query_vectors @ doc_vectors.T
+        + (doc_vectors ** 2).sum(axis=1)[None, :]
+    )
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def measure(embeddings: SentenceEmbeddings, texts: list, queries: list, repeat: int) -> tuple:
+    """Embedding di chunk e query; restituisce (vettori chunk, vettori query, frasi/s)."""
+    embeddings.embed_documents(texts[:8])  # caricamento del modello e warm-up
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        doc_vectors = embeddings.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    query_vectors = embeddings.embed_documents(queries)
+    return (np.asarray(doc_vectors, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32),
+            len(texts) / best)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark dei backend di embedding")
+    p.add_argument("--configs", nargs="+", default=["torch", "torch-int8", "torch-fp16", "onnx", "onnx-int8"],
+                   help="Configurazioni da provare (backend[-int8][-fp16])")
+    p.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE, help="Batch delle configurazioni")
+    p.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS, help="Thread (0 = default)")
+    p.add_argument("--k", type=int, default=5, help="k della recall@k")
+    p.add_argument("--sample-queries", type=int, default=40, help="Query aggiuntive prese dai chunk")
+    p.add_argument("--repeat", type=int, default=2, help="Esecuzioni per configurazione")
+    p.add_argument("--calls-dir", default="data/calls", help="PDF dei bandi se l'indice non esiste")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    texts = load_chunks(args.calls_dir)
+    if not texts:
+        print("❌ Nessun chunk da indicizzare")
+        return 1
+
+    rng = random.Random(42)
+    sampled = rng.sample(texts, min(args.sample_queries, len(texts)))
+    queries = QUERIES + [" ".join(text.split()[:12]) for text in sampled]
+    k = min(args.k, len(texts))
+
+    # Riferimento: il comportamento precedente (HuggingFaceEmbeddings, batch 32 di encode)
+    reference = SentenceEmbeddings(model_name=settings.EMBEDDING_MODEL, backend="torch", batch_size=32)
+    ref_docs, ref_queries, ref_rate = measure(reference, texts, queries, args.repeat)
+    ref_top = _top_k(ref_docs, ref_queries, k)
+
+    print(f"\n{len(texts)} chunk, {len(queries)} query, batch {args.batch_size}, "
+          f"thread {args.threads or 'default'}")
+    print(f"{'configurazione':<18} {'frasi/s':>9} {'speedup':>8} {f'recall@{k}':>10}")
+    print(f"{'riferimento':<18} {ref_rate:>9.1f} {1.0:>8.2f} {1.0:>10.3f}")
+
+    for spec in args.configs:
+        embeddings = parse_config(spec, args.batch_size, args.threads)
+        backend = embeddings.backend
+        try:
+            docs, query_vectors, rate = measure(embeddings, texts, queries, args.repeat)
+        except Exception as e:
+            print(f"{spec:<18} errore: {e}")
+            continue
+        if embeddings.backend != backend:
+            print(f"{spec:<18} saltata: backend {backend} non disponibile")
+            continue
+        top = _top_k(docs, query_vectors, k)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(top, ref_top)])
+        print(f"{spec:<18} {rate:>9.1f} {rate / ref_rate:>8.2f} {recall:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
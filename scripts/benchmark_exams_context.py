@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Misura prompt e latenza dello step 3 (analisi di compatibilità degli esami) con il
+catalogo dei corsi completo e con il contesto costruito dal retrieval.
+
+Lo script lavora in una directory temporanea (database, cache e vector store reali
+non vengono toccati) con il provider LLM locale (LLM_PROVIDER=fake), la cui latenza
+cresce con la lunghezza del prompt (--prompt-tokens-per-second):
+1. Genera un catalogo sintetico di --courses corsi in PDF (o usa --catalog-pdf)
+2. Lo indicizza nella categoria "courses" come farebbe l'upload
+3. Esegue --runs analisi in modalità "full" e "retrieval" e confronta token del
+   prompt e latenza
+
+Di default gli embedding sono quelli reali (sentence-transformers, scaricati al primo
+uso); con --fake-embeddings si usano vettori casuali: le dimensioni del prompt restano
+significative, la pertinenza dei corsi selezionati no.
+
+Uso esempi (PowerShell):
+  python scripts/benchmark_exams_context.py
+  python scripts/benchmark_exams_context.py --courses 2000 --budget 3000 --top-k 2
+  python scripts/benchmark_exams_context.py --catalog-pdf "data/corsi/catalogo.pdf" --fake-embeddings
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+DESTINATION_UNIVERSITY = "UNIVERSITAT POLITECNICA DE CATALUNYA"
+DEFAULT_STUDY_PLAN = root_dir / "data" / "CYBERSECURITY.pdf"
+
+SUBJECTS = [
+    "Computer Architecture", "Operating Systems", "Computer Networks", "Network Security",
+    "Cryptography", "Software Engineering", "Databases", "Distributed Systems", "Machine Learning",
+    "Data Mining", "Computer Vision", "Embedded Systems", "Compilers", "Algorithms",
+    "Performance Evaluation", "Cloud Computing", "Human-Computer Interaction", "Robotics",
+    "Signal Processing", "Control Systems", "Thermodynamics", "Fluid Mechanics",
+    "Structural Analysis", "Materials Science", "Organic Chemistry", "Microeconomics",
+    "Corporate Finance", "Marketing", "European Law", "Urban Planning", "Architecture History",
+    "Telecommunication Systems", "Power Electronics", "Renewable Energy", "Aerospace Propulsion",
+    "Biomedical Instrumentation", "Statistics", "Linear Algebra", "Calculus", "Game Theory",
+]
+LEVELS = ["Introduction to", "Foundations of", "Advanced", "Applied", "Topics in", "Laboratory of"]
+SEASONS = ["Fall", "Spring", "Fall & Spring"]
+
+
+def configure_environment(args, tmp: Path) -> None:
+    """Imposta la configurazione dell'app prima di importarla (Settings legge l'ambiente)."""
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_LATENCY_DISTRIBUTION": "fixed",
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "FAKE_LLM_PROMPT_TOKENS_PER_SECOND": str(args.prompt_tokens_per_second),
+        "LLM_CACHE_ENABLED": "false",
+        "UNIVERSITIES_DB_PATH": str(tmp / "universities.db"),
+        "CACHE_DB_PATH": str(tmp / "cache.db"),
+        "DB_PATH": str(tmp / "vector_db"),
+        "SESSION_BACKEND": "memory",
+        "EXAMS_CONTEXT_TOKEN_BUDGET": str(args.budget),
+        "EXAMS_CONTEXT_TOP_K": str(args.top_k),
+    })
+
+
+def build_catalog(path: Path, courses: int, seed: int = 42) -> None:
+    """Scrive un catalogo sintetico (una riga per corso, con ECTS e periodo) in un PDF."""
+    import fitz
+
+    rng = random.Random(seed)
+    lines = ["Courses for Erasmus students (synthetic catalog)", "Code | Course | ECTS | Semester", ""]
+    for i in range(courses):
+        subject = rng.choice(SUBJECTS)
+        name = f"{rng.choice(LEVELS)} {subject}" + (f" {rng.randint(1, 3)}" if rng.random() < 0.3 else "")
+        lines.append(f"{230000 + i} | {name} | {rng.choice(['3', '4.5', '6', '7.5', '9'])} | {rng.choice(SEASONS)}")
+        lines.append(f"   Syllabus: core concepts and case studies of {subject.lower()}, "
+                     f"with {rng.choice(['project work', 'laboratory sessions', 'written exam', 'seminars'])}.")
+
+    with fitz.open() as doc:
+        per_page = 50
+        for start in range(0, len(lines), per_page):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 576, 806), "\n".join(lines[start:start + per_page]), fontsize=8)
+        doc.save(str(path))
+
+
+async def _run_mode(mode: str, runs: int, study_plan_text: str) -> dict:
+    from app.core.config import settings
+    from app.core.metrics import LLM_TOKENS
+    from app.services.llm_provider import PURPOSE_EXAMS_COMPATIBILITY
+    from app.services.rag_service import analyze_exams_compatibility
+
+    settings.EXAMS_CONTEXT_MODE = mode
+    labels = {"provider": "fake", "purpose": PURPOSE_EXAMS_COMPATIBILITY, "direction": "prompt"}
+    tokens_before = LLM_TOKENS.value(**labels)
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await analyze_exams_compatibility(DESTINATION_UNIVERSITY, study_plan_text, period="fall")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "prompt_tokens": (LLM_TOKENS.value(**labels) - tokens_before) / runs,
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Prompt e latenza dello step 3: catalogo completo vs retrieval")
+    p.add_argument("--courses", type=int, default=600, help="Corsi del catalogo sintetico")
+    p.add_argument("--catalog-pdf", type=Path, default=None, help="PDF reale del catalogo dei corsi")
+    p.add_argument("--study-plan", type=Path, default=DEFAULT_STUDY_PLAN, help="PDF del piano di studi")
+    p.add_argument("--budget", type=int, default=4000, help="EXAMS_CONTEXT_TOKEN_BUDGET")
+    p.add_argument("--top-k", type=int, default=3, help="EXAMS_CONTEXT_TOP_K")
+    p.add_argument("--runs", type=int, default=5, help="Analisi per modalità")
+    p.add_argument("--llm-latency-ms", type=float, default=800.0, help="Latenza iniziale del provider fake")
+    p.add_argument("--llm-tokens-per-second", type=float, default=120.0, help="Velocità di generazione")
+    p.add_argument("--prompt-tokens-per-second", type=float, default=5000.0, help="Velocità di lettura del prompt")
+    p.add_argument("--fake-embeddings", action="store_true", help="Embedding casuali (nessun download)")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        configure_environment(args, tmp)
+
+        from app.core.database import db_manager
+        from app.services.ingestion_service import index_courses_document
+        from app.services.rag_service import extract_text_from_pdf
+        from app.services.exams_context import extract_study_plan_exams
+        from app.services.vector_db_service import vector_store_service
+
+        vector_store_service.base_path = tmp / "vector_db"
+        if args.fake_embeddings:
+            from langchain.embeddings import FakeEmbeddings
+            vector_store_service._embeddings = FakeEmbeddings(size=384)
+
+        catalog_pdf = args.catalog_pdf
+        if catalog_pdf is None:
+            catalog_pdf = tmp / "catalogo_benchmark.pdf"
+            build_catalog(catalog_pdf, args.courses)
+
+        university_id = db_manager.create_university(
+            DESTINATION_UNIVERSITY, "erasmus@upc.edu", "Benchmark123", password_hash="-"
+        )
+        document_id = db_manager.add_document(
+            university_id, "corsi_erasmus", catalog_pdf.name, catalog_pdf.name, str(catalog_pdf)
+        )
+
+        start = time.perf_counter()
+        chunks = index_courses_document(db_manager.get_document(document_id))
+        index_ms = (time.perf_counter() - start) * 1000
+
+        study_plan_text = extract_text_from_pdf(str(args.study_plan), use_cache=False)
+        exams = extract_study_plan_exams(study_plan_text)
+
+        results = {}
+        for mode in ("full", "retrieval"):
+            results[mode] = asyncio.run(_run_mode(mode, args.runs, study_plan_text))
+
+    print(f"\nCatalogo: {catalog_pdf.name}, {chunks} chunk indicizzati in {index_ms:.0f} ms")
+    print(f"Piano di studi: {args.study_plan.name}, {len(exams)} esami riconosciuti")
+    print(f"Budget {args.budget} token, top-k {args.top_k}, {args.runs} analisi per modalità\n")
+    print(f"{'modalità':<10} {'token prompt':>13} {'p50 (ms)':>10} {'max (ms)':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['prompt_tokens']:>13.0f} {r['p50_ms']:>10.0f} {r['max_ms']:>10.0f}")
+
+    full, retrieval = results["full"], results["retrieval"]
+    if full["prompt_tokens"] and full["p50_ms"]:
+        print(f"\nRiduzione del prompt: {(1 - retrieval['prompt_tokens'] / full['prompt_tokens']) * 100:.0f}%, "
+              f"della latenza p50: {(1 - retrieval['p50_ms'] / full['p50_ms']) * 100:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Benchmark dei motori di estrazione del testo (PyMuPDF vs pdfplumber) sui PDF in data/.
+
+Per ogni PDF misura:
+- ms/pagina per il testo semplice con ciascun motore (sequenziale e, con --parallel,
+  con le pagine divise tra più processi)
+- ms/pagina per tabelle + testo (pdfplumber, usato per le destinazioni)
+- la differenza tra gli output dei motori (similarità e righe presenti in uno solo)
+
+Uso esempi (PowerShell):
+  python scripts/benchmark_pdf_extraction.py
+  python scripts/benchmark_pdf_extraction.py --parallel --repeat 3
+  python scripts/benchmark_pdf_extraction.py --path data/calls --show-diff 10
+"""
+
+import argparse
+import difflib
+import re
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from app.services import pdf_extraction
+
+DEFAULT_PATH = root_dir / "data"
+
+
+def _lines(text: str) -> list:
+    """Righe normalizzate (spazi compressi, senza righe vuote) per il confronto."""
+    return [re.sub(r"\s+", " ", line).strip() for line in text.splitlines() if line.strip()]
+
+
+def _timed(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def benchmark_file(pdf_path: Path, repeat: int, parallel: bool, tables: bool, show_diff: int) -> dict:
+    n_pages = pdf_extraction._page_count(str(pdf_path))
+    print(f"\n=== {pdf_path.name} ({n_pages} pagine) ===")
+
+    outputs = {}
+    timings = {}
+    for name in pdf_extraction.ENGINES:
+        engine = pdf_extraction.get_engine(name)
+        modes = [False, True] if parallel else [False]
+        for mode in modes:
+            label = f"{name}{' (parallelo)' if mode else ''}"
+            try:
+                text, ms = _timed(lambda: pdf_extraction.extract_text(str(pdf_path), engine, parallel=mode), repeat)
+            except ValueError as e:
+                print(f"  ❌ {label}: {e}")
+                continue
+            outputs.setdefault(name, text)
+            timings[label] = ms
+            print(f"  {label:<24} {ms:9.1f} ms  {ms / max(n_pages, 1):7.2f} ms/pagina  {len(text):8d} caratteri")
+
+    if tables:
+        try:
+            _, ms = _timed(lambda: pdf_extraction.extract_tables_and_text(str(pdf_path), parallel=False), repeat)
+        except ValueError as e:
+            print(f"  ❌ pdfplumber tabelle: {e}")
+        else:
+            timings["pdfplumber tabelle"] = ms
+            print(f"  {'pdfplumber tabelle':<24} {ms:9.1f} ms  {ms / max(n_pages, 1):7.2f} ms/pagina")
+
+    if "pymupdf" in outputs and "pdfplumber" in outputs:
+        a, b = _lines(outputs["pdfplumber"]), _lines(outputs["pymupdf"])
+        ratio = difflib.SequenceMatcher(None, " ".join(a), " ".join(b), autojunk=False).ratio()
+        only_plumber = sorted(set(a) - set(b))
+        only_mupdf = sorted(set(b) - set(a))
+        print(f"  Diff: similarità {ratio:.1%}, righe solo pdfplumber {len(only_plumber)}, "
+              f"solo PyMuPDF {len(only_mupdf)}")
+        for line in only_plumber[:show_diff]:
+            print(f"    - {line[:110]}")
+        for line in only_mupdf[:show_diff]:
+            print(f"    + {line[:110]}")
+
+    return {"pages": n_pages, "timings": timings}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark dei motori di estrazione PDF")
+    p.add_argument("--path", type=Path, default=DEFAULT_PATH, help="PDF o directory (ricerca ricorsiva)")
+    p.add_argument("--repeat", type=int, default=1, help="Ripetizioni per misura (si usa la migliore)")
+    p.add_argument("--parallel", action="store_true", help="Misura anche l'estrazione parallela per pagine")
+    p.add_argument("--no-tables", action="store_true", help="Non misurare l'estrazione delle tabelle")
+    p.add_argument("--show-diff", type=int, default=0, help="Righe diverse da mostrare per motore")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    pdfs = [args.path] if args.path.is_file() else sorted(args.path.rglob("*.pdf"))
+    if not pdfs:
+        print(f"❌ Nessun PDF trovato in {args.path}")
+        return 1
+
+    totals = {}
+    total_pages = 0
+    for pdf_path in pdfs:
+        result = benchmark_file(pdf_path, args.repeat, args.parallel, not args.no_tables, args.show_diff)
+        total_pages += result["pages"]
+        for label, ms in result["timings"].items():
+            totals[label] = totals.get(label, 0.0) + ms
+
+    print(f"\n=== TOTALE ({len(pdfs)} PDF, {total_pages} pagine) ===")
+    baseline = totals.get("pdfplumber")
+    for label, ms in totals.items():
+        speedup = f"  x{baseline / ms:.1f} rispetto a pdfplumber" if baseline and ms else ""
+        print(f"  {label:<24} {ms:9.1f} ms  {ms / max(total_pages, 1):7.2f} ms/pagina{speedup}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
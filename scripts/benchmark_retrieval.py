@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Benchmark del retrieval sui bandi indicizzati: ricerca vettoriale pura contro
+ricerca ibrida (BM25 + vettori, Reciprocal Rank Fusion).
+
+Per ogni bando dell'indice "calls" e per ogni argomento del riassunto (scadenze,
+requisiti linguistici, CFU, importo della borsa, candidatura) i chunk rilevanti
+sono quelli che contengono i termini dell'argomento (espressioni regolari). Misura:
+- latenza media e p95 di ogni metodo
+- recall@k per argomento: chunk rilevanti trovati / min(k, chunk rilevanti)
+- copertura del riassunto: argomenti presenti nel bando per cui il contesto passato
+  al modello contiene almeno un chunk rilevante. "vector" è il retrieval precedente
+  (una sola query, CALL_SUMMARY_TOP_K chunk), "hybrid" quello attuale (una query per
+  punto del prompt, CALL_SUMMARY_HYBRID_TOP_K chunk)
+
+Le etichette basate su parole chiave favoriscono la ricerca lessicale: i numeri
+vanno letti come un confronto indicativo, non come una valutazione assoluta.
+
+Uso esempi (PowerShell):
+  python scripts/index_calls.py
+  python scripts/benchmark_retrieval.py
+  python scripts/benchmark_retrieval.py --k 10 --candidates 30 --repeat 3
+"""
+
+import argparse
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from app.services.rag_service import (
+    CALL_SUMMARY_QUERY, CALL_SUMMARY_TOP_K, CALL_SUMMARY_QUERIES, CALL_SUMMARY_HYBRID_TOP_K
+)
+from app.services.vector_db_service import vector_store_service
+
+# Argomento -> (query, espressione che identifica i chunk rilevanti)
+TOPICS = {
+    "scadenze": (
+        "scadenza per presentare la domanda",
+        r"scadenz|entro (il|le ore)|termine (ultimo|per)|deadline",
+    ),
+    "lingua": (
+        "requisiti linguistici e certificazione della lingua",
+        r"\b[abc][12]\b|linguistic|certificazion[ei] (della )?lingua|language",
+    ),
+    "cfu": (
+        "numero minimo di CFU da conseguire all'estero",
+        r"\bcfu\b|\bects\b|credit[io] formativ",
+    ),
+    "borsa": (
+        "importo della borsa di mobilità mensile",
+        r"€|euro|contributo mensile|importo",
+    ),
+    "candidatura": (
+        "procedura di candidatura e domanda online",
+        r"candidatur|domanda (online|di partecipazione)|application",
+    ),
+}
+
+
+def load_sources() -> dict:
+    """Chunk dell'indice 'calls' raggruppati per bando: {source: [testo, ...]}."""
+    collection = vector_store_service.get_store("calls")._collection
+    existing = collection.get(include=["documents", "metadatas"])
+    sources: dict = {}
+    for text, metadata in zip(existing["documents"], existing["metadatas"]):
+        sources.setdefault((metadata or {}).get("source", ""), []).append(text)
+    return sources
+
+
+def timed_call(fn, repeat: int) -> tuple:
+    """Esegue fn `repeat` volte; restituisce (risultato, tempo migliore in ms)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def _recall(docs: list, relevant: set, k: int) -> float:
+    found = {doc.page_content for doc in docs} & relevant
+    return len(found) / min(k, len(relevant))
+
+
+def _covered(docs: list, pattern: re.Pattern) -> bool:
+    return any(pattern.search(doc.page_content) for doc in docs)
+
+
+def _summary(values: list) -> str:
+    if not values:
+        return "-"
+    p95 = sorted(values)[max(0, int(round(len(values) * 0.95)) - 1)]
+    return f"{statistics.mean(values):>7.1f} {p95:>7.1f}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark retrieval vettoriale vs ibrido sui bandi")
+    p.add_argument("--k", type=int, default=5, help="k della recall@k per argomento")
+    p.add_argument("--candidates", type=int, default=None, help="Candidati per indice (default HYBRID_CANDIDATES)")
+    p.add_argument("--repeat", type=int, default=2, help="Esecuzioni per misura (si tiene la migliore)")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        sources = load_sources()
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if not sources:
+        print("❌ Nessun chunk nell'indice 'calls' (esegui scripts/index_calls.py)")
+        return 1
+
+    # Warm-up: caricamento del modello e costruzione dell'indice lessicale
+    vector_store_service.hybrid_search("calls", ["bando"], top_k=1)
+
+    latency = {"vector": [], "hybrid": []}
+    recall = {method: {topic: [] for topic in TOPICS} for method in ("vector", "hybrid")}
+    coverage = {"vector": [0, 0], "hybrid": [0, 0]}
+
+    for source, texts in sources.items():
+        source_filter = {"source": source}
+        present = {}
+        for topic, (query, expression) in TOPICS.items():
+            pattern = re.compile(expression, re.IGNORECASE)
+            relevant = {text for text in texts if pattern.search(text)}
+            if not relevant:
+                continue
+            present[topic] = pattern
+
+            docs, ms = timed_call(lambda: vector_store_service.search(
+                "calls", query, top_k=args.k, filter_metadata=source_filter), args.repeat)
+            latency["vector"].append(ms)
+            recall["vector"][topic].append(_recall(docs, relevant, args.k))
+
+            docs, ms = timed_call(lambda: vector_store_service.hybrid_search(
+                "calls", [query], top_k=args.k, filter_metadata=source_filter,
+                candidates=args.candidates), args.repeat)
+            latency["hybrid"].append(ms)
+            recall["hybrid"][topic].append(_recall(docs, relevant, args.k))
+
+        # Contesto del riassunto (step 1): retrieval precedente contro quello attuale
+        contexts = {
+            "vector": vector_store_service.search(
+                "calls", CALL_SUMMARY_QUERY, top_k=CALL_SUMMARY_TOP_K, filter_metadata=source_filter),
+            "hybrid": vector_store_service.hybrid_search(
+                "calls", CALL_SUMMARY_QUERIES, top_k=CALL_SUMMARY_HYBRID_TOP_K,
+                filter_metadata=source_filter, candidates=args.candidates),
+        }
+        for method, docs in contexts.items():
+            coverage[method][0] += sum(_covered(docs, pattern) for pattern in present.values())
+            coverage[method][1] += len(present)
+
+    print(f"\n{len(sources)} bandi, {sum(len(t) for t in sources.values())} chunk, k={args.k}")
+    print(f"{'metodo':<8} {'media ms':>8} {'p95 ms':>7}  " + " ".join(f"{t:>11}" for t in TOPICS))
+    for method in ("vector", "hybrid"):
+        cells = " ".join(
+            f"{statistics.mean(values):>11.3f}" if values else f"{'-':>11}"
+            for values in recall[method].values()
+        )
+        print(f"{method:<8} {_summary(latency[method]):>16}  {cells}")
+
+    print("\nCopertura degli argomenti nel contesto del riassunto:")
+    for method, (covered, total) in coverage.items():
+        ratio = covered / total if total else 0.0
+        print(f"  {method:<8} {covered}/{total} ({ratio:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
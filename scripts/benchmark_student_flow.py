@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Benchmark end-to-end del percorso studente: /universities, /step1, /departments,
+/step2 e /step3 con concorrenza configurabile.
+
+L'app FastAPI gira in-process (httpx + ASGITransport) con il provider LLM locale
+(LLM_PROVIDER=fake, latenza configurabile) e una base dati di prova costruita in una
+directory temporanea a partire dai file inclusi in data/ (il database reale non viene toccato):
+- bando: data/calls/*.pdf (Università di Pisa)
+- destinazioni: il testo già estratto della tabella UniPi (data/destinazioni/processed),
+  caricato nella cache di estrazione per un PDF segnaposto; con --destinations-pdf si usa
+  invece un PDF reale, estratto alla prima richiesta
+- corsi della destinazione: data/corsi/*.pdf
+- piano di studi caricato nello step 3: --study-plan
+
+Per ogni endpoint vengono misurati throughput e latenze p50/p95/p99; i risultati sono
+salvati in JSON (con commit e configurazione) per confrontarli tra commit con --compare.
+
+Uso esempi (PowerShell):
+  python scripts/benchmark_student_flow.py
+  python scripts/benchmark_student_flow.py --concurrency 16 --requests 200 --llm-latency-ms 300
+  python scripts/benchmark_student_flow.py --compare benchmark_results/student_flow_ab12cd3.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+DATA_DIR = root_dir / "data"
+HOME_UNIVERSITY = "Università di Pisa"
+DESTINATION_UNIVERSITY = "UNIVERSITAT POLITECNICA DE CATALUNYA"
+DESTINATIONS_TEXT = DATA_DIR / "destinazioni" / "processed" / "destinazioni_unipi_2025.pdf_LLM_ready.txt"
+DEFAULT_STUDY_PLAN = DATA_DIR / "Master's degree in Informatics Engineering (FIB).pdf"
+DEFAULT_OUTPUT_DIR = root_dir / "benchmark_results"
+ENDPOINTS = ["universities", "step1", "departments", "step2", "step3"]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def configure_environment(args, tmp: Path) -> None:
+    """Imposta la configurazione dell'app prima di importarla (Settings legge l'ambiente)."""
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_LATENCY_JITTER_MS": str(args.llm_jitter_ms),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "FAKE_LLM_SEED": "42",
+        "LLM_CACHE_ENABLED": "true" if args.llm_cache else "false",
+        "UNIVERSITIES_DB_PATH": str(tmp / "universities.db"),
+        "CACHE_DB_PATH": str(tmp / "cache.db"),
+        "DB_PATH": str(tmp / "vector_db"),
+        "SESSION_BACKEND": "memory",
+    })
+
+
+def build_fixture(tmp: Path, destinations_pdf) -> None:
+    """Popola il database temporaneo con bando, destinazioni e corsi."""
+    import fitz
+
+    from app.core.database import db_manager
+    from app.services.extraction_cache import extraction_cache
+    from app.services.rag_service import TABLES_AND_TEXT_EXTRACTOR_VERSION, destinations_extractor_key
+
+    call_pdf = next((DATA_DIR / "calls").glob("*.pdf"))
+    courses_pdf = next((DATA_DIR / "corsi").glob("*.pdf"))
+
+    if destinations_pdf is None:
+        # PDF segnaposto: il testo della tabella arriva dalla cache di estrazione
+        destinations_pdf = tmp / "destinazioni_benchmark.pdf"
+        with fitz.open() as doc:
+            doc.new_page().insert_text((72, 72), "Destinazioni Erasmus (fixture del benchmark)")
+            doc.save(str(destinations_pdf))
+        extraction_cache.put(
+            extraction_cache.file_hash(str(destinations_pdf)), destinations_extractor_key(),
+            TABLES_AND_TEXT_EXTRACTOR_VERSION, DESTINATIONS_TEXT.read_text(encoding="utf-8")
+        )
+
+    home_id = db_manager.create_university(HOME_UNIVERSITY, "erasmus@unipi.it", "Benchmark123", password_hash="-")
+    destination_id = db_manager.create_university(DESTINATION_UNIVERSITY, "erasmus@upc.edu", "Benchmark123", password_hash="-")
+    db_manager.add_document(home_id, "erasmus_call", call_pdf.name, call_pdf.name, str(call_pdf))
+    db_manager.add_document(home_id, "destinazioni", Path(destinations_pdf).name, Path(destinations_pdf).name, str(destinations_pdf))
+    # Stesso tipo usato dall'upload dei corsi (il catalogo incluso rientra nel budget dello step 3)
+    db_manager.add_document(destination_id, "corsi_erasmus", courses_pdf.name, courses_pdf.name, str(courses_pdf))
+
+
+async def _measure(name: str, send, total: int, concurrency: int) -> dict:
+    """Esegue `total` richieste con `concurrency` client paralleli e ne raccoglie le latenze."""
+    latencies: list = []
+    errors: dict = {}
+    remaining = iter(range(total))
+
+    async def client():
+        for i in remaining:
+            start = time.perf_counter()
+            try:
+                res = await send(i)
+                ok = res.status_code < 400
+                status = str(res.status_code)
+            except Exception as e:
+                ok, status = False, type(e).__name__
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies, default=0.0), 2),
+    }
+    print(f"  {name:<12} {result['throughput_rps']:8.1f} req/s   p50 {result['p50_ms']:8.1f} ms   "
+          f"p95 {result['p95_ms']:8.1f} ms   p99 {result['p99_ms']:8.1f} ms   errori {errors or 0}")
+    return result
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from app.main import app
+
+    study_plan = Path(args.study_plan).read_bytes()
+    store = app.state.session_store
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=600) as client:
+        def new_session(**fields) -> str:
+            session_id = f"benchmark-{time.perf_counter_ns()}"
+            store.set(session_id, {"home_university": HOME_UNIVERSITY, **fields})
+            return session_id
+
+        department = args.department
+        if department is None:
+            res = await client.post("/api/students/departments", json={"session_id": new_session()})
+            res.raise_for_status()
+            departments = res.json()["departments"]
+            department = next((d for d in departments if "informatica" in d.lower()), departments[0])
+        print(f"Dipartimento usato nello step 2: {department}")
+
+        senders = {
+            "universities": lambda i: client.get("/api/students/universities"),
+            "step1": lambda i: client.post("/api/students/step1", json={"home_university": HOME_UNIVERSITY}),
+            "departments": lambda i: client.post("/api/students/departments", json={"session_id": new_session()}),
+            "step2": lambda i: client.post("/api/students/step2", json={
+                "session_id": new_session(), "department": department, "period": "fall",
+            }),
+            "step3": lambda i: client.post("/api/students/step3", data={
+                "session_id": new_session(period="fall"), "destination_university_name": DESTINATION_UNIVERSITY,
+            }, files={"study_plan_file": ("piano_di_studi.pdf", study_plan, "application/pdf")}),
+        }
+
+        # Una richiesta per endpoint per scaldare cache e indici (non misurata)
+        for name in args.endpoints:
+            res = await senders[name](0)
+            if res.status_code >= 400:
+                raise RuntimeError(f"Warm-up di /{name} fallito ({res.status_code}): {res.text[:300]}")
+
+        print(f"\n=== {args.requests} richieste per endpoint, concorrenza {args.concurrency} ===")
+        results = {}
+        for name in args.endpoints:
+            results[name] = await _measure(name, senders[name], args.requests, args.concurrency)
+    return {"department": department, "endpoints": results}
+
+
+def compare(current: dict, baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    print(f"\n=== CONFRONTO con {baseline_path.name} (commit {baseline['meta'].get('commit')}) ===")
+    for name, result in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        deltas = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before[key]:
+                deltas.append(f"{key} {(result[key] - before[key]) / before[key]:+.1%}")
+        print(f"  {name:<12} " + "   ".join(deltas))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark end-to-end del percorso studente")
+    p.add_argument("--concurrency", type=int, default=8, help="Client paralleli per endpoint")
+    p.add_argument("--requests", type=int, default=50, help="Richieste per endpoint")
+    p.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS, help="Endpoint da misurare")
+    p.add_argument("--department", default=None, help="Dipartimento per lo step 2 (default: primo di informatica)")
+    p.add_argument("--study-plan", type=Path, default=DEFAULT_STUDY_PLAN, help="PDF del piano di studi per lo step 3")
+    p.add_argument("--destinations-pdf", type=Path, default=None, help="PDF reale delle destinazioni")
+    p.add_argument("--llm-latency-ms", type=float, default=800.0, help="Latenza media del provider LLM locale")
+    p.add_argument("--llm-jitter-ms", type=float, default=300.0, help="Deviazione standard della latenza")
+    p.add_argument("--llm-tokens-per-second", type=float, default=120.0, help="Velocità di generazione simulata")
+    p.add_argument("--llm-cache", action="store_true", help="Abilita la cache LLM (step 1 servito dalla cache)")
+    p.add_argument("--output", type=Path, default=None, help="File JSON dei risultati")
+    p.add_argument("--compare", type=Path, default=None, help="Risultati JSON di un'altra esecuzione da confrontare")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    commit = _git_commit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(args, Path(tmp))
+        build_fixture(Path(tmp), args.destinations_pdf)
+        results = asyncio.run(run(args))
+
+    from app.core.config import settings
+    results["meta"] = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "llm": {
+            "provider": settings.LLM_PROVIDER,
+            "latency_ms": args.llm_latency_ms,
+            "jitter_ms": args.llm_jitter_ms,
+            "tokens_per_second": args.llm_tokens_per_second,
+            "cache": args.llm_cache,
+        },
+        "pools": {
+            "pdf": settings.PDF_POOL_WORKERS, "vector": settings.VECTOR_POOL_WORKERS, "db": settings.DB_POOL_WORKERS,
+        },
+    }
+
+    output = args.output or DEFAULT_OUTPUT_DIR / f"student_flow_{commit}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Risultati salvati in {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Verifica che N richieste /step2 parallele non vengano serializzate dall'event loop.
+
+Le richieste vengono inviate all'app in-process (httpx + ASGITransport), insieme a un
+ping continuo di /health che misura quanto l'event loop resta bloccato.
+Con --simulate-ms il lavoro bloccante della tabella destinazioni viene sostituito da
+uno sleep sincrono della durata indicata (non serve nessun dato caricato):
+- se il lavoro bloccasse l'event loop, N richieste durerebbero ~N x simulate-ms
+- eseguito nel pool "pdf" dura ~ceil(N / PDF_POOL_WORKERS) x simulate-ms
+
+Uso esempi (PowerShell):
+  python scripts/check_step2_concurrency.py --simulate-ms 300 -n 8
+  python scripts/check_step2_concurrency.py -n 8 --university "Università di Pisa" --department "Dipartimento di Informatica"
+"""
+
+import argparse
+import asyncio
+import math
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+import httpx
+
+from app.main import app
+from app.core.config import settings
+from app.core.executors import executors_stats
+from app.services import rag_service
+
+
+def _simulate_blocking_work(ms: int) -> None:
+    """Sostituisce lookup e query delle destinazioni con lavoro sincrono di durata fissa."""
+    def fake_document(home_university):
+        return {"id": 0, "university_id": 0, "file_path": __file__}
+
+    def fake_query(document, department):
+        time.sleep(ms / 1000)  # blocca il thread come farebbero pdfplumber/SQLite
+        return [{"nome_istituzione": "UNIVERSITÄT TEST", "codice_europeo": "D TEST01", "posti": "1"}]
+
+    rag_service._get_destinations_document = fake_document
+    rag_service.query_destinations_for_department = fake_query
+
+
+async def _ping_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def _step2(client: httpx.AsyncClient, session_id: str, department: str) -> float:
+    start = time.perf_counter()
+    res = await client.post("/api/students/step2", json={
+        "session_id": session_id, "department": department, "period": "fall",
+    })
+    res.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(n: int, university: str, department: str) -> tuple:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=300) as client:
+        session_ids = []
+        for i in range(n):
+            session_id = f"concurrency-check-{i}"
+            app.state.session_store.set(session_id, {"home_university": university})
+            session_ids.append(session_id)
+
+        # Una richiesta singola come riferimento (scalda anche cache e indici)
+        single_ms = await _step2(client, session_ids[0], department)
+
+        stop = asyncio.Event()
+        latencies: list = []
+        pinger = asyncio.create_task(_ping_health(client, stop, latencies))
+
+        start = time.perf_counter()
+        durations = await asyncio.gather(*(_step2(client, sid, department) for sid in session_ids))
+        total_ms = (time.perf_counter() - start) * 1000
+
+        stop.set()
+        await pinger
+    return single_ms, total_ms, durations, latencies
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Verifica di concorrenza delle richieste /step2")
+    p.add_argument("-n", type=int, default=8, help="Richieste parallele")
+    p.add_argument("--simulate-ms", type=int, default=0, help="Lavoro bloccante simulato per richiesta (ms)")
+    p.add_argument("--university", default="Università Test", help="Università di provenienza (dati reali)")
+    p.add_argument("--department", default="Dipartimento di Test", help="Dipartimento (dati reali)")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.simulate_ms:
+        _simulate_blocking_work(args.simulate_ms)
+
+    single_ms, total_ms, durations, latencies = asyncio.run(run(args.n, args.university, args.department))
+
+    serialized_ms = single_ms * args.n
+    print(f"Richiesta singola: {single_ms:.0f} ms")
+    print(f"{args.n} richieste parallele: {total_ms:.0f} ms "
+          f"(serializzate sarebbero ~{serialized_ms:.0f} ms, x{serialized_ms / max(total_ms, 1e-9):.1f})")
+    print(f"Latenza /health durante il carico: max {max(latencies, default=0):.0f} ms "
+          f"su {len(latencies)} ping")
+    print(f"Pool: {executors_stats()}")
+
+    if args.simulate_ms:
+        expected_ms = math.ceil(args.n / settings.PDF_POOL_WORKERS) * args.simulate_ms
+        ok = total_ms < serialized_ms * 0.75 and max(latencies, default=0) < args.simulate_ms
+        print(f"Atteso con {settings.PDF_POOL_WORKERS} worker: ~{expected_ms} ms")
+    else:
+        ok = total_ms < serialized_ms * 0.75
+    print("✅ Le richieste non vengono serializzate" if ok else "❌ Le richieste risultano serializzate")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Verifica che il vector store resti limitato con upload ripetuti dello stesso bando.
+
+Lo script lavora su una directory temporanea (il vector_db reale non viene toccato)
+e usa embeddings fittizi, quindi non richiede il download del modello:
+1. Reindicizza più volte lo stesso file: il numero di chunk deve restare costante
+2. Reindicizza il file con meno chunk: i chunk in eccesso devono sparire
+3. Carica e disattiva altri bandi: alla fine resta solo il primo
+
+Uso esempi (PowerShell):
+  python scripts/check_vector_store.py
+  python scripts/check_vector_store.py --uploads 20 --chunks 50
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from langchain.embeddings import FakeEmbeddings
+from langchain.schema import Document
+
+from app.services.vector_db_service import VectorStoreService
+
+
+def _chunks(source: str, n: int, version: int) -> list:
+    return [
+        Document(page_content=f"{source} v{version} chunk {i}", metadata={"source": source})
+        for i in range(n)
+    ]
+
+
+def _check(label: str, actual: int, expected: int) -> bool:
+    ok = actual == expected
+    print(f"  {'✅' if ok else '❌'} {label}: {actual} chunk (attesi {expected})")
+    return ok
+
+
+def run(uploads: int, chunks: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        service = VectorStoreService(base_path=tmp)
+        service._embeddings = FakeEmbeddings(size=32)
+        ok = True
+
+        print("=== 1. Upload ripetuti dello stesso bando ===")
+        for version in range(uploads):
+            service.replace_source(_chunks("bando_unipi.pdf", chunks, version), "calls", "bando_unipi.pdf")
+        ok &= _check(f"dopo {uploads} upload", service.count("calls"), chunks)
+
+        # add_documents con gli stessi ID sovrascrive invece di duplicare
+        service.add_documents(_chunks("bando_unipi.pdf", chunks, uploads), "calls")
+        ok &= _check("dopo add_documents con ID già presenti", service.count("calls"), chunks)
+
+        print("=== 2. Reindicizzazione con meno chunk ===")
+        service.replace_source(_chunks("bando_unipi.pdf", chunks // 2, 0), "calls", "bando_unipi.pdf")
+        ok &= _check("dopo replace_source", service.count("calls"), chunks // 2)
+
+        print("=== 3. Upload e disattivazione di altri bandi ===")
+        for i in range(uploads):
+            source = f"bando_altro_{i}.pdf"
+            service.replace_source(_chunks(source, chunks, 0), "calls", source)
+            service.delete_by_source("calls", source)
+        ok &= _check(f"dopo {uploads} upload + disattivazione", service.count("calls"), chunks // 2)
+
+        results = service.search("calls", "chunk", top_k=chunks, filter_metadata={"source": "bando_unipi.pdf"})
+        ok &= _check("risultati della ricerca filtrata per sorgente", len(results), chunks // 2)
+
+        print(f"\nStatistiche client: {service.stats()}")
+        return ok
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Verifica della dimensione del vector store con upload ripetuti")
+    p.add_argument("--uploads", type=int, default=5, help="Numero di upload ripetuti")
+    p.add_argument("--chunks", type=int, default=20, help="Chunk per bando")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    ok = run(args.uploads, args.chunks)
+    print("\n✅ Vector store limitato" if ok else "\n❌ Il vector store cresce con gli upload")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,38 +1,84 @@
 # scripts/index_calls.py
-"""Script per indicizzare i bandi Erasmus nel vector store."""
+"""Script per indicizzare i bandi Erasmus nel vector store.
 
+Estrazione e chunking dei PDF avvengono in parallelo (--workers processi); i chunk
+vengono inviati all'embedder a blocchi di file interi mentre gli altri PDF sono
+ancora in elaborazione. L'ordine dei chunk non dipende dal numero di worker.
+
+I vettori dei chunk già indicizzati vengono letti dalla cache degli embedding
+(data/cache.db): reindicizzare bandi invariati non ricalcola gli embedding.
+
+Uso esempi (PowerShell):
+  python scripts/index_calls.py
+  python scripts/index_calls.py --workers 8 --batch-size 512
+  python scripts/index_calls.py --rebuild   # dopo aver cambiato EMBEDDING_MODEL
+"""
+
+import argparse
+import shutil
 import sys
+import time
 from pathlib import Path
 
 # Aggiungi la directory root al PYTHONPATH
 root_dir = Path(__file__).parent.parent
 sys.path.append(str(root_dir))
 
-from app.services.document_service import process_calls
-from app.services.vector_db_service import create_vector_store
+from app.services.document_service import default_workers, iter_document_batches, throughput
+from app.services.vector_db_service import create_vector_store, vector_store_service
+from app.services.embedding_cache import embedding_cache
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Indicizza i bandi Erasmus nel vector store")
+    p.add_argument("--calls-dir", default="data/calls", help="Directory dei PDF dei bandi")
+    p.add_argument("--workers", type=int, default=default_workers(),
+                   help="Processi per estrazione e chunking (1 = sequenziale)")
+    p.add_argument("--batch-size", type=int, default=256, help="Chunk minimi per blocco di embedding")
+    p.add_argument("--rebuild", action="store_true",
+                   help="Elimina l'indice esistente (necessario se cambia il modello di embedding)")
+    return p
 
 
-def main():
+def main(argv=None):
     """Carica i bandi PDF e crea il vector store."""
-    print("Inizio indicizzazione bandi Erasmus...")
-    
+    args = build_parser().parse_args(argv)
+    print(f"Inizio indicizzazione bandi Erasmus ({args.workers} worker)...")
+
+    if args.rebuild:
+        shutil.rmtree(vector_store_service.base_path / 'calls', ignore_errors=True)
+        vector_store_service.reload('calls')
+        print("Indice 'calls' eliminato, verrà ricreato da zero")
+
+    stats = {}
+    embed_seconds = 0.0
+    start = time.perf_counter()
     try:
-        # 1. Carica e processa i PDF dei bandi
-        documents = process_calls()
-        print(f"Caricati {len(documents)} chunks da bandi")
-        
-        # 2. Crea il vector store (solo per i bandi!)
-        create_vector_store(documents, category='calls')
-        print("Vector store creato con successo in categoria 'calls'")
-        
+        # 1. Carica e processa i PDF dei bandi, 2. indicizza ogni blocco (solo per i bandi!)
+        for batch in iter_document_batches(args.calls_dir, workers=args.workers,
+                                           batch_size=args.batch_size, stats=stats):
+            t0 = time.perf_counter()
+            create_vector_store(batch, category='calls')
+            embed_seconds += time.perf_counter() - t0
+            print(f"  Indicizzato blocco di {len(batch)} chunks")
+
     except Exception as e:
         print(f"Errore durante l'indicizzazione: {str(e)}")
         sys.exit(1)
-        
+
+    if stats.get("files"):
+        stats["seconds"] = time.perf_counter() - start
+        print(f"Throughput: {throughput(stats)}, di cui embedding {embed_seconds:.1f}s")
+    if embedding_cache is not None:
+        cache_stats = embedding_cache.stats()
+        print(f"Cache degli embedding: {cache_stats['hits']} chunk dalla cache, "
+              f"{cache_stats['misses']} calcolati (hit ratio {cache_stats['hit_ratio']:.0%})")
+    print("Vector store aggiornato con successo in categoria 'calls'")
+
     print("Indicizzazione completata!")
     print("\nNOTA: Destinazioni e corsi NON vengono indicizzati.")
     print("Vengono processati on-demand quando richiesti dal servizio RAG.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Load test di un picco di login: misura la latenza degli endpoint non correlati
+(/health e /) mentre N login concorrenti eseguono bcrypt.
+
+Le richieste vengono inviate all'app in-process (httpx + ASGITransport) usando un
+database temporaneo con un'università di prova (il database reale non viene toccato).
+- di default bcrypt gira nel pool "password" (PASSWORD_POOL_WORKERS, coda PASSWORD_MAX_QUEUE):
+  gli altri endpoint restano reattivi e oltre la coda i login ricevono 503
+- con --inline bcrypt viene eseguito direttamente nell'handler, come prima:
+  ogni login blocca l'event loop per tutta la durata dell'hash
+Con --seed-rounds l'hash di prova viene creato con un costo diverso da BCRYPT_ROUNDS,
+per verificare l'aggiornamento trasparente al primo login.
+
+Uso esempi (PowerShell):
+  python scripts/load_test_login.py --logins 40
+  python scripts/load_test_login.py --logins 40 --inline
+  python scripts/load_test_login.py --logins 5 --seed-rounds 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Aggiungi la directory root al PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+import bcrypt
+import httpx
+
+from app.main import app
+from app.core.config import settings
+from app.core.database import DatabaseManager
+from app.core.executors import executors_stats
+from app.api.endpoints import endpoints_university
+
+EMAIL = "loadtest@uni-test.it"
+PASSWORD = "LoadTest123"
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _use_inline_bcrypt() -> None:
+    """Ripristina il comportamento precedente: bcrypt eseguito nell'event loop."""
+    async def run_inline(fn, *args):
+        return fn(*args)
+    endpoints_university._run_password = run_inline
+
+
+async def _ping(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        for path in ("/health", "/"):
+            start = time.perf_counter()
+            await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def _login(client: httpx.AsyncClient, results: list) -> None:
+    start = time.perf_counter()
+    res = await client.post("/api/universities/login", json={
+        "institutional_email": EMAIL, "password": PASSWORD,
+    })
+    results.append((res.status_code, (time.perf_counter() - start) * 1000))
+
+
+async def run(logins: int) -> tuple:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=300) as client:
+        # Latenza di riferimento senza carico
+        baseline: list = []
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(_ping(client, stop, baseline))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await pinger
+
+        stop = asyncio.Event()
+        latencies: list = []
+        results: list = []
+        pinger = asyncio.create_task(_ping(client, stop, latencies))
+        start = time.perf_counter()
+        await asyncio.gather(*(_login(client, results) for _ in range(logins)))
+        total_ms = (time.perf_counter() - start) * 1000
+        stop.set()
+        await pinger
+    return baseline, latencies, results, total_ms
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Load test di un picco di login")
+    p.add_argument("--logins", type=int, default=40, help="Login concorrenti")
+    p.add_argument("--inline", action="store_true", help="bcrypt nell'event loop (comportamento precedente)")
+    p.add_argument("--seed-rounds", type=int, default=0,
+                   help="Costo bcrypt dell'hash di prova (default BCRYPT_ROUNDS)")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(Path(tmp) / "loadtest.db")
+        seed_rounds = args.seed_rounds or settings.BCRYPT_ROUNDS
+        seed_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=seed_rounds)).decode("utf-8")
+        university_id = db.create_university("Università Load Test", EMAIL, PASSWORD, password_hash=seed_hash)
+        endpoints_university.db_manager = db
+        if args.inline:
+            _use_inline_bcrypt()
+
+        baseline, latencies, results, total_ms = asyncio.run(run(args.logins))
+        stored_hash = db.get_university_by_id(university_id)["password_hash"]
+
+    codes = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    login_ms = [ms for code, ms in results if code == 200]
+
+    mode = "inline (event loop)" if args.inline else f"pool 'password' ({settings.PASSWORD_POOL_WORKERS} worker)"
+    print(f"Modalità bcrypt: {mode}, costo {settings.BCRYPT_ROUNDS}")
+    print(f"{args.logins} login in {total_ms:.0f} ms, esiti: {codes}")
+    if login_ms:
+        print(f"Latenza login riusciti: p50 {statistics.median(login_ms):.0f} ms, p99 {_percentile(login_ms, 99):.0f} ms")
+    print(f"Endpoint non correlati a riposo: p50 {statistics.median(baseline):.1f} ms, "
+          f"p99 {_percentile(baseline, 99):.1f} ms")
+    print(f"Endpoint non correlati durante il picco: p50 {statistics.median(latencies):.1f} ms, "
+          f"p99 {_percentile(latencies, 99):.1f} ms, max {max(latencies):.1f} ms su {len(latencies)} richieste")
+    print(f"Pool password: {executors_stats()['password']}")
+    if args.seed_rounds:
+        print(f"Costo dell'hash dopo i login: {stored_hash.split('$')[2]} (iniziale {seed_rounds})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())